@@ -1,21 +1,15 @@
 import openai
 from app.config import settings
 from app.schemas import RouteResponse
-from app.services.routing_service import routing_service
+from app.services.routing_service import routing_service, resolve_department, DEPARTMENTS
+from app.services.officer_load import officer_load
 import json
 import logging
 
 logger = logging.getLogger("ai-engine.agents.routing")
 
-# Map category to officers
-DEPARTMENTS_OFFICERS = {
-    "Roads": ["officer_1", "officer_2"],
-    "Sanitation": ["officer_3", "officer_4"],
-    "Water": ["officer_5", "officer_6"],
-    "Electricity": ["officer_7", "officer_8"],
-    "Traffic": ["officer_9", "officer_10"],
-    "Others": ["officer_9", "officer_10"]
-}
+# Agent-facing department names
+AGENT_DEPARTMENTS = ["Roads", "Sanitation", "Water", "Electricity", "Traffic", "Others"]
 
 class RoutingAgent:
     def __init__(self):
@@ -29,8 +23,12 @@ class RoutingAgent:
             return await self._run_fallback(category, severity, lat, lon)
             
         # Map category names to align with existing service names or use directly
-        norm_category = category if category in DEPARTMENTS_OFFICERS else "Others"
-        allowed_officers = DEPARTMENTS_OFFICERS.get(norm_category, DEPARTMENTS_OFFICERS["Others"])
+        norm_category = category if category in AGENT_DEPARTMENTS else "Others"
+        department = resolve_department(norm_category)
+        # Officers ordered by live open assignments, least loaded first
+        ranked = await officer_load.least_loaded(department, DEPARTMENTS[department], k=5)
+        allowed_officers = [officer for officer, _ in ranked] or DEPARTMENTS[department]
+        officer_loads = {officer: int(load) for officer, load in ranked}
         
         prompt = f"""
         You are JanSankalp AI's Smart Routing Agent.
@@ -41,10 +39,11 @@ class RoutingAgent:
         - Severity Level: {severity}
         - Complaint Text: "{text}"
         - Allowed Department: "{norm_category}"
-        - Available Officers for this Department: {allowed_officers}
+        - Available Officers for this Department (open complaints each): {officer_loads}
         
         GUIDELINES:
-        - Select the most appropriate Officer ID from the available officers list.
+        - Select the most appropriate Officer ID from the available officers list,
+          preferring officers with fewer open complaints.
         - Determine the priority (Low, Normal, High, Urgent) based on complaint text and severity.
           If severity is 'Critical', priority MUST be 'Urgent'.
           If complaint mentions danger, water contamination, live wires, or active accidents, assign 'Urgent'.
@@ -71,7 +70,7 @@ class RoutingAgent:
             dept = result.get("department", norm_category)
             officer = result.get("officer_id")
             if officer not in allowed_officers:
-                # Default to first officer
+                # Default to the least-loaded officer
                 officer = allowed_officers[0]
                 
             priority = result.get("priority", "Normal")
@@ -89,16 +88,8 @@ class RoutingAgent:
             return await self._run_fallback(category, severity, lat, lon)
 
     async def _run_fallback(self, category: str, severity: str, lat: float = 0.0, lon: float = 0.0) -> RouteResponse:
-        # Standardize category string for existing RL routing service
-        service_category = category
-        if category == "Roads":
-            service_category = "Road & Potholes"
-        elif category == "Sanitation":
-            service_category = "Garbage & Sanitation"
-        elif category == "Water":
-            service_category = "Water Supply"
-            
-        res = await routing_service.route_complaint(service_category, severity, lat, lon)
+        # The routing service maps classifier categories to its departments itself
+        res = await routing_service.route_complaint(category, severity, lat, lon)
         # Map department back if needed, but we keep RouteResponse consistency
         return res
 
@@ -42,16 +42,19 @@ async def models_health_check():
         model_loader = get_model_loader()
         
         if not model_loader.is_loaded:
+            readiness = model_loader.get_readiness()
             return {
-                "status": "unhealthy",
-                "message": "Models not loaded"
+                "status": "loading" if readiness["state"] in ("starting", "loading") else "unhealthy",
+                "message": "Models not loaded",
+                "readiness": readiness
             }
         
-        # Test a few models to ensure they're working
+        # Test a few models to ensure they're working (only those already in
+        # memory; a health check must never trigger a lazy load)
         test_results = {}
         
         # Test NLP model
-        nlp = model_loader.get_model('nlp')
+        nlp = model_loader.models.get('nlp')
         if nlp:
             try:
                 result = nlp.detect_language("test")
@@ -60,12 +63,12 @@ async def models_health_check():
                 test_results['nlp'] = f"error: {str(e)}"
         
         # Test classifier
-        classifier = model_loader.get_model('complaint_classifier')
+        classifier = model_loader.models.get('complaint_classifier')
         if classifier:
             test_results['classifier'] = "loaded"
         
         # Test vision model
-        vision = model_loader.get_model('infrastructure_analyzer')
+        vision = model_loader.models.get('infrastructure_analyzer')
         if vision:
             test_results['vision'] = "loaded"
         
@@ -84,6 +87,27 @@ async def models_health_check():
             "error": str(e)
         }
 
+@router.get("/workers")
+async def inference_workers_status():
+    """
+    Per-worker health and queue depth of the inference worker pool
+    """
+    from app.services.inference_workers import get_inference_pool
+    
+    pool = get_inference_pool()
+    if pool is None:
+        return {
+            "success": True,
+            "data": {"running": False},
+            "message": "Inference workers disabled; models are served in-process"
+        }
+    
+    return {
+        "success": True,
+        "data": pool.get_stats(),
+        "message": "Inference worker status retrieved successfully"
+    }
+
 @router.post("/reload")
 async def reload_models():
     """
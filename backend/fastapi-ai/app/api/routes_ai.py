@@ -11,17 +11,19 @@ Endpoints call either:
 
 NO business logic lives here.
 """
+import asyncio
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Request
 from app.schemas import (
     ChatRequest, ChatResponse, ClassifyRequest, ClassifyResponse,
     DuplicateCheckRequest, DuplicateCheckResponse, RouteRequest, RouteResponse,
     PredictETARequest, PredictETAResponse, VoiceRequest, VoiceResponse,
     AnalyticsResponse, SpamCheckRequest, SpamCheckResponse,
     ResolutionVerifyRequest, ResolutionVerifyResponse,
-    AIProcessWorkflowRequest, AIProcessWorkflowResponse,
+    AIProcessWorkflowRequest, AIProcessWorkflowResponse, VisionBatchRequest,
+    OfficerPositionUpdate, BatchRouteRequest, BatchRouteResponse, FederatedRoundRequest,
 )
 from app.services.chat_service import chat_service
 from app.services.classification_service import classification_service
@@ -46,6 +48,7 @@ from app.services.un_governance_service import un_governance_service
 from app.services.ai_mayor_service import ai_mayor_service
 from app.services.national_brain_service import national_brain_service
 from app.pipelines.llm_pipeline import llm_pipeline
+from app.utils.telemetry_codecs import decode, UnsupportedFormatError, BatchTooLargeError
 
 logger = logging.getLogger("ai-engine.routes")
 
@@ -75,6 +78,41 @@ async def route_endpoint(request: RouteRequest):
     return await routing_service.route_complaint(request.category, request.severity)
 
 
+@router.post("/route/batch", response_model=BatchRouteResponse)
+async def route_batch_endpoint(request: BatchRouteRequest):
+    from app.services.batch_routing_service import batch_routing_service, BatchTooLargeError
+    try:
+        return await batch_routing_service.route_batch(request)
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+@router.get("/route/load")
+async def officer_load_endpoint():
+    from app.services.officer_load import officer_load
+    return officer_load.get_stats()
+
+
+@router.post("/route/officers/positions")
+async def officer_positions_endpoint(updates: List[OfficerPositionUpdate]):
+    """Bulk-load or refresh officer positions in the geo dispatch index"""
+    from app.services.officer_geo import officer_geo
+    from app.services.routing_service import resolve_department
+    outside = [u.officer_id for u in updates if not officer_geo.in_bounds(u.latitude, u.longitude)]
+    if outside:
+        raise HTTPException(status_code=400, detail=f"Positions outside the service area: {outside[:20]}")
+    for update in updates:
+        officer_geo.update(update.officer_id, resolve_department(update.department), update.latitude,
+                           update.longitude, available=update.available, timestamp=update.timestamp)
+    return {"updated": len(updates), "officers": len(officer_geo.positions)}
+
+
+@router.get("/route/geo")
+async def officer_geo_endpoint():
+    from app.services.officer_geo import officer_geo
+    return officer_geo.get_stats()
+
+
 # ---------------------------------------------------------------------------
 # Autonomous Governance Operations
 # ---------------------------------------------------------------------------
@@ -109,9 +147,12 @@ async def process_workflow_endpoint(request: AIProcessWorkflowRequest):
 
 @router.get("/analytics/rl")
 async def rl_analytics_endpoint():
-    from app.rl import rl_agent
+    from app.rl import rl_agent, replay_learner
     return {
         "policy_size": len(rl_agent.q_table),
+        "policy_store": rl_agent.q_table.get_stats(),
+        "persistence": rl_agent.persistence.get_stats(),
+        "replay": replay_learner.get_stats(),
         "epsilon": rl_agent.epsilon,
         "efficiency_gain": "24.5%",
         "reward_trend": [1.2, 2.5, 4.8, 6.2, 8.5],
@@ -128,20 +169,23 @@ async def federated_analytics_endpoint():
     return await analytics_service.get_federated_metrics()
 
 
-@router.post("/federated/train-round")
-async def train_round_endpoint():
-    """Trigger a simulated federated training round for demonstration."""
+@router.post("/federated/train-round", status_code=202)
+async def train_round_endpoint(request: Optional[FederatedRoundRequest] = None):
+    """Start a simulated federated training round in the background; poll /federated/rounds/{job_id}."""
     from app.federated.coordinator import federated_coordinator
-    # pyrefly: ignore [missing-import]
-    import torch
+    request = request or FederatedRoundRequest()
+    # A district listed twice would train twice against one error-feedback buffer
+    districts = list(dict.fromkeys(request.districts))
+    return federated_coordinator.start_round(districts, request.samples_per_district)
 
-    sim_data = {}
-    for d_id in ["District_A", "District_B", "District_C"]:
-        data = torch.randn(100, 5000)
-        labels = torch.randint(0, 5, (100,))
-        sim_data[d_id] = (data, labels)
 
-    return await federated_coordinator.run_federated_round(sim_data)
+@router.get("/federated/rounds/{job_id}")
+async def train_round_status_endpoint(job_id: str):
+    from app.federated.coordinator import federated_coordinator
+    job = federated_coordinator.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown federated round job {job_id}")
+    return job
 
 
 # ---------------------------------------------------------------------------
@@ -153,11 +197,39 @@ async def ingest_iot_data(sensor_id: str, sensor_type: str, value: float, unit:
     return await iot_ingestion_service.process_telemetry(sensor_id, sensor_type, value, unit, {"lat": lat, "lng": lng})
 
 
+@router.post("/iot/ingest/bulk")
+async def ingest_iot_bulk(request: Request):
+    """Batched telemetry as NDJSON, JSON, msgpack or Arrow IPC (see app/utils/telemetry_codecs.py)."""
+    try:
+        # Decoding a large batch is CPU-bound; keep it off the event loop
+        batch = await asyncio.to_thread(decode, await request.body(), request.headers.get("content-type"))
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed telemetry batch: {e}")
+    return await iot_ingestion_service.process_telemetry_batch(batch)
+
+
 @router.post("/vision/analyze")
 async def analyze_vision_feed(source_type: str, image_url: str, lat: float, lng: float):
     return await infrastructure_vision_service.analyze_feed(source_type, image_url, {"lat": lat, "lng": lng})
 
 
+@router.post("/vision/analyze-batch")
+async def analyze_vision_batch(request: VisionBatchRequest):
+    return await infrastructure_vision_service.analyze_frames(
+        request.source_type, request.image_urls, {"lat": request.lat, "lng": request.lng}
+    )
+
+
+@router.get("/vision/pipeline/stats")
+async def vision_pipeline_stats():
+    from app.pipelines.vision_pipeline import vision_pipeline
+    return vision_pipeline.get_stats()
+
+
 @router.get("/analytics/infrastructure")
 async def infrastructure_analytics_endpoint():
     health_map = await predictive_risk_engine.get_infrastructure_health_map()
@@ -0,0 +1,121 @@
+"""
+Retry & Dead-Letter Routing for the Kafka event pipeline.
+
+A handler failure must never stop the consumer loop. Failed events are
+re-published to delayed retry topics (one topic per delay tier) and, once
+the retry budget is exhausted, parked on a dead-letter topic together with
+the error context so they can be inspected and replayed later
+(see app/events/replay_dlq.py).
+
+Topic layout for a source topic ``complaint_submitted``:
+
+    complaint_submitted.retry.1   -> re-attempted after RETRY_DELAYS[0] seconds
+    complaint_submitted.retry.2   -> re-attempted after RETRY_DELAYS[1] seconds
+    ...
+    complaint_submitted.dlq       -> retries exhausted, waits for replay
+"""
+import os
+import time
+import socket
+import traceback
+from typing import Any, Dict, List, Optional
+
+# Delay (seconds) before each retry attempt; its length is the retry budget.
+RETRY_DELAYS = [
+    int(d) for d in os.getenv("KAFKA_RETRY_DELAYS", "5,30,300").split(",") if d.strip()
+]
+
+RETRY_SUFFIX = ".retry."
+DLQ_SUFFIX = ".dlq"
+ENVELOPE_KEY = "_retry"
+
+MAX_TRACEBACK_CHARS = 4000
+
+
+def _format_traceback(error: Exception) -> str:
+    tb = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+    return tb[-MAX_TRACEBACK_CHARS:]
+
+
+def retry_topic(topic: str, attempt: int) -> str:
+    return f"{topic}{RETRY_SUFFIX}{attempt}"
+
+
+def dlq_topic(topic: str) -> str:
+    return f"{topic}{DLQ_SUFFIX}"
+
+
+def source_topic(topic: str) -> str:
+    """The source topic of a retry or dead-letter topic (the topic itself otherwise)."""
+    if RETRY_SUFFIX in topic:
+        return topic.rsplit(RETRY_SUFFIX, 1)[0]
+    return topic[:-len(DLQ_SUFFIX)] if topic.endswith(DLQ_SUFFIX) else topic
+
+
+def retry_topics(topics: List[str]) -> Dict[int, List[str]]:
+    """Retry topics for the given source topics, grouped by attempt tier."""
+    return {
+        attempt: [retry_topic(t, attempt) for t in topics]
+        for attempt in range(1, len(RETRY_DELAYS) + 1)
+    }
+
+
+def is_envelope(value: Any) -> bool:
+    return isinstance(value, dict) and ENVELOPE_KEY in value and "payload" in value
+
+
+def unwrap(value: Any) -> tuple:
+    """Return (original_topic, payload, retry_meta) for a retry/DLQ record."""
+    meta = value[ENVELOPE_KEY]
+    return meta["original_topic"], value["payload"], meta
+
+
+def build_failure_envelope(
+    original_topic: str,
+    payload: Dict[str, Any],
+    error: Exception,
+    attempt: int,
+    source: Optional[Dict[str, Any]] = None,
+    history: Optional[List[Dict[str, Any]]] = None,
+    dead_letter: bool = False,
+) -> tuple:
+    """
+    Build the record for the next hop of a failed event.
+
+    ``attempt`` is the number of attempts already made. Returns
+    ``(target_topic, envelope)`` — a retry topic while budget remains,
+    otherwise (or when ``dead_letter`` is set, for failures a retry cannot
+    fix) the dead-letter topic.
+    """
+    now = time.time()
+    failure = {
+        "attempt": attempt,
+        "error_type": type(error).__name__,
+        "error": str(error),
+        "failed_at": now,
+        "consumer_host": socket.gethostname(),
+        **(source or {}),
+    }
+    errors = list(history or []) + [failure]
+
+    if attempt <= len(RETRY_DELAYS) and not dead_letter:
+        target = retry_topic(original_topic, attempt)
+        retry_at = now + RETRY_DELAYS[attempt - 1]
+        dead_lettered = False
+    else:
+        target = dlq_topic(original_topic)
+        retry_at = None
+        dead_lettered = True
+
+    envelope = {
+        "payload": payload,
+        ENVELOPE_KEY: {
+            "original_topic": original_topic,
+            "attempt": attempt,
+            "retry_at": retry_at,
+            "dead_lettered": dead_lettered,
+            "traceback": _format_traceback(error) if dead_lettered else None,
+            "errors": errors,
+        },
+    }
+    return target, envelope
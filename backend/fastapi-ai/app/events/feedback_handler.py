@@ -1,4 +1,4 @@
-from app.rl import rl_agent, env
+from app.rl import rl_agent, env, replay_buffer, replay_learner
 import logging
 
 logger = logging.getLogger("ai-engine")
@@ -26,17 +26,17 @@ async def process_resolution_feedback(event_data: dict):
         # Calculate Reward
         reward = env.calculate_reward(action_taken, outcome)
         
-        # Current state and 'next state' (simplified for one-step task or next random state)
         state = env.get_state_vector(**state_data)
         
-        # In this simple model, we update the agent immediately
-        # next_state is dummy as we treat this as episodic tasks
-        rl_agent.update(state, action_taken, reward, state)
+        # Resolution ends the episode, so the transition is terminal (no bootstrap
+        # from a dummy next state). The background learner replays it in mini-batches.
+        replay_buffer.add(state, action_taken, reward, state, done=True)
         
-        logger.info(f"RL Agent updated for Ticket {event_data.get('ticketId')} with reward {reward}")
+        logger.info(f"RL transition buffered for Ticket {event_data.get('ticketId')} with reward {reward}")
         
-        # Periodically save the policy
-        rl_agent.save_policy()
+        # Learning and persistence both run off the event-handling path
+        replay_learner.ensure_started()
+        rl_agent.persistence.ensure_started()
         
     except Exception as e:
         logger.error(f"Error processing RL feedback: {e}")
@@ -2,11 +2,17 @@ import os
 import json
 import asyncio
 import logging
+import time
 from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
+from app.events.dead_letter import (
+    RETRY_DELAYS, ENVELOPE_KEY, build_failure_envelope, retry_topics, source_topic, is_envelope, unwrap,
+)
 
 logger = logging.getLogger("ai-engine")
 
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
+# Longest a retry consumer blocks in one poll, so shutdown and resumes stay prompt
+RETRY_POLL_SECONDS = 1.0
 
 class KafkaClient:
     def __init__(self):
@@ -32,23 +38,154 @@ class KafkaClient:
                 await self.start_producer()
             await self.producer.send_and_wait(topic, data)
             logger.info(f"Event emitted to topic {topic}")
+            return True
         except Exception as e:
             logger.error(f"Failed to emit event: {e}")
+            return False
 
-    async def consume_events(self, topics: list, handler_func):
+    async def emit_batch(self, topic: str, records: list, key_func=None) -> int:
+        """
+        Produce many records with a single flush: sends are pipelined and
+        awaited together so the producer can batch them per partition.
+        Returns the number of records acknowledged.
+        """
+        if not records:
+            return 0
+        try:
+            if not self.producer:
+                await self.start_producer()
+            futures = [
+                await self.producer.send(topic, record, key=key_func(record).encode('utf-8') if key_func else None)
+                for record in records
+            ]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+            failed = sum(1 for r in results if isinstance(r, Exception))
+            if failed:
+                logger.error(f"Failed to emit {failed}/{len(records)} events to topic {topic}")
+            logger.info(f"Batch of {len(records) - failed} events emitted to topic {topic}")
+            return len(records) - failed
+        except Exception as e:
+            logger.error(f"Failed to emit batch: {e}")
+            return 0
+
+    async def consume_events(self, topics: list, handler_func, group_id: str = "ai-engine-group"):
+        # Values are decoded per record rather than by a value_deserializer: a
+        # deserializer error would raise out of the iterator and stop the consumer
         consumer = AIOKafkaConsumer(
             *topics,
             bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-            group_id="ai-engine-group",
-            value_deserializer=lambda m: json.loads(m.decode('utf-8'))
+            group_id=group_id,
         )
         await consumer.start()
         logger.info(f"Kafka Consumer started for topics: {topics}")
         try:
             async for msg in consumer:
                 logger.info(f"Received message on topic {msg.topic}")
-                await handler_func(msg.topic, msg.value)
+                value = await self._decode(msg)
+                if value is None:
+                    continue
+                try:
+                    await handler_func(msg.topic, value)
+                except Exception as e:
+                    await self._route_failure(msg, msg.topic, value, e, attempt=1)
+        finally:
+            await consumer.stop()
+
+    async def consume_retry_events(self, topics: list, handler_func):
+        """
+        Run one consumer per retry tier for the given source topics.
+        Each tier has a fixed delay, so records within a tier are already in
+        retry_at order and waiting on the head record never delays a record
+        that is due earlier.
+        """
+        tiers = retry_topics(topics)
+        await asyncio.gather(*[
+            self._consume_retry_tier(attempt, tier_topics, handler_func)
+            for attempt, tier_topics in tiers.items()
+        ])
+
+    async def _consume_retry_tier(self, attempt: int, tier_topics: list, handler_func):
+        consumer = AIOKafkaConsumer(
+            *tier_topics,
+            bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+            group_id=f"ai-engine-retry-{attempt}",
+        )
+        await consumer.start()
+        logger.info(f"Kafka retry consumer started for tier {attempt} ({RETRY_DELAYS[attempt - 1]}s): {tier_topics}")
+        # A partition whose head record is not due yet is paused and rewound to
+        # that record rather than slept on, so the consumer keeps polling and
+        # never exceeds max_poll_interval_ms (which would trigger a rebalance)
+        paused = {}  # TopicPartition -> retry_at
+        try:
+            while True:
+                now = time.time()
+                due = [tp for tp, retry_at in paused.items() if retry_at <= now]
+                for tp in due:
+                    del paused[tp]
+                assigned = consumer.assignment()
+                consumer.resume(*(tp for tp in due if tp in assigned))
+
+                wait = min([retry_at - now for retry_at in paused.values()] + [RETRY_POLL_SECONDS])
+                batches = await consumer.getmany(timeout_ms=max(int(wait * 1000), 1))
+                for tp, messages in batches.items():
+                    for msg in messages:
+                        value = await self._decode(msg)
+                        if value is None:
+                            continue
+                        if not is_envelope(value):
+                            logger.warning(f"Skipping malformed retry record on {msg.topic} @ {msg.offset}")
+                            continue
+                        original_topic, payload, meta = unwrap(value)
+
+                        retry_at = meta.get("retry_at") or 0
+                        if retry_at > time.time():
+                            consumer.seek(tp, msg.offset)
+                            consumer.pause(tp)
+                            paused[tp] = retry_at
+                            break
+
+                        try:
+                            await handler_func(original_topic, payload)
+                            logger.info(f"Retry attempt {attempt + 1} succeeded for event on {original_topic}")
+                        except Exception as e:
+                            await self._route_failure(
+                                msg, original_topic, payload, e,
+                                attempt=meta.get("attempt", attempt) + 1,
+                                history=meta.get("errors"),
+                            )
         finally:
             await consumer.stop()
 
+    async def _decode(self, msg):
+        """
+        JSON-decode a record's value. A record that cannot be decoded (a poison
+        message) goes straight to its source topic's DLQ with the raw value as
+        text, and None is returned so the consumer moves on.
+        """
+        try:
+            return json.loads(msg.value.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError, AttributeError) as e:
+            raw = msg.value.decode('utf-8', errors='backslashreplace') if isinstance(msg.value, bytes) else msg.value
+            await self._route_failure(msg, source_topic(msg.topic), raw, e, attempt=1, dead_letter=True)
+            return None
+
+    async def _route_failure(self, msg, original_topic: str, payload: dict, error: Exception,
+                             attempt: int, history: list = None, dead_letter: bool = False):
+        """Send a failed event to its next retry tier, or to the DLQ once retries are exhausted."""
+        target, envelope = build_failure_envelope(
+            original_topic, payload, error,
+            attempt=attempt,
+            source={"topic": msg.topic, "partition": msg.partition, "offset": msg.offset},
+            history=history,
+            dead_letter=dead_letter,
+        )
+        if envelope[ENVELOPE_KEY]["dead_lettered"]:
+            logger.error(f"Event on {original_topic} failed {attempt} times, dead-lettering to {target}: {error}")
+        else:
+            logger.warning(f"Event on {original_topic} failed (attempt {attempt}), scheduling retry on {target}: {error}")
+
+        if not await self.emit_event(target, envelope):
+            # The consumer keeps moving either way; the payload is logged so it is never lost silently.
+            logger.critical(f"Could not publish failed event to {target}. Payload: {json.dumps(payload, default=str)}")
+
 kafka_client = KafkaClient()
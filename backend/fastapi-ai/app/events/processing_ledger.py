@@ -0,0 +1,181 @@
+"""
+Processing Ledger for idempotent complaint event handling.
+
+Kafka delivers at-least-once, so a consumer restart or rebalance redelivers
+complaint_submitted events that were already processed. The ledger records
+every (complaint_id, event version) pair the pipeline has claimed, and acts
+as an outbox for the resulting event:
+
+    (absent) --claim--> IN_PROGRESS --record_result--> PROCESSED --mark_emitted--> EMITTED
+
+- EMITTED:     the event is fully handled; redeliveries are dropped.
+- PROCESSED:   the result is stored but the emit was not confirmed; a
+               redelivery re-emits the stored payload without re-running
+               spam, classification or the LLM calls.
+- IN_PROGRESS: another consumer holds the lease; expires after
+               LEDGER_LEASE_SECONDS so a crashed worker cannot block the event.
+
+Redis is used when reachable so the ledger is shared by all consumers in the
+group; otherwise a bounded in-process store keeps the same semantics per pod.
+Redis calls run on worker threads so a slow round trip never blocks the event
+loop; the local store stays on the loop thread, which keeps its check-and-set
+atomic.
+"""
+import os
+import asyncio
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.utils.redis_client import redis_client
+
+logger = logging.getLogger("ai-engine.ledger")
+
+LEDGER_PREFIX = "ledger:complaint"
+LEDGER_LEASE_SECONDS = int(os.getenv("LEDGER_LEASE_SECONDS", "300"))
+LEDGER_TTL_SECONDS = int(os.getenv("LEDGER_TTL_SECONDS", str(7 * 24 * 3600)))
+LEDGER_LOCAL_MAX_ENTRIES = int(os.getenv("LEDGER_LOCAL_MAX_ENTRIES", "100000"))
+REDIS_RETRY_SECONDS = 30
+
+IN_PROGRESS = "IN_PROGRESS"
+PROCESSED = "PROCESSED"
+EMITTED = "EMITTED"
+
+
+class ClaimResult:
+    """Outcome of ProcessingLedger.claim()."""
+    CLAIMED = "CLAIMED"          # caller owns the event and must process it
+    PENDING_EMIT = "PENDING_EMIT"  # result exists, caller must only re-emit it
+    DUPLICATE = "DUPLICATE"      # already done or being processed elsewhere
+
+    def __init__(self, status: str, record: Optional[Dict[str, Any]] = None):
+        self.status = status
+        self.record = record or {}
+
+
+class _LocalStore:
+    """Bounded in-process fallback with Redis-like SET NX / EX semantics."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._data[key]
+            return None
+        return entry[1]
+
+    def set(self, key: str, value: str, ex: int, nx: bool = False) -> bool:
+        if nx and self.get(key) is not None:
+            return False
+        self._data[key] = (time.time() + ex, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        return True
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+
+class ProcessingLedger:
+    def __init__(self):
+        self.redis = redis_client
+        self._redis_down_until = 0.0
+        self.local = _LocalStore(LEDGER_LOCAL_MAX_ENTRIES)
+        self.stats = {"claimed": 0, "duplicates_dropped": 0, "re_emitted": 0}
+
+    @staticmethod
+    def _key(complaint_id: str, version: Any) -> str:
+        return f"{LEDGER_PREFIX}:{complaint_id}:v{version}"
+
+    # -- storage helpers (Redis first, local fallback) ---------------------
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.time() >= self._redis_down_until
+
+    def _redis_failed(self, e: Exception):
+        logger.warning(f"[Ledger] Redis unavailable, using local ledger for {REDIS_RETRY_SECONDS}s: {e}")
+        self._redis_down_until = time.time() + REDIS_RETRY_SECONDS
+
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._redis_available():
+            try:
+                raw = await asyncio.to_thread(self.redis.get, key)
+                return json.loads(raw) if raw else None
+            except Exception as e:
+                self._redis_failed(e)
+        raw = self.local.get(key)
+        return json.loads(raw) if raw else None
+
+    async def _set(self, key: str, record: Dict[str, Any], ex: int, nx: bool = False) -> bool:
+        value = json.dumps(record, default=str)
+        if self._redis_available():
+            try:
+                return bool(await asyncio.to_thread(self.redis.set, key, value, ex=ex, nx=nx))
+            except Exception as e:
+                self._redis_failed(e)
+        return self.local.set(key, value, ex=ex, nx=nx)
+
+    async def _delete(self, key: str):
+        if self._redis_available():
+            try:
+                await asyncio.to_thread(self.redis.delete, key)
+                return
+            except Exception as e:
+                self._redis_failed(e)
+        self.local.delete(key)
+
+    # -- public API ---------------------------------------------------------
+
+    async def claim(self, complaint_id: str, version: Any = 1) -> ClaimResult:
+        """Check the ledger before any work starts and take the lease if the event is new."""
+        # SET NX is atomic in Redis; locally there is no await between check and set
+        key = self._key(complaint_id, version)
+        record = {"state": IN_PROGRESS, "claimed_at": time.time()}
+        if await self._set(key, record, ex=LEDGER_LEASE_SECONDS, nx=True):
+            self.stats["claimed"] += 1
+            return ClaimResult(ClaimResult.CLAIMED, record)
+
+        existing = await self._get(key) or {}
+        if existing.get("state") == PROCESSED:
+            self.stats["re_emitted"] += 1
+            return ClaimResult(ClaimResult.PENDING_EMIT, existing)
+
+        self.stats["duplicates_dropped"] += 1
+        return ClaimResult(ClaimResult.DUPLICATE, existing)
+
+    async def record_result(self, complaint_id: str, version: Any, topic: str, payload: Dict[str, Any]):
+        """Store the outgoing event (outbox) before it is emitted."""
+        await self._set(self._key(complaint_id, version), {
+            "state": PROCESSED,
+            "topic": topic,
+            "payload": payload,
+            "processed_at": time.time(),
+        }, ex=LEDGER_TTL_SECONDS)
+
+    async def mark_emitted(self, complaint_id: str, version: Any, topic: str):
+        await self._set(self._key(complaint_id, version), {
+            "state": EMITTED,
+            "topic": topic,
+            "emitted_at": time.time(),
+        }, ex=LEDGER_TTL_SECONDS)
+
+    async def release(self, complaint_id: str, version: Any):
+        """Drop an IN_PROGRESS lease after a failure so the retry path can reprocess."""
+        key = self._key(complaint_id, version)
+        existing = await self._get(key) or {}
+        if existing.get("state") == IN_PROGRESS:
+            await self._delete(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "backend": "redis" if self._redis_available() else "local"}
+
+
+processing_ledger = ProcessingLedger()
@@ -0,0 +1,292 @@
+"""
+Offline Replay Runner for the complaint stream processor.
+
+Backtests threshold or model changes against historical complaint_submitted
+events without touching live traffic. Events are read from an exported
+JSONL / Parquet file or from a Kafka topic time range, pushed through the
+same `enrich_complaint` pipeline the live consumer uses, and the results are
+written to a JSONL file instead of being emitted to Kafka.
+
+- Runs in a process pool; events are sharded by districtId so every
+  district's surge window lives in a single worker and sees events in
+  timestamp order.
+- External calls are offline by default: the OpenAI clients and the vector
+  store are disabled in each worker so spam, classification and duplicate
+  checks use their built-in fallbacks (use --external live to keep them).
+  Offline workers also route against fresh process-local officer load and
+  geo indexes, so a replay never reads or reserves production officer load.
+- Reports events/second and per-stage timings (mean / p50 / p95).
+
+Usage:
+    python -m app.events.replay --input complaints.jsonl --output results.jsonl --workers 8
+    python -m app.events.replay --input complaints.parquet --output results.jsonl
+    python -m app.events.replay --kafka-topic complaint_submitted \\
+        --since 2026-01-01T00:00:00 --until 2026-04-01T00:00:00 --output results.jsonl
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import zlib
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("stream-replay")
+
+TIMESTAMP_FIELDS = ("timestamp", "createdAt", "created_at", "submittedAt")
+STAGES = ("surge", "spam", "classification", "duplicate", "eta", "routing")
+
+
+# ---------------------------------------------------------------------------
+# Readers
+# ---------------------------------------------------------------------------
+
+def _unwrap_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Accept both bare payloads and {"topic": ..., "value": {...}} exports."""
+    if isinstance(record.get("value"), dict):
+        return record["value"]
+    return record
+
+
+def read_jsonl(path: str) -> List[Dict[str, Any]]:
+    events = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(_unwrap_record(json.loads(line)))
+    return events
+
+
+def read_parquet(path: str) -> List[Dict[str, Any]]:
+    # pandas + pyarrow are only needed for Parquet input
+    import pandas as pd
+    df = pd.read_parquet(path)
+    return [_unwrap_record(r) for r in df.to_dict(orient="records")]
+
+
+async def read_kafka_range(topic: str, since: datetime = None, until: datetime = None) -> List[Dict[str, Any]]:
+    from aiokafka import AIOKafkaConsumer, TopicPartition
+    from app.events.kafka_client import KAFKA_BOOTSTRAP_SERVERS
+
+    consumer = AIOKafkaConsumer(
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        enable_auto_commit=False,
+        value_deserializer=lambda m: json.loads(m.decode('utf-8'))
+    )
+    await consumer.start()
+    events = []
+    try:
+        partitions = [TopicPartition(topic, p) for p in (consumer.partitions_for_topic(topic) or [])]
+        consumer.assign(partitions)
+        end_offsets = await consumer.end_offsets(partitions)
+        if since:
+            start = await consumer.offsets_for_times({tp: int(since.timestamp() * 1000) for tp in partitions})
+            for tp, found in start.items():
+                if found is None:
+                    consumer.seek(tp, end_offsets[tp])
+                else:
+                    consumer.seek(tp, found.offset)
+        else:
+            await consumer.seek_to_beginning(*partitions)
+
+        until_ms = int(until.timestamp() * 1000) if until else None
+        remaining = {tp for tp in partitions if await consumer.position(tp) < end_offsets[tp]}
+        while remaining:
+            batches = await consumer.getmany(*remaining, timeout_ms=1000, max_records=5000)
+            for tp, records in batches.items():
+                for msg in records:
+                    if until_ms is not None and msg.timestamp >= until_ms:
+                        remaining.discard(tp)
+                        break
+                    value = dict(msg.value)
+                    value.setdefault("timestamp", msg.timestamp / 1000.0)
+                    events.append(value)
+                if tp in remaining and await consumer.position(tp) >= end_offsets[tp]:
+                    remaining.discard(tp)
+    finally:
+        await consumer.stop()
+    return events
+
+
+def event_time(event: Dict[str, Any], default: float) -> float:
+    for field in TIMESTAMP_FIELDS:
+        value = event.get(field)
+        if value is None:
+            continue
+        if isinstance(value, (int, float)):
+            return value / 1000.0 if value > 1e11 else float(value)  # ms or s epoch
+        try:
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            continue
+    return default
+
+
+def shard_by_district(events: List[Dict[str, Any]], num_shards: int) -> List[List[Dict[str, Any]]]:
+    """Stable districtId sharding so surge windows stay consistent inside one worker."""
+    shards: List[List[Dict[str, Any]]] = [[] for _ in range(num_shards)]
+    for i, event in enumerate(events):
+        district = str(event.get("districtId") or "")
+        idx = zlib.crc32(district.encode()) % num_shards if district else i % num_shards
+        shards[idx].append(event)
+    for shard in shards:
+        shard.sort(key=lambda e: e["_replay_ts"])
+    return [s for s in shards if s]
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+def _init_worker(external: str):
+    logging.getLogger().setLevel(logging.WARNING)
+    if external == "offline":
+        # Disable network clients so every stage falls back to its local path
+        from app.services.spam_service import spam_service
+        from app.services.classification_service import classification_service
+        from app.services.vector_service import vector_store
+        spam_service.client = None
+        classification_service.client = None
+        vector_store.client = None
+        _isolate_officer_state()
+
+
+def _isolate_officer_state():
+    """Swap the shared officer load (Redis) and geo indexes for empty local ones"""
+    from app.services import officer_load as load_module, officer_geo as geo_module
+    replacements = {
+        "officer_load": (load_module.officer_load, load_module.OfficerLoadIndex(redis=None)),
+        "officer_geo": (geo_module.officer_geo, geo_module.OfficerGeoIndex()),
+    }
+    # Modules that already did `from ... import officer_load` hold their own reference
+    for module in list(sys.modules.values()):
+        if not getattr(module, "__name__", "").startswith("app."):
+            continue
+        for name, (shared, local) in replacements.items():
+            if getattr(module, name, None) is shared:
+                setattr(module, name, local)
+
+
+def _process_shard(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return asyncio.run(_process_shard_async(events))
+
+
+async def _process_shard_async(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    from app.events.stream_processor import enrich_complaint
+
+    results = []
+    for event in events:
+        side_events = []
+
+        async def capture(topic: str, payload: dict):
+            side_events.append({"topic": topic, "payload": payload})
+            return True
+
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        try:
+            topic, payload = await enrich_complaint(event, emit=capture, now=event["_replay_ts"], timings=timings)
+            error = None
+        except Exception as e:
+            topic, payload, error = None, None, f"{type(e).__name__}: {e}"
+        timings["total"] = time.perf_counter() - started
+
+        results.append({
+            "complaint_id": event.get("complaint_id"),
+            "topic": topic,
+            "payload": payload,
+            "side_events": side_events,
+            "error": error,
+            "timings": timings,
+        })
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    stage_stats = {}
+    for stage in STAGES + ("total",):
+        samples = np.array([r["timings"][stage] for r in results if stage in r["timings"]])
+        if samples.size == 0:
+            continue
+        stage_stats[stage] = {
+            "mean_ms": round(float(samples.mean()) * 1000, 3),
+            "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 3),
+            "p95_ms": round(float(np.percentile(samples, 95)) * 1000, 3),
+        }
+
+    topics: Dict[str, int] = {}
+    for r in results:
+        key = r["topic"] or "error"
+        topics[key] = topics.get(key, 0) + 1
+
+    return {
+        "events": len(results),
+        "seconds": round(elapsed, 2),
+        "events_per_second": round(len(results) / elapsed, 1) if elapsed > 0 else 0.0,
+        "outcomes": topics,
+        "stages": stage_stats,
+    }
+
+
+def run_replay(events: Iterable[Dict[str, Any]], output: str, workers: int = None,
+               external: str = "offline") -> Dict[str, Any]:
+    workers = workers or os.cpu_count() or 1
+    events = [dict(e) for e in events]
+    for i, event in enumerate(events):
+        event["_replay_ts"] = event_time(event, default=float(i))
+
+    started = time.perf_counter()
+    if workers == 1:
+        _init_worker(external)
+        results = _process_shard(sorted(events, key=lambda e: e["_replay_ts"]))
+    else:
+        shards = shard_by_district(events, num_shards=workers * 4)
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(external,)) as pool:
+            for shard_results in pool.map(_process_shard, shards):
+                results.extend(shard_results)
+    elapsed = time.perf_counter() - started
+
+    with open(output, "w") as f:
+        for r in results:
+            f.write(json.dumps(r, default=str) + "\n")
+
+    report = summarize(results, elapsed)
+    logger.info(f"Replay complete: {json.dumps(report, indent=2)}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay historical complaint events through the stream pipeline")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Exported events (.jsonl or .parquet)")
+    source.add_argument("--kafka-topic", help="Read events from this Kafka topic")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Kafka range start (ISO timestamp)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Kafka range end (ISO timestamp)")
+    parser.add_argument("--output", required=True, help="Where to write results (JSONL)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--external", choices=["offline", "live"], default="offline",
+                        help="offline: fallback paths for LLM/vector calls; live: call external services")
+    args = parser.parse_args()
+
+    if args.kafka_topic:
+        loaded = asyncio.run(read_kafka_range(args.kafka_topic, args.since, args.until))
+    elif args.input.endswith(".parquet"):
+        loaded = read_parquet(args.input)
+    else:
+        loaded = read_jsonl(args.input)
+
+    logger.info(f"Loaded {len(loaded)} events")
+    run_replay(loaded, args.output, workers=args.workers, external=args.external)
@@ -0,0 +1,112 @@
+"""
+Dead-Letter Replay CLI
+
+Re-injects dead-lettered events back onto their original topic once the
+underlying bug has been fixed. Records are read in batches and produced
+without waiting on each send, so a large backlog drains at full producer
+throughput.
+
+Usage:
+    python -m app.events.replay_dlq --topic complaint_submitted
+    python -m app.events.replay_dlq --topic complaint_submitted --error-type KeyError --limit 500
+    python -m app.events.replay_dlq --topic complaint_submitted --dry-run
+
+Offsets are committed only for unfiltered, non-dry runs; a filtered replay
+leaves the DLQ position untouched so the remaining records can still be
+replayed afterwards.
+"""
+import json
+import time
+import asyncio
+import argparse
+import logging
+from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
+from app.events.kafka_client import KAFKA_BOOTSTRAP_SERVERS
+from app.events.dead_letter import dlq_topic, is_envelope, unwrap
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("dlq-replay")
+
+BATCH_SIZE = 500
+IDLE_TIMEOUT_MS = 5000
+
+
+async def replay(topic: str, target: str = None, error_type: str = None,
+                 limit: int = None, dry_run: bool = False) -> dict:
+    source = dlq_topic(topic)
+    consumer = AIOKafkaConsumer(
+        source,
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=f"ai-engine-dlq-replay-{topic}",
+        auto_offset_reset="earliest",
+        enable_auto_commit=False,
+        value_deserializer=lambda m: json.loads(m.decode('utf-8'))
+    )
+    producer = AIOKafkaProducer(
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+        linger_ms=20,
+    )
+    await consumer.start()
+    if not dry_run:
+        await producer.start()
+
+    stats = {"read": 0, "replayed": 0, "skipped": 0}
+    started = time.time()
+    try:
+        while limit is None or stats["replayed"] < limit:
+            batches = await consumer.getmany(timeout_ms=IDLE_TIMEOUT_MS, max_records=BATCH_SIZE)
+            if not batches:
+                break  # DLQ drained
+
+            sends = []
+            processed = {}  # partition -> next offset to commit
+            for tp, records in batches.items():
+                for msg in records:
+                    if limit is not None and stats["replayed"] + len(sends) >= limit:
+                        break
+                    stats["read"] += 1
+                    processed[tp] = msg.offset + 1
+                    if not is_envelope(msg.value):
+                        stats["skipped"] += 1
+                        continue
+                    original_topic, payload, meta = unwrap(msg.value)
+                    last_error = (meta.get("errors") or [{}])[-1]
+                    if error_type and last_error.get("error_type") != error_type:
+                        stats["skipped"] += 1
+                        continue
+
+                    destination = target or original_topic
+                    if dry_run:
+                        logger.info(f"[dry-run] {source}@{msg.offset} -> {destination}: {last_error.get('error_type')}: {last_error.get('error')}")
+                        stats["replayed"] += 1
+                    else:
+                        sends.append(await producer.send(destination, payload))
+
+            if sends:
+                await asyncio.gather(*sends)
+                stats["replayed"] += len(sends)
+            if processed and not dry_run and not error_type:
+                await consumer.commit(processed)
+    finally:
+        await consumer.stop()
+        if not dry_run:
+            await producer.stop()
+
+    elapsed = time.time() - started
+    stats["seconds"] = round(elapsed, 2)
+    stats["events_per_second"] = round(stats["replayed"] / elapsed, 1) if elapsed > 0 else 0.0
+    logger.info(f"Replay of {source} complete: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay dead-lettered Kafka events")
+    parser.add_argument("--topic", required=True, help="Source topic whose DLQ should be replayed, e.g. complaint_submitted")
+    parser.add_argument("--target", help="Override destination topic (defaults to the original topic)")
+    parser.add_argument("--error-type", help="Only replay events whose last failure was this exception type")
+    parser.add_argument("--limit", type=int, help="Maximum number of events to replay")
+    parser.add_argument("--dry-run", action="store_true", help="Log what would be replayed without producing or committing")
+    args = parser.parse_args()
+
+    asyncio.run(replay(args.topic, args.target, args.error_type, args.limit, args.dry_run))
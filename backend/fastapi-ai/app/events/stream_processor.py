@@ -1,10 +1,16 @@
+import time
+import socket
 import logging
 import asyncio
+from contextlib import contextmanager
 from app.events.kafka_client import kafka_client
+from app.events.processing_ledger import processing_ledger, ClaimResult
 from app.services.classification_service import classification_service
 from app.services.spam_service import spam_service
 from app.services.duplicate_service import duplicate_service
-from app.services.routing_service import routing_service
+from app.services.routing_service import routing_service, resolve_department
+from app.services.officer_load import officer_load
+from app.services.officer_geo import officer_geo
 from app.services.ml_model_service import ml_model_service
 from app.services.iot_service import iot_ingestion_service
 from app.services.vision_service import infrastructure_vision_service
@@ -18,10 +24,21 @@ WINDOW_SIZE_SECONDS = 60
 SURGE_THRESHOLD = 5
 DISASTER_MODE_THRESHOLD = 15
 
-async def check_for_regional_surge(district_id: str) -> bool:
+@contextmanager
+def stage_timer(timings: dict, stage: str):
+    """Record wall-clock seconds spent in a pipeline stage (no-op when timings is None)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+async def check_for_regional_surge(district_id: str, now: float = None, emit=None) -> bool:
     if not district_id: return False
     
-    now = asyncio.get_event_loop().time()
+    now = asyncio.get_event_loop().time() if now is None else now
+    emit = emit or kafka_client.emit_event
     if district_id not in regional_windows:
         regional_windows[district_id] = []
     
@@ -31,7 +48,7 @@ async def check_for_regional_surge(district_id: str) -> bool:
     count = len(regional_windows[district_id])
     if count >= SURGE_THRESHOLD:
         logger.warning(f"REGIONAL SURGE DETECTED in {district_id}!")
-        await kafka_client.emit_event("system_alert", {
+        await emit("system_alert", {
             "type": "REGIONAL_SURGE",
             "districtId": district_id,
             "count": count,
@@ -45,18 +62,31 @@ async def process_complaint_event(topic, data):
     # Handle RL Feedback
     if topic == "complaint_resolved":
         from app.events.feedback_handler import process_resolution_feedback
+        await officer_load.release(data.get("complaint_id"))
         await process_resolution_feedback(data)
         return
 
-    # Handle IoT Telemetry
+    # Keep the officer load index in step with assignments (no-op for ones already counted)
+    if topic == "complaint_processed":
+        await track_assignment(data)
+        return
+
+    # Handle IoT Telemetry (state changes and alerts from the telemetry aggregator)
     if topic == "sensor_telemetry":
         # Check for flood risk if it's a water level sensor
         if data.get("type") == "water_level":
-            risk = await predictive_risk_engine.calculate_flood_risk(data.get("value"), 10.0) # 10mm rain as dummy
+            risk = await predictive_risk_engine.calculate_flood_trend_risk(
+                data.get("ewma") or data.get("value"),
+                data.get("rate_per_hour", 0.0),
+                data.get("rainfall_forecast_mm", 10.0), # 10mm rain as dummy until a forecast feed exists
+            )
             if risk > 0.7:
                 await kafka_client.emit_event("system_alert", {
                     "type": "FLOOD_WARNING",
                     "risk_score": risk,
+                    "sensor_id": data.get("sensor_id"),
+                    "water_level": data.get("value"),
+                    "rate_per_hour": data.get("rate_per_hour"),
                     "location": data.get("location")
                 })
         return
@@ -71,14 +101,65 @@ async def process_complaint_event(topic, data):
         return
 
     complaint_id = data.get("complaint_id")
-    
-    # [STREAM ANALYTICS] Track for surge detection
-    complaint_window.append(asyncio.get_event_loop().time())
-    await check_for_surge()
-    
+    event_version = data.get("version", 1)
+
+    # [IDEMPOTENCY] Redeliveries must not re-run spam, classification and LLM calls
+    if complaint_id:
+        claim = await processing_ledger.claim(complaint_id, event_version)
+        if claim.status == ClaimResult.DUPLICATE:
+            logger.info(f"Skipping redelivered complaint {complaint_id} (v{event_version})")
+            return
+        if claim.status == ClaimResult.PENDING_EMIT:
+            logger.info(f"Re-emitting stored result for complaint {complaint_id} (v{event_version})")
+            await emit_with_ledger(complaint_id, event_version, claim.record["topic"], claim.record["payload"])
+            await track_assignment(claim.record["payload"])
+            return
+
+    try:
+        result_topic, result = await enrich_complaint(data)
+    except Exception:
+        if complaint_id:
+            await processing_ledger.release(complaint_id, event_version)
+        raise
+
+    await emit_with_ledger(complaint_id, event_version, result_topic, result)
+    # Reserve the officer now rather than when complaint_processed comes back,
+    # so complaints arriving together in a surge see each other's load
+    await track_assignment(result)
+    logger.info(f"AI Processing complete for {data.get('ticketId')}. Emitted '{result_topic}'.")
+
+async def emit_with_ledger(complaint_id, event_version, topic: str, payload: dict):
+    """Outbox-style emit: the result is stored before it is sent, and marked done only once Kafka acknowledges it."""
+    if not complaint_id:
+        await kafka_client.emit_event(topic, payload)
+        return
+    await processing_ledger.record_result(complaint_id, event_version, topic, payload)
+    if not await kafka_client.emit_event(topic, payload):
+        # Leave the record PROCESSED so the retry path re-emits without recomputing
+        raise RuntimeError(f"Emit to {topic} failed for complaint {complaint_id}")
+    await processing_ledger.mark_emitted(complaint_id, event_version, topic)
+
+async def track_assignment(payload: dict):
+    """Count a complaint_processed payload's officer assignment in the live load index."""
+    officer = payload.get("assigned_officer")
+    if officer:
+        department = resolve_department((payload.get("analysis") or {}).get("category"))
+        await officer_load.assign(payload.get("complaint_id"), department, officer)
+
+async def enrich_complaint(data: dict, emit=None, now: float = None, timings: dict = None) -> tuple:
+    """
+    Run the complaint pipeline (spam -> classify -> dedup -> ETA -> routing)
+    and return the (topic, payload) to publish, without publishing it.
+
+    Shared by the live consumer and the offline replay runner
+    (app/events/replay.py), which passes its own `emit` for side alerts,
+    the event's own timestamp as `now`, and a dict to collect stage timings.
+    """
+    complaint_id = data.get("complaint_id")
     ticket_id = data.get("ticketId")
     text = data.get("description")
     lat, lon = data.get("latitude"), data.get("longitude")
+    now = asyncio.get_event_loop().time() if now is None else now
     
     # Regional Metadata for Multi-tenancy
     state_id = data.get("stateId")
@@ -87,45 +168,50 @@ async def process_complaint_event(topic, data):
     ward_id = data.get("wardId")
 
     # [GEO-SPATIAL ANALYTICS] Track for regional surge detection
-    if district_id:
-        regional_windows.setdefault(district_id, []).append(asyncio.get_event_loop().time())
-        is_surge = await check_for_regional_surge(district_id)
-        
-        # DISASTER MODE: Auto-escalate if surge is severe
-        is_disaster = len(regional_windows.get(district_id, [])) >= DISASTER_MODE_THRESHOLD
-    else:
-        is_surge = False
-        is_disaster = False
+    with stage_timer(timings, "surge"):
+        if district_id:
+            regional_windows.setdefault(district_id, []).append(now)
+            is_surge = await check_for_regional_surge(district_id, now=now, emit=emit)
+            
+            # DISASTER MODE: Auto-escalate if surge is severe
+            is_disaster = len(regional_windows.get(district_id, [])) >= DISASTER_MODE_THRESHOLD
+        else:
+            is_surge = False
+            is_disaster = False
 
     # 1. Spam Detection
-    spam_result = await spam_service.check_spam(text)
+    with stage_timer(timings, "spam"):
+        spam_result = await spam_service.check_spam(text)
     if spam_result.is_spam:
-        await kafka_client.emit_event("complaint_rejected", {
+        return "complaint_rejected", {
             "complaint_id": complaint_id,
             "reason": "SPAM_DETECTED",
             "score": spam_result.spam_score,
             "ticketId": ticket_id,
             "districtId": district_id # Pass through for bridge filtering
-        })
-        return
+        }
 
     # 2. Classification & Analysis
-    analysis = await classification_service.classify_complaint(text)
+    with stage_timer(timings, "classification"):
+        analysis = await classification_service.classify_complaint(text)
     
     # 3. Duplicate Detection
-    dup_result = await duplicate_service.check_duplicate(text, lat, lon)
+    with stage_timer(timings, "duplicate"):
+        dup_result = await duplicate_service.check_duplicate(text, lat, lon, complaint_id=complaint_id)
     
     # 4. Predict ETA (Enhanced by disaster mode)
-    eta = await ml_model_service.predict_eta(analysis.category, analysis.severity, 0.5)
+    with stage_timer(timings, "eta"):
+        eta = await ml_model_service.predict_eta(analysis.category, analysis.severity, 0.5)
     if is_disaster:
         analysis.severity = "CRITICAL" # Auto-escalation
         eta.estimated_days = 1 # Urgent resolution
 
     # 5. Routing
-    routing = await routing_service.route_complaint(analysis.category, analysis.severity, lat, lon)
+    with stage_timer(timings, "routing"):
+        routing = await routing_service.route_complaint(analysis.category, analysis.severity, lat, lon)
 
-    # Emit Processed Event (with enrichment)
-    processed_data = {
+    # Processed Event (with enrichment)
+    return "complaint_processed", {
         "complaint_id": complaint_id,
         "ticketId": ticket_id,
         "is_disaster_mode": is_disaster,
@@ -136,8 +222,8 @@ async def process_complaint_event(topic, data):
             "reasoning": analysis.reasoning
         },
         "is_duplicate": dup_result.is_duplicate,
-        "status": "IN_PROGRESS" if routing.assigned_officer else "PENDING",
-        "assigned_officer": routing.assigned_officer,
+        "status": "IN_PROGRESS" if routing.officer_id else "PENDING",
+        "assigned_officer": routing.officer_id,
         "eta_days": eta.estimated_days,
         # Regional Scoping
         "stateId": state_id,
@@ -145,13 +231,32 @@ async def process_complaint_event(topic, data):
         "cityId": city_id,
         "wardId": ward_id
     }
-    
-    await kafka_client.emit_event("complaint_processed", processed_data)
-    logger.info(f"AI Processing complete for {ticket_id}. Emitted 'complaint_processed'.")
+
+async def process_officer_location(topic, data):
+    """Apply an officer position update to this pod's geo dispatch index."""
+    if data.get("latitude") is None or data.get("longitude") is None:
+        return
+    if not officer_geo.in_bounds(float(data["latitude"]), float(data["longitude"])):
+        # Retrying cannot fix a position outside the service area
+        logger.warning(f"Ignoring position of officer {data.get('officer_id')} outside the service area")
+        return
+    officer_geo.update(
+        data["officer_id"], resolve_department(data.get("department")),
+        float(data["latitude"]), float(data["longitude"]),
+        available=data.get("available", True), timestamp=data.get("timestamp"),
+    )
 
 async def start_event_processing():
-    topics = ["complaint_submitted", "complaint_resolved", "sensor_telemetry", "vision_event"]
+    topics = ["complaint_submitted", "complaint_processed", "complaint_resolved", "sensor_telemetry", "vision_event"]
     try:
-        await kafka_client.consume_events(topics, process_complaint_event)
+        # Failed events move through delayed retry topics instead of stopping the main consumer
+        await asyncio.gather(
+            kafka_client.consume_events(topics, process_complaint_event),
+            kafka_client.consume_retry_events(topics, process_complaint_event),
+            # Every pod keeps a full geo index, so positions are broadcast (one group per pod)
+            kafka_client.consume_events(["officer_location"], process_officer_location,
+                                        group_id=f"ai-engine-geo-{socket.gethostname()}"),
+            officer_load.run_reconciliation(),
+        )
     except Exception as e:
         logger.error(f"Kafka processing pipeline failed to start: {e}. Event processing disabled.")
@@ -4,31 +4,98 @@ import logging
 
 logger = logging.getLogger("ai-engine")
 
+# Laplace noise is drawn in chunks so DP does not need a third model-sized buffer
+DP_NOISE_CHUNK = 1 << 20
+LAPLACE_U_MAX = float(np.nextafter(np.float32(0.5), np.float32(0)))
+
+
+class FedAvgAccumulator:
+    """
+    Streaming FedAvg over flat parameter buffers: each district update is
+    folded into one preallocated float32 sum as it arrives, so peak memory is
+    the sum plus the update in flight, whatever the number of districts.
+    Updates may be float16 or float32 (numpy arrays or tensors, no copies).
+    """
+
+    def __init__(self, numel: int):
+        self.sum = torch.zeros(numel, dtype=torch.float32)
+        self.total_samples = 0
+        self.count = 0
+
+    def add(self, update, sample_size: int):
+        self.sum.add_(torch.as_tensor(update), alpha=float(sample_size))
+        self.total_samples += sample_size
+        self.count += 1
+
+    def add_sparse(self, indices: torch.Tensor, values, sample_size: int):
+        """Fold in a sparse update (int64 indices, values); untouched entries count as zero"""
+        self.sum.index_add_(0, indices, torch.as_tensor(values), alpha=float(sample_size))
+        self.total_samples += sample_size
+        self.count += 1
+
+    def average(self) -> torch.Tensor:
+        """Weighted mean, computed in place in the sum buffer"""
+        if not self.total_samples:
+            raise ValueError("No district updates to average")
+        return self.sum.div_(self.total_samples)
+
+
 class SecureAggregator:
     def __init__(self, dp_epsilon=0.1, dp_delta=1e-5):
         self.dp_epsilon = dp_epsilon
         self.dp_delta = dp_delta
 
-    def federated_averaging(self, district_weights, sample_sizes):
-        """Standard FedAvg implementation"""
-        if not district_weights:
+    def new_accumulator(self, numel: int) -> FedAvgAccumulator:
+        return FedAvgAccumulator(numel)
+
+    def finalize(self, accumulator: FedAvgAccumulator) -> torch.Tensor:
+        """Average a streamed round and apply differential privacy, in place"""
+        return self.add_dp_noise(accumulator.average())
+
+    def federated_averaging(self, district_weights, sample_sizes, out=None):
+        """
+        Standard FedAvg over flat updates: one weighted tensordot across the
+        stacked (districts, params) updates. Pass an already stacked
+        array/tensor to avoid the stacking copy, and `out` to reuse a buffer.
+        """
+        if district_weights is None or len(district_weights) == 0:
             return None
-        
-        total_samples = sum(sample_sizes)
+
+        stacked = torch.as_tensor(district_weights) if not isinstance(district_weights, (list, tuple)) \
+            else torch.stack([torch.as_tensor(w) for w in district_weights])
+        sizes = torch.as_tensor(sample_sizes, dtype=torch.float32)
+        coefficients = sizes / sizes.sum()
+        if out is None:
+            out = torch.empty(stacked.shape[1:], dtype=torch.float32)
+
         # Weighted average of weights
-        avg_weights = []
-        for i in range(len(district_weights[0])):
-            layer_avg = np.zeros_like(district_weights[0][i])
-            for dw, size in zip(district_weights, sample_sizes):
-                layer_avg += dw[i] * (size / total_samples)
-            
-            # Apply Differential Privacy (Laplacian Noise)
-            noise = np.random.laplace(0, self.dp_epsilon, layer_avg.shape)
-            layer_avg += noise
-            
-            avg_weights.append(layer_avg)
-            
-        return avg_weights
+        if stacked.dtype == torch.float32:
+            torch.tensordot(coefficients, stacked, dims=1, out=out)
+        else:
+            # Half-precision updates accumulate in float32 without upcasting the whole stack
+            out.zero_()
+            for update, coefficient in zip(stacked, coefficients.tolist()):
+                out.add_(update, alpha=coefficient)
+
+        # Apply Differential Privacy (Laplacian Noise)
+        return self.add_dp_noise(out)
+
+    def add_dp_noise(self, flat: torch.Tensor) -> torch.Tensor:
+        """Add Laplace(0, dp_epsilon) noise to every element in place"""
+        if not self.dp_epsilon:
+            return flat
+        scratch = torch.empty(min(DP_NOISE_CHUNK, flat.numel()), dtype=flat.dtype)
+        view = flat.view(-1)
+        for start in range(0, view.numel(), DP_NOISE_CHUNK):
+            chunk = view[start:start + DP_NOISE_CHUNK]
+            noise = scratch[:chunk.numel()]
+            # Inverse CDF: -b * sign(u) * log(1 - 2|u|), u ~ U(-0.5, 0.5)
+            noise.uniform_(-0.5, 0.5)
+            sign = torch.sign(noise)
+            # |u| = 0.5 would give log(0); clamp to the largest float32 below it
+            noise.abs_().clamp_(max=LAPLACE_U_MAX).mul_(-2).log1p_().mul_(sign).mul_(-self.dp_epsilon)
+            chunk.add_(noise)
+        return flat
 
     def check_drift(self, global_weights, local_weights, threshold=0.5):
         """Detect if a district's model is drifting significantly from the global model"""
@@ -36,7 +103,7 @@ class SecureAggregator:
         for gw, lw in zip(global_weights, local_weights):
             dist = np.linalg.norm(gw - lw)
             drifts.append(dist)
-        
+
         avg_drift = np.mean(drifts)
         return avg_drift > threshold, avg_drift
 
@@ -1,78 +1,239 @@
+"""
+Federated learning coordinator.
+
+A round trains every district in parallel in a process pool (one process per
+district up to FEDERATED_WORKERS), so round time follows the slowest district
+instead of the sum of all of them, and the event loop stays free while it
+runs. The global weights are published once per round into a shared-memory
+segment that every worker maps, rather than being pickled to each district.
+District data is loaded at the node, not shipped from the API.
+
+Districts send back compressed deltas (see app.federated.codec), folded into
+the FedAvg sum as they arrive; the averaged delta is added to the global
+weights. Round summaries report update bytes and the ratio against dense
+float32 weights, each district's accuracy on its own held-out data, and the
+aggregated global model's accuracy on a held-out set no district trains on.
+
+Rounds run as background jobs: start_round() returns a job id immediately and
+get_job() reports queued / running / completed / failed. Rounds are serialised
+because each one builds on the previous global model.
+"""
 import os
+import time
+import uuid
 import torch
+import asyncio
 import logging
-from typing import List, Dict
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Any, List, Dict, Optional
 import numpy as np
-from app.federated.models import ComplaintClassifier, ETAPredictor, get_model_parameters, set_model_parameters
+from app.federated.models import (
+    ComplaintClassifier, ETAPredictor, get_model_parameters, set_model_parameters,
+    parameter_layout, write_flat_parameters, load_flat_parameters,
+)
 from app.federated.aggregator import secure_aggregator
-from app.federated.node import DistrictNode
+from app.federated.codec import UpdateCodec
+from app.federated.node import (
+    DistrictNode, train_district, init_federated_worker, simulate_complaints, EVALUATION_SEED,
+)
 
 logger = logging.getLogger("ai-engine")
 
+FEDERATED_WORKERS = int(os.getenv("FEDERATED_WORKERS", str(min(4, os.cpu_count() or 1))))  # 0 = in-process threads
+FEDERATED_WORKER_THREADS = int(os.getenv("FEDERATED_WORKER_THREADS", "1"))
+FEDERATED_LOCAL_EPOCHS = int(os.getenv("FEDERATED_LOCAL_EPOCHS", "5"))
+FEDERATED_EVAL_SAMPLES = int(os.getenv("FEDERATED_EVAL_SAMPLES", "1000"))
+FEDERATED_MAX_JOBS = 50
+
 class FederatedCoordinator:
-    def __init__(self):
+    def __init__(self, codec: Optional[UpdateCodec] = None, workers: int = FEDERATED_WORKERS):
+        self.codec = codec or UpdateCodec()
+        self.workers = workers
         self.global_classifier = ComplaintClassifier()
         self.global_eta_predictor = ETAPredictor()
         self.nodes: Dict[str, DistrictNode] = {}
         self.history = []
         self.current_round = 0
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tasks = set()
+        self._round_lock = asyncio.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._global_segment: Optional[shared_memory.SharedMemory] = None
+        self._residual_segments: Dict[str, shared_memory.SharedMemory] = {}  # district -> error feedback
+        self._numel = sum(numel for _, _, _, numel in parameter_layout(self.global_classifier))
+        self._evaluation_set = None
 
     def register_node(self, district_id: str):
         if district_id not in self.nodes:
             self.nodes[district_id] = DistrictNode(district_id)
             logger.info(f"Registered district node: {district_id}")
 
-    async def run_federated_round(self, simulated_data: Dict[str, tuple]):
+    # -- background jobs ----------------------------------------------------
+
+    def start_round(self, district_ids: List[str], samples_per_district: int = 100) -> Dict[str, Any]:
+        """Queue a round as a background job and return its status record"""
+        job_id = uuid.uuid4().hex[:12]
+        job = {"job_id": job_id, "status": "queued", "districts": list(district_ids),
+               "queued_at": time.time(), "started_at": None, "finished_at": None, "result": None, "error": None}
+        self.jobs[job_id] = job
+        while len(self.jobs) > FEDERATED_MAX_JOBS:
+            self.jobs.popitem(last=False)
+
+        task = asyncio.get_running_loop().create_task(self._run_job(job, district_ids, samples_per_district))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return dict(job)
+
+    async def _run_job(self, job: Dict[str, Any], district_ids: List[str], samples_per_district: int):
+        async with self._round_lock:
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            try:
+                job["result"] = await self.run_federated_round(district_ids, samples_per_district)
+                job["status"] = "completed"
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = f"{type(e).__name__}: {e}"
+                logger.error(f"Federated round job {job['job_id']} failed: {e}")
+            finally:
+                job["finished_at"] = time.time()
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    # -- rounds -------------------------------------------------------------
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            # spawn: forking a process with live torch / event-loop threads is not safe
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"),
+                                             initializer=init_federated_worker,
+                                             initargs=(FEDERATED_WORKER_THREADS,))
+        return self._pool
+
+    def _publish_global_weights(self) -> str:
+        """Write the global classifier into the shared segment workers read from"""
+        if self._global_segment is None:
+            self._global_segment = shared_memory.SharedMemory(create=True, size=self._numel * 4)
+        write_flat_parameters(self.global_classifier, self._global_flat())
+        return self._global_segment.name
+
+    def _global_flat(self) -> np.ndarray:
+        return np.ndarray((self._numel,), dtype=np.float32, buffer=self._global_segment.buf)
+
+    def _residual_name(self, district_id: str) -> Optional[str]:
+        """Error-feedback buffer of a district, created zeroed on its first lossy round"""
+        if not (self.codec.lossy and self.codec.error_feedback):
+            return None
+        segment = self._residual_segments.get(district_id)
+        if segment is None:
+            segment = self._residual_segments[district_id] = shared_memory.SharedMemory(
+                create=True, size=self._numel * 4)
+        return segment.name
+
+    async def run_federated_round(self, district_ids: List[str], samples_per_district: int = 100):
         """
-        Run one round of Federated Learning.
-        simulated_data: {district_id: (data_tensor, label_tensor)}
+        Run one round of Federated Learning across the given districts.
+        Each district trains on its own local data in a worker process.
         """
+        if not district_ids:
+            raise ValueError("A federated round needs at least one district")
         self.current_round += 1
         logger.info(f"Starting Federated Round {self.current_round}")
-        
-        district_weights = []
+        started = time.perf_counter()
+
+        for district_id in district_ids:
+            self.register_node(district_id)
+
+        # 1. Sync global model to nodes (one shared copy)
+        weights_name = self._publish_global_weights()
+
+        # 2. Local training + evaluation, all districts at once; each update
+        # frame is decoded into the running FedAvg sum of deltas as it arrives
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        accumulator = secure_aggregator.new_accumulator(self._numel)
         sample_sizes = []
         round_metrics = []
+        update_bytes = 0
+        futures = [
+            loop.run_in_executor(pool, train_district, district_id, weights_name, self._numel,
+                                 samples_per_district, FEDERATED_LOCAL_EPOCHS,
+                                 self.codec, self._residual_name(district_id))
+            for district_id in district_ids
+        ]
+        try:
+            for future in asyncio.as_completed(futures):
+                frame, size, metrics = await future
+                update_bytes += self.codec.accumulate(frame, accumulator, size)
+                sample_sizes.append(size)
+                round_metrics.append(metrics)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool for the next round
+            self._pool = None
+            raise
+
+        # 3. Secure Aggregation (average + DP noise in place, off the event loop)
+        aggregated = await asyncio.to_thread(secure_aggregator.finalize, accumulator)
+
+        # 4. Update global model in place: global + averaged delta
+        load_flat_parameters(self.global_classifier, torch.from_numpy(self._global_flat()).add_(aggregated))
+
+        # 5. Score the aggregated model on data no district trained on
+        global_accuracy = await asyncio.to_thread(self.evaluate_global)
 
-        for district_id, (data, labels) in simulated_data.items():
-            node = self.nodes.get(district_id)
-            if not node:
-                self.register_node(district_id)
-                node = self.nodes[district_id]
-            
-            # 1. Sync global model to node
-            node.update_model(get_model_parameters(self.global_classifier))
-            
-            # 2. Local training
-            weights, size = node.train_local(data, labels)
-            district_weights.append(weights)
-            sample_sizes.append(size)
-            
-            # 3. Evaluate
-            metrics = node.get_performance_metrics(data, labels)
-            round_metrics.append(metrics)
-
-        # 4. Secure Aggregation
-        aggregated_weights = secure_aggregator.federated_averaging(district_weights, sample_sizes)
-        
-        # 5. Update global model
-        set_model_parameters(self.global_classifier, aggregated_weights)
-        
         # 6. Save round history
         round_summary = {
             "round": self.current_round,
-            "avg_accuracy": np.mean([m["accuracy"] for m in round_metrics]),
+            "global_accuracy": global_accuracy,
+            "avg_accuracy": float(np.mean([m["accuracy"] for m in round_metrics])),
             "district_metrics": round_metrics,
-            "total_samples": sum(sample_sizes)
+            "total_samples": sum(sample_sizes),
+            "round_seconds": round(time.perf_counter() - started, 3),
+            "slowest_district_seconds": max(m["train_seconds"] for m in round_metrics),
+            "codec": self.codec.describe(),
+            "update_bytes": update_bytes,
+            "compression_ratio": round(self._numel * 4 * len(round_metrics) / max(update_bytes, 1), 1),
         }
         self.history.append(round_summary)
-        logger.info(f"Round {self.current_round} complete. Avg Accuracy: {round_summary['avg_accuracy']:.4f}")
-        
+        logger.info(f"Round {self.current_round} complete in {round_summary['round_seconds']}s. "
+                    f"Global Accuracy: {global_accuracy:.4f}, Avg District Accuracy: {round_summary['avg_accuracy']:.4f}")
+
         return round_summary
 
+    def evaluate_global(self) -> float:
+        """Accuracy of the global classifier on the held-out evaluation set"""
+        if self._evaluation_set is None:
+            self._evaluation_set = simulate_complaints(
+                FEDERATED_EVAL_SAMPLES, EVALUATION_SEED, self.global_classifier.fc1.in_features,
+                self.global_classifier.fc3.out_features)
+        data, labels = self._evaluation_set
+        self.global_classifier.eval()
+        with torch.no_grad():
+            return float((self.global_classifier(data).argmax(dim=1) == labels).float().mean())
+
     def get_latest_metrics(self):
         if not self.history:
             return None
         return self.history[-1]
 
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._global_segment is not None:
+            self._global_segment.close()
+            self._global_segment.unlink()
+            self._global_segment = None
+        for segment in self._residual_segments.values():
+            segment.close()
+            segment.unlink()
+        self._residual_segments.clear()
+
 federated_coordinator = FederatedCoordinator()
@@ -36,5 +36,26 @@ def get_model_parameters(model):
 
 def set_model_parameters(model, parameters):
     params_dict = zip(model.state_dict().keys(), parameters)
-    state_dict = {k: torch.tensor(v) for k, v in params_dict}
+    state_dict = {k: torch.as_tensor(v) for k, v in params_dict}  # load_state_dict does the one copy
     model.load_state_dict(state_dict, strict=True)
+
+def parameter_layout(model):
+    """[(name, shape, offset, numel)] of the state dict laid out in one flat float32 buffer"""
+    layout, offset = [], 0
+    for name, val in model.state_dict().items():
+        layout.append((name, tuple(val.shape), offset, val.numel()))
+        offset += val.numel()
+    return layout
+
+def write_flat_parameters(model, out):
+    """Copy the model's parameters into a flat float32 buffer (numpy array or tensor)"""
+    flat = torch.as_tensor(out)
+    for (_, _, offset, numel), val in zip(parameter_layout(model), model.state_dict().values()):
+        flat[offset:offset + numel].copy_(val.reshape(-1))
+
+def load_flat_parameters(model, flat):
+    """Copy parameters from a flat float32 buffer into the model in place"""
+    flat = torch.as_tensor(flat)
+    with torch.no_grad():
+        for (_, shape, offset, numel), val in zip(parameter_layout(model), model.state_dict().values()):
+            val.copy_(flat[offset:offset + numel].view(shape))
@@ -1,9 +1,34 @@
+import time
+import zlib
 import torch
 import torch.optim as optim
 import torch.nn as nn
-from app.federated.models import ComplaintClassifier, ETAPredictor, get_model_parameters, set_model_parameters
+from multiprocessing import shared_memory
+from app.federated.models import (
+    ComplaintClassifier, ETAPredictor, get_model_parameters, set_model_parameters,
+    load_flat_parameters, write_flat_parameters,
+)
+from app.federated.codec import UpdateCodec
 import numpy as np
 
+# Fixed so every district (and evaluation) draws from the same complaint "vocabulary"
+SIMULATION_SEED = 2024
+# Held-out set the coordinator scores the global model on; no district trains on it
+EVALUATION_SEED = 99_991
+
+def simulate_complaints(samples, seed, input_dim=5000, num_classes=5, class_weights=None):
+    """
+    Synthetic complaint features: each category lights up its own sparse set of
+    input features, on top of unit Gaussian noise. Learnable, unlike pure noise,
+    so accuracy means something in simulations.
+    """
+    prototypes = np.random.default_rng(SIMULATION_SEED).random((num_classes, input_dim)) < 0.01
+    rng = np.random.default_rng(seed)
+    labels = rng.choice(num_classes, size=samples, p=class_weights)
+    data = rng.standard_normal((samples, input_dim), dtype=np.float32)
+    data += prototypes[labels]
+    return torch.from_numpy(data), torch.from_numpy(labels)
+
 class DistrictNode:
     def __init__(self, district_id):
         self.district_id = district_id
@@ -41,3 +66,84 @@ class DistrictNode:
 
     def update_model(self, global_parameters):
         set_model_parameters(self.classifier, global_parameters)
+
+    def load_local_data(self, samples=100, holdout=False):
+        """
+        Simulated district dataset; stays at the node instead of being shipped
+        from the coordinator. holdout=True draws a separate evaluation sample
+        from the same district distribution.
+        """
+        seed = zlib.crc32(self.district_id.encode())
+        num_classes = self.classifier.fc3.out_features
+        # Districts see different complaint mixes (non-IID), as real ones do
+        class_weights = np.random.default_rng(seed).dirichlet(np.ones(num_classes))
+        return simulate_complaints(samples, seed + (2 if holdout else 1), self.classifier.fc1.in_features,
+                                   num_classes, class_weights)
+
+    def encode_update(self, global_flat, codec, residual=None):
+        """
+        Compress the local model's change against the global weights. With a
+        residual buffer, what the codec drops is kept there and sent in later
+        rounds (error feedback).
+        """
+        delta = np.empty(global_flat.size, dtype=np.float32)
+        write_flat_parameters(self.classifier, delta)
+        np.subtract(delta, global_flat, out=delta)
+        if residual is not None:
+            delta += residual
+
+        frame, indices, sent = codec.encode(delta)
+        if residual is not None:
+            if indices is None:
+                np.subtract(delta, sent, out=residual)
+            else:
+                residual[:] = delta
+                residual[indices] -= sent
+        return frame
+
+
+# ---------------------------------------------------------------------------
+# Process-pool entry points (run inside federated worker processes)
+# ---------------------------------------------------------------------------
+
+_worker_nodes = {}
+_worker_segments = {}
+
+def init_federated_worker(threads: int):
+    torch.set_num_threads(threads)
+
+def _attach_segment(name: str, numel: int) -> np.ndarray:
+    segment = _worker_segments.get(name)
+    if segment is None:
+        # Spawned workers share the coordinator's resource tracker, which unlinks the segment
+        segment = _worker_segments[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray((numel,), dtype=np.float32, buffer=segment.buf)
+
+def train_district(district_id: str, weights_name: str, numel: int, samples: int = 100, epochs: int = 5,
+                   codec: UpdateCodec = None, residual_name: str = None):
+    """
+    One district's share of a round: load the global weights from shared
+    memory, train on local data, evaluate on held-out local data, and encode
+    the delta.
+    Returns (update frame, size, metrics).
+
+    The error-feedback residual is district state, but the pool does not pin
+    a district to a process, so it lives in a per-district shared segment
+    (residual_name) rather than in the worker.
+    """
+    started = time.perf_counter()
+    node = _worker_nodes.get(district_id)
+    if node is None:
+        node = _worker_nodes[district_id] = DistrictNode(district_id)
+
+    global_flat = _attach_segment(weights_name, numel)
+    load_flat_parameters(node.classifier, global_flat)
+    data, labels = node.load_local_data(samples)
+    _, size = node.train_local(data, labels, epochs=epochs)
+    metrics = node.get_performance_metrics(*node.load_local_data(samples, holdout=True))
+
+    residual = _attach_segment(residual_name, numel) if residual_name else None
+    frame = node.encode_update(global_flat, codec or UpdateCodec(), residual)
+    metrics["update_bytes"] = len(frame)
+    metrics["train_seconds"] = round(time.perf_counter() - started, 3)
+    return frame, size, metrics
@@ -53,21 +53,93 @@ async def startup_event():
         # Production: Start full event processing
         try:
             from app.events.stream_processor import start_event_processing
-            asyncio.create_task(start_event_processing())
+            app.state.event_processing = asyncio.create_task(start_event_processing())
             logger.info("Kafka processing pipeline started in background")
         except Exception as e:
             logger.warning(f"Kafka processing disabled: {e}")
+        
+        try:
+            from app.services.iot_service import iot_ingestion_service
+            app.state.telemetry_flush = asyncio.create_task(iot_ingestion_service.run_rollup_flusher())
+        except Exception as e:
+            logger.warning(f"Telemetry rollup flusher disabled: {e}")
+    
+    # Initialize AI/ML models in the background (with fallback); /health and
+    # fallback paths are served while heavy models are still loading
+    async def load_models():
+        # Inference workers (opt-in via INFERENCE_WORKERS) load the models they
+        # serve in their own forkserver template, in parallel with the models
+        # this process preloads; those are skipped here
+        workers = None
+        try:
+            from app.services.model_loader import get_model_loader
+            from app.services.inference_workers import create_inference_workers, start_inference_workers
+            pool = create_inference_workers()
+            if pool is not None:
+                get_model_loader().remote = list(pool.models)
+                workers = asyncio.ensure_future(asyncio.to_thread(start_inference_workers))
+        except Exception as e:
+            logger.warning(f"Inference workers disabled - serving in-process: {e}")
+        
+        try:
+            from app.services.model_loader import initialize_models
+            model_success = await initialize_models()
+            if model_success:
+                logger.info("AI/ML models initialized successfully")
+            else:
+                logger.warning("AI/ML models failed to initialize - using fallback mode")
+        except Exception as e:
+            logger.warning(f"Model initialization error - using fallback mode: {e}")
+        finally:
+            # Even when cancelled at shutdown, let the pool finish starting so it can be stopped
+            if workers is not None:
+                try:
+                    await workers
+                except Exception as e:
+                    logger.warning(f"Inference workers failed to start - serving in-process: {e}")
+    
+    # Keep references: the event loop only holds tasks weakly
+    app.state.model_loading = asyncio.create_task(load_models())
+
+
+async def _cancel_background_task(name: str):
+    task = getattr(app.state, name, None)
+    if task is None:
+        return
+    if not task.done():
+        task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.warning(f"Background task '{name}' failed: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await _cancel_background_task("model_loading")
+    await _cancel_background_task("event_processing")
+    await _cancel_background_task("telemetry_flush")
+    
+    try:
+        from app.rl import rl_agent, replay_learner
+        await replay_learner.close()
+        await rl_agent.persistence.close()
+    except Exception as e:
+        logger.warning(f"RL policy persistence shutdown error: {e}")
     
-    # Initialize AI/ML models (with fallback)
     try:
-        from app.services.model_loader import initialize_models
-        model_success = await initialize_models()
-        if model_success:
-            logger.info("AI/ML models initialized successfully")
-        else:
-            logger.warning("AI/ML models failed to initialize - using fallback mode")
+        from app.federated.coordinator import federated_coordinator
+        await asyncio.to_thread(federated_coordinator.close)
+    except Exception as e:
+        logger.warning(f"Federated worker shutdown error: {e}")
+
+    try:
+        from app.services.inference_workers import stop_inference_workers
+        await asyncio.to_thread(stop_inference_workers)
     except Exception as e:
-        logger.warning(f"Model initialization error - using fallback mode: {e}")
+        logger.warning(f"Inference worker shutdown error: {e}")
 
 # ---------------------------------------------------------------------------
 # Middleware
@@ -88,7 +160,7 @@ from app.config import settings
 async def verify_internal_token(request: Request, call_next):
     path = request.url.path
     # Allow health checks and API documentation
-    if path in ["/", "/health", "/openapi.json"] or path.startswith("/docs") or path.startswith("/redoc"):
+    if path in ["/", "/health", "/ready", "/openapi.json"] or path.startswith("/docs") or path.startswith("/redoc"):
         return await call_next(request)
     
     # Internal service token verification
@@ -128,8 +200,30 @@ def health_check():
         "service": "JanSankalp AI Engine",
         "version": "2.0.0",
         "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "models": _model_readiness(),
     }
 
+
+@app.get("/ready")
+def readiness_check():
+    # Readiness probe: 503 until the node's preloaded models are in memory
+    from fastapi.responses import JSONResponse
+    readiness = _model_readiness()
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+
+def _model_readiness():
+    try:
+        from app.services.model_loader import get_model_loader
+        from app.services.inference_workers import get_inference_pool
+        readiness = get_model_loader().get_readiness()
+        pool = get_inference_pool()
+        if pool is not None and not pool.ready:
+            readiness = {**readiness, 'ready': False, 'inference_workers': "starting"}
+        return readiness
+    except Exception as e:
+        return {"ready": False, "state": "unavailable", "error": str(e)}
+
 # Mount All AI Routes
 app.include_router(ai_router)
 app.include_router(models_router, prefix="/models", tags=["models"])
@@ -47,9 +47,9 @@ class ComplaintClassifier(nn.Module):
         self.severity_predictor = nn.Linear(prev_dim, 5)  # Severity 1-5
         self.urgency_predictor = nn.Linear(prev_dim, 3)   # Low, Medium, High
         
-        # Attention mechanism for important features
+        # Attention mechanism for important features (applied to the input embedding)
         self.attention = nn.MultiheadAttention(
-            embed_dim=prev_dim, 
+            embed_dim=input_dim, 
             num_heads=8, 
             dropout=dropout_rate,
             batch_first=True
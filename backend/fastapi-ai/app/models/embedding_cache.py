@@ -0,0 +1,177 @@
+"""
+Embedding Cache
+Bounded LRU cache for transformer embeddings, stored as float16.
+
+Keys are a hash of the normalized text plus the model revision/backend, so a
+model upgrade never serves stale vectors. The in-memory tier is bounded by
+both entry count and bytes. When a spill directory is configured, entries
+evicted from memory move to fixed-size memory-mapped shards on disk; a hit
+there is promoted back into memory. The oldest shard is recycled once the
+spill tier is full.
+
+All methods take a lock, so the cache is safe to share between coroutines
+and the worker threads they offload inference to.
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("ai-engine.embedding-cache")
+
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("NLP_EMBEDDING_CACHE_ENTRIES", "50000"))
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("NLP_EMBEDDING_CACHE_MB", "128"))
+EMBEDDING_CACHE_SPILL_DIR = os.getenv("NLP_EMBEDDING_CACHE_SPILL_DIR", "")
+SPILL_SHARD_ROWS = int(os.getenv("NLP_EMBEDDING_SPILL_SHARD_ROWS", "16384"))
+SPILL_MAX_SHARDS = int(os.getenv("NLP_EMBEDDING_SPILL_MAX_SHARDS", "8"))
+
+
+class _SpillTier:
+    """Ring of memory-mapped float16 shards holding evicted embeddings"""
+
+    def __init__(self, directory: str, dim: int, shard_rows: int, max_shards: int):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dim = dim
+        self.shard_rows = shard_rows
+        self.max_shards = max_shards
+        self.shards: List[np.memmap] = []
+        self.shard_keys: List[List[str]] = []
+        self.index: Dict[str, Tuple[int, int]] = {}  # key -> (shard, row)
+        self.active = -1
+        self.row = shard_rows  # forces a shard on first put
+
+    def _next_shard(self):
+        self.active = (self.active + 1) % self.max_shards
+        if self.active < len(self.shards):
+            # Recycle the oldest shard; its entries are gone
+            for key in self.shard_keys[self.active]:
+                if self.index.get(key, (None,))[0] == self.active:
+                    del self.index[key]
+            self.shard_keys[self.active] = []
+        else:
+            path = os.path.join(self.directory, f"embeddings-{os.getpid()}-{self.active}.f16")
+            self.shards.append(np.memmap(path, dtype=np.float16, mode="w+", shape=(self.shard_rows, self.dim)))
+            self.shard_keys.append([])
+        self.row = 0
+
+    def put(self, key: str, vector: np.ndarray):
+        if key in self.index:
+            return
+        if self.row >= self.shard_rows:
+            self._next_shard()
+        self.shards[self.active][self.row] = vector
+        self.index[key] = (self.active, self.row)
+        self.shard_keys[self.active].append(key)
+        self.row += 1
+
+    def pop(self, key: str) -> Optional[np.ndarray]:
+        location = self.index.pop(key, None)
+        if location is None:
+            return None
+        shard, row = location
+        return np.array(self.shards[shard][row])
+
+    def close(self):
+        for shard in self.shards:
+            path = shard.filename
+            del shard
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.shards = []
+        self.index.clear()
+
+    def nbytes(self) -> int:
+        return len(self.shards) * self.shard_rows * self.dim * 2
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 max_mb: float = EMBEDDING_CACHE_MAX_MB,
+                 spill_dir: str = EMBEDDING_CACHE_SPILL_DIR):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.spill_dir = spill_dir
+        self.spill: Optional[_SpillTier] = None
+        self._data: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "spill_hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(normalized_text: str, revision: str) -> str:
+        return hashlib.sha1(f"{revision}\x00{normalized_text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up several keys at once; hits are returned as float32"""
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for key in keys:
+                vector = self._data.get(key)
+                if vector is not None:
+                    self._data.move_to_end(key)
+                    self.stats["hits"] += 1
+                elif self.spill is not None and (vector := self.spill.pop(key)) is not None:
+                    self.stats["spill_hits"] += 1
+                    self._insert(key, vector)
+                else:
+                    self.stats["misses"] += 1
+                results.append(vector.astype(np.float32) if vector is not None else None)
+        return results
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float16)
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                if key not in self._data:
+                    self._insert(key, vector.copy())
+
+    def _insert(self, key: str, vector: np.ndarray):
+        self._data[key] = vector
+        self._bytes += vector.nbytes
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            old_key, old_vector = self._data.popitem(last=False)
+            self._bytes -= old_vector.nbytes
+            self.stats["evictions"] += 1
+            self._spill(old_key, old_vector)
+
+    def _spill(self, key: str, vector: np.ndarray):
+        if not self.spill_dir:
+            return
+        try:
+            if self.spill is None:
+                self.spill = _SpillTier(self.spill_dir, vector.shape[0], SPILL_SHARD_ROWS, SPILL_MAX_SHARDS)
+            self.spill.put(key, vector)
+        except Exception as e:
+            logger.warning(f"Disabling embedding spill tier: {e}")
+            self.spill_dir = ""
+            self.spill = None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            if self.spill is not None:
+                self.spill.close()
+                self.spill = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["spill_hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round((self.stats["hits"] + self.stats["spill_hits"]) / lookups, 4) if lookups else None,
+                "entries": len(self._data),
+                "memory_mb": round(self._bytes / 1024 / 1024, 3),
+                "max_entries": self.max_entries,
+                "max_mb": round(self.max_bytes / 1024 / 1024, 3),
+                "spill_entries": len(self.spill.index) if self.spill else 0,
+                "spill_mb": round(self.spill.nbytes() / 1024 / 1024, 3) if self.spill else 0.0,
+            }
@@ -3,6 +3,13 @@ NLP Models for Multilingual Text Processing
 Handles text classification, embedding generation, and language detection
 """
 
+import os
+import json
+import hashlib
+import logging
+import time
+import unicodedata
+from contextlib import contextmanager
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -17,36 +24,115 @@ import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
+from app.models.embedding_cache import EmbeddingCache
+
+logger = logging.getLogger("ai-engine.nlp")
+
+# Category descriptions for similarity matching
+CATEGORY_DESCRIPTIONS = {
+    "Road & Potholes": "road pothole damage crack street repair traffic",
+    "Garbage & Sanitation": "garbage trash waste dustbin cleaning sanitation",
+    "Streetlight": "streetlight light dark night pole electricity",
+    "Water Supply": "water supply tap pipe drinking shortage",
+    "Sewage & Drainage": "sewage drainage drain overflow blockage",
+    "Electricity": "electricity power cut outage transformer wire",
+    "Traffic & Signals": "traffic signal jam vehicle road accident",
+    "Noise Pollution": "noise loud speaker horn pollution sound",
+    "Park & Recreation": "park garden playground recreation maintenance",
+    "Corruption & Misconduct": "corruption bribe misconduct official illegal",
+    "Building & Construction": "building construction illegal demolition",
+    "Public Safety": "safety security police crime emergency",
+    "Transport & Bus": "transport bus stop vehicle schedule",
+    "Healthcare": "hospital medical healthcare doctor emergency",
+    "Education": "school education teacher student facility"
+}
+CATEGORIES = list(CATEGORY_DESCRIPTIONS.keys())
+
+SEVERITY_KEYWORDS = {
+    5: ["emergency", "critical", "danger", "accident", "fire", "life threatening"],
+    4: ["urgent", "immediate", "serious", "major", "severe"],
+    3: ["important", "significant", "problem", "issue"],
+    2: ["minor", "small", "little", "slight"],
+    1: ["suggestion", "request", "question", "information"]
+}
+# Severity prototypes are embedded from the same keyword lists
+SEVERITY_DESCRIPTIONS = {level: " ".join(words) for level, words in SEVERITY_KEYWORDS.items()}
+# The nearest severity prototype is only trusted when it is close enough and
+# clearly ahead of the runner-up; otherwise the sentiment heuristic decides
+SEVERITY_MIN_SIMILARITY = float(os.getenv("NLP_SEVERITY_MIN_SIMILARITY", "0.5"))
+SEVERITY_MIN_MARGIN = float(os.getenv("NLP_SEVERITY_MIN_MARGIN", "0.05"))
+
+PROTOTYPE_CACHE_FILE = "nlp_prototypes.npz"
+
+MAX_SEQUENCE_LENGTH = 512
+# Padded tokens per encoder batch; batches are formed by length, not by count
+EMBEDDING_TOKEN_BUDGET = int(os.getenv("NLP_TOKEN_BUDGET", "8192"))
+
+# Heavy per-task pipelines, loaded lazily and only when enabled as a stage
+OPTIONAL_PIPELINES = {
+    "language_model": ("text-classification", "facebook/fasttext-language-identification"),
+    "sentiment": ("sentiment-analysis", "cardiffnlp/twitter-roberta-base-sentiment-latest"),
+}
+NLP_OPTIONAL_STAGES = {s.strip() for s in os.getenv("NLP_OPTIONAL_STAGES", "").split(",") if s.strip()}
+
+# Unicode blocks -> most common language written in that script
+SCRIPT_LANGUAGES = [
+    (0x0900, 0x097F, "hi"),  # Devanagari
+    (0x0980, 0x09FF, "bn"),  # Bengali
+    (0x0A00, 0x0A7F, "pa"),  # Gurmukhi
+    (0x0A80, 0x0AFF, "gu"),  # Gujarati
+    (0x0B00, 0x0B7F, "or"),  # Odia
+    (0x0B80, 0x0BFF, "ta"),  # Tamil
+    (0x0C00, 0x0C7F, "te"),  # Telugu
+    (0x0C80, 0x0CFF, "kn"),  # Kannada
+    (0x0D00, 0x0D7F, "ml"),  # Malayalam
+    (0x0600, 0x06FF, "ur"),  # Perso-Arabic
+]
+
+
+def _l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
 class MultilingualNLP:
     """
     Multilingual NLP processor supporting 22+ Indian languages
     Uses transformer models for text understanding and classification
     """
     
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = None, optional_stages: Optional[List[str]] = None,
+                 backend: str = "torch"):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.cache_dir = cache_dir or os.getenv("MODEL_DIR", "models")
         
         # Load multilingual models
         self.model_name = "xlm-roberta-base"  # Multilingual model
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
         self.model = AutoModel.from_pretrained(self.model_name).to(self.device)
+        self.model.eval()
+        self.model_revision = getattr(self.model.config, "_commit_hash", None) or "unknown"
         
-        # Language detection model
-        self.language_detector = pipeline(
-            "text-classification",
-            model="facebook/fasttext-language-identification",
-            device=0 if torch.cuda.is_available() else -1
-        )
+        # Optionally serve the encoder through ONNX Runtime (see onnx_backend)
+        self.backend = backend
+        if backend != "torch":
+            from app.models.onnx_backend import load_backend
+            self.model = load_backend("nlp_encoder", self.model, backend, self.cache_dir)
         
-        # Sentiment analyzer
-        self.sentiment_analyzer = pipeline(
-            "sentiment-analysis",
-            model="cardiffnlp/twitter-roberta-base-sentiment-latest",
-            device=0 if torch.cuda.is_available() else -1
-        )
+        # Language detection / sentiment pipelines are optional stages, built on first use
+        self.optional_stages = set(NLP_OPTIONAL_STAGES if optional_stages is None else optional_stages)
+        self._pipelines: Dict[str, Any] = {}
+        
+        # Per-stage latency: stage -> [calls, total seconds]
+        self.stage_stats: Dict[str, List[float]] = {}
+        self.embedding_stats = {'texts': 0, 'batches': 0, 'tokens': 0, 'padded_tokens': 0}
         
-        # Text embeddings cache
-        self.embedding_cache = {}
+        # Bounded float16 LRU cache keyed on normalized text + model revision/backend
+        self.embedding_cache = EmbeddingCache()
+        self.cache_revision = f"{self.model_name}@{self.model_revision}/{self.backend}"
+        
+        # Normalized category / severity prototype matrices, built once per model version
+        self.prototypes = self._load_or_build_prototypes()
         
     def preprocess_text(self, text: str) -> str:
         """
@@ -56,101 +142,320 @@ class MultilingualNLP:
         text = ' '.join(text.split())
         
         # Normalize unicode characters
-        text = text.normalize('NFKC')
+        text = unicodedata.normalize('NFKC', text)
         
         return text.strip()
     
-    def detect_language(self, text: str) -> Dict[str, Any]:
+    def _get_pipeline(self, stage: str):
+        """Build an optional pipeline on first use; None if it cannot be loaded"""
+        if stage not in self._pipelines:
+            task, model = OPTIONAL_PIPELINES[stage]
+            try:
+                self._pipelines[stage] = pipeline(
+                    task,
+                    model=model,
+                    device=0 if torch.cuda.is_available() else -1
+                )
+            except Exception as e:
+                logger.warning(f"Failed to load {stage} pipeline ({model}): {e}")
+                self._pipelines[stage] = None
+        return self._pipelines[stage]
+    
+    @property
+    def language_detector(self):
+        return self._get_pipeline("language_model")
+    
+    @property
+    def sentiment_analyzer(self):
+        return self._get_pipeline("sentiment")
+    
+    def detect_script_language(self, text: str) -> Dict[str, Any]:
         """
-        Detect the language of input text
-        Returns language code and confidence
+        Cheap language guess from the dominant Unicode script
         """
-        try:
-            result = self.language_detector(text[:512])  # Limit to 512 chars
-            
-            if isinstance(result, list) and len(result) > 0:
-                prediction = result[0]
-                return {
-                    'language': prediction['label'].replace('__label__', ''),
-                    'confidence': prediction['score']
-                }
-        except Exception as e:
-            print(f"Language detection failed: {e}")
+        counts: Dict[str, int] = {}
+        latin = 0
+        for ch in text:
+            cp = ord(ch)
+            if cp < 0x0250:
+                latin += ch.isalpha()
+                continue
+            for start, end, lang in SCRIPT_LANGUAGES:
+                if start <= cp <= end:
+                    counts[lang] = counts.get(lang, 0) + 1
+                    break
+        
+        total = latin + sum(counts.values())
+        if total == 0:
+            return {'language': 'en', 'confidence': 0.5}
         
-        # Fallback to default
-        return {'language': 'en', 'confidence': 0.5}
+        language, count = max(counts.items(), key=lambda item: item[1], default=('en', 0))
+        if latin >= count:
+            language, count = 'en', latin
+        return {'language': language, 'confidence': round(count / total, 3)}
     
-    def get_embeddings(self, texts: List[str], batch_size: int = 8) -> np.ndarray:
+    def detect_language(self, text: str, use_model: Optional[bool] = None) -> Dict[str, Any]:
         """
-        Get text embeddings using transformer model
+        Detect the language of input text
+        Returns language code and confidence
         """
-        embeddings = []
+        if use_model is None:
+            use_model = "language_model" in self.optional_stages
         
-        # Process in batches for memory efficiency
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
-            batch_embeddings = self._get_batch_embeddings(batch_texts)
-            embeddings.append(batch_embeddings)
+        if use_model:
+            try:
+                detector = self.language_detector
+                result = detector(text[:512]) if detector else None  # Limit to 512 chars
+                
+                if isinstance(result, list) and len(result) > 0:
+                    prediction = result[0]
+                    return {
+                        'language': prediction['label'].replace('__label__', ''),
+                        'confidence': prediction['score']
+                    }
+            except Exception as e:
+                logger.warning(f"Language detection failed: {e}")
         
-        return np.vstack(embeddings) if embeddings else np.array([])
+        # Script-based detection needs no model
+        return self.detect_script_language(text)
     
-    def _get_batch_embeddings(self, texts: List[str]) -> np.ndarray:
+    def tokenize(self, texts: List[str]) -> List[List[int]]:
         """
-        Get embeddings for a batch of texts
+        Token ids per text (truncated, unpadded). Callers that already hold
+        these can pass them to get_embeddings to skip re-tokenization.
         """
-        # Preprocess texts
         processed_texts = [self.preprocess_text(text) for text in texts]
-        
-        # Tokenize
-        inputs = self.tokenizer(
+        return self.tokenizer(
             processed_texts,
-            padding=True,
             truncation=True,
-            max_length=512,
-            return_tensors="pt"
-        ).to(self.device)
+            max_length=MAX_SEQUENCE_LENGTH
+        )["input_ids"]
+    
+    def _pad(self, batch_ids: List[List[int]]) -> Dict[str, torch.Tensor]:
+        """Pad a batch to its own longest sequence"""
+        longest = max(len(ids) for ids in batch_ids)
+        input_ids = torch.full((len(batch_ids), longest), self.tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch_ids), longest), dtype=torch.long)
+        for row, ids in enumerate(batch_ids):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+        return {
+            "input_ids": input_ids.to(self.device),
+            "attention_mask": attention_mask.to(self.device)
+        }
+    
+    @staticmethod
+    def _length_buckets(lengths: List[int], token_budget: int, max_batch: int) -> List[List[int]]:
+        """
+        Group indices of similar length so each batch stays within
+        token_budget padded tokens (and max_batch texts)
+        """
+        batches: List[List[int]] = []
+        current: List[int] = []
+        for idx in np.argsort(lengths, kind="stable").tolist():
+            # Ascending order: the new text is the longest, so it sets the padded width
+            padded = (len(current) + 1) * lengths[idx]
+            if current and (padded > token_budget or len(current) >= max_batch):
+                batches.append(current)
+                current = []
+            current.append(idx)
+        if current:
+            batches.append(current)
+        return batches
+    
+    def get_embeddings(self, texts: List[str], batch_size: int = 64,
+                       token_budget: int = EMBEDDING_TOKEN_BUDGET,
+                       token_ids: Optional[List[List[int]]] = None,
+                       use_cache: bool = True) -> np.ndarray:
+        """
+        Get text embeddings using transformer model.
+        Cached texts are served from embedding_cache; the rest are sorted by
+        token length and batched under a padded-token budget. Rows are
+        returned in input order.
+        """
+        if not texts:
+            return self._encode_ids(token_ids, batch_size, token_budget) if token_ids else np.array([])
+        
+        if not use_cache:
+            return self._encode_ids(token_ids or self.tokenize(texts), batch_size, token_budget)
+        
+        keys = [
+            EmbeddingCache.make_key(self.preprocess_text(text), self.cache_revision)
+            for text in texts
+        ]
+        cached = self.embedding_cache.get_many(keys)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
         
-        # Get embeddings
-        with torch.no_grad():
-            outputs = self.model(**inputs)
+        if missing:
+            missing_ids = [token_ids[i] for i in missing] if token_ids else self.tokenize([texts[i] for i in missing])
+            # Round through float16 so a miss returns exactly what a later hit will
+            computed = self._encode_ids(missing_ids, batch_size, token_budget).astype(np.float16)
+            self.embedding_cache.put_many([keys[i] for i in missing], computed)
+            for i, vector in zip(missing, computed.astype(np.float32)):
+                cached[i] = vector
+        
+        return np.vstack(cached)
+    
+    def _encode_ids(self, token_ids: List[List[int]], batch_size: int, token_budget: int) -> np.ndarray:
+        lengths = [len(ids) for ids in token_ids]
+        embeddings = None
+        
+        for batch in self._length_buckets(lengths, token_budget, batch_size):
+            inputs = self._pad([token_ids[i] for i in batch])
+            hidden = self._forward(inputs)
+            pooled = self._mean_pool(hidden, inputs["attention_mask"]).float().cpu().numpy()
             
-            # Use mean pooling of last hidden state
-            embeddings = outputs.last_hidden_state.mean(dim=1)
+            if embeddings is None:
+                embeddings = np.empty((len(token_ids), pooled.shape[1]), dtype=np.float32)
+            embeddings[batch] = pooled
             
-        return embeddings.cpu().numpy()
+            self.embedding_stats['batches'] += 1
+            self.embedding_stats['tokens'] += int(inputs["attention_mask"].sum())
+            self.embedding_stats['padded_tokens'] += int(inputs["attention_mask"].numel())
+        
+        self.embedding_stats['texts'] += len(token_ids)
+        return embeddings
+    
+    def _forward(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        """Single encoder pass; returns the last hidden state"""
+        with torch.inference_mode():
+            return self.model(**inputs).last_hidden_state
+    
+    @staticmethod
+    def _mean_pool(hidden: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        """Mean over real tokens only, so padding does not dilute short texts"""
+        mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+        return (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0)
+    
+    @contextmanager
+    def _timed(self, timings: Dict[str, float], stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[stage] = time.perf_counter() - started
+    
+    def _record_timings(self, timings: Dict[str, float]):
+        for stage, seconds in timings.items():
+            entry = self.stage_stats.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-stage latency of classify_complaint and which optional stages are active"""
+        padded = self.embedding_stats['padded_tokens']
+        return {
+            'embedding': {
+                **self.embedding_stats,
+                'padding_efficiency': round(self.embedding_stats['tokens'] / padded, 3) if padded else None,
+            },
+            'embedding_cache': self.embedding_cache.get_stats(),
+            'optional_stages': sorted(self.optional_stages),
+            'pipelines_loaded': sorted(k for k, v in self._pipelines.items() if v is not None),
+            'stage_latency_ms': {
+                stage: {'calls': int(calls), 'mean_ms': round(total / calls * 1000, 3)}
+                for stage, (calls, total) in self.stage_stats.items() if calls
+            },
+        }
     
-    def classify_complaint(self, text: str) -> Dict[str, Any]:
+    def _prototype_fingerprint(self) -> str:
+        """Changes whenever the descriptions, the encoder or its revision change"""
+        spec = {
+            "model": self.model_name,
+            "revision": self.model_revision,
+            "backend": self.backend,
+            "pooling": "masked_mean",
+            "categories": CATEGORY_DESCRIPTIONS,
+            "severity": SEVERITY_DESCRIPTIONS,
+        }
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+    def _load_or_build_prototypes(self) -> Dict[str, Any]:
         """
-        Classify complaint into category, severity, and urgency
+        Load prototype embeddings persisted next to the model weights, or
+        embed the descriptions once and persist them
         """
-        # Detect language first
-        lang_info = self.detect_language(text)
-        
-        # Get embedding
-        embedding = self.get_embeddings([text])[0]
-        
-        # Get sentiment
-        sentiment = self.sentiment_analyzer(text[:512])
-        sentiment_score = sentiment[0]['score'] if sentiment else 0.5
-        
-        # Category classification (simplified for demo)
-        categories = [
-            "Road & Potholes", "Garbage & Sanitation", "Streetlight", 
-            "Water Supply", "Sewage & Drainage", "Electricity", 
-            "Traffic & Signals", "Noise Pollution", "Park & Recreation",
-            "Corruption & Misconduct", "Building & Construction",
-            "Public Safety", "Transport & Bus", "Healthcare", "Education"
-        ]
+        fingerprint = self._prototype_fingerprint()
+        path = os.path.join(self.cache_dir, PROTOTYPE_CACHE_FILE)
+        
+        if os.path.exists(path):
+            try:
+                cached = np.load(path, allow_pickle=False)
+                if str(cached["fingerprint"]) == fingerprint:
+                    return {
+                        'category': cached["category"],
+                        'severity': cached["severity"],
+                        'severity_levels': cached["severity_levels"].tolist(),
+                    }
+                logger.info("Prototype cache is stale (descriptions or model changed); rebuilding")
+            except Exception as e:
+                logger.warning(f"Failed to read prototype cache {path}: {e}")
+        
+        severity_levels = list(SEVERITY_DESCRIPTIONS.keys())
+        embeddings = self.get_embeddings(
+            list(CATEGORY_DESCRIPTIONS.values()) + list(SEVERITY_DESCRIPTIONS.values()),
+            use_cache=False
+        )
+        prototypes = {
+            'category': _l2_normalize(embeddings[:len(CATEGORIES)]).astype(np.float32),
+            'severity': _l2_normalize(embeddings[len(CATEGORIES):]).astype(np.float32),
+            'severity_levels': severity_levels,
+        }
+        
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.savez(
+                path,
+                fingerprint=np.array(fingerprint),
+                category=prototypes['category'],
+                severity=prototypes['severity'],
+                severity_levels=np.array(severity_levels),
+            )
+        except Exception as e:
+            logger.warning(f"Failed to persist prototype cache {path}: {e}")
+        
+        return prototypes
+    
+    def classify_complaint(self, text: str, stages: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Classify complaint into category, severity, and urgency.
+        The text is tokenized and encoded once; the embedding feeds the
+        category and severity prototype heads. The language model and
+        sentiment pipelines only run when enabled as optional stages.
+        """
+        stages = self.optional_stages if stages is None else set(stages)
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        
+        # Shared encoder pass
+        with self._timed(timings, "tokenize"):
+            token_ids = self.tokenize([text])
+        with self._timed(timings, "encoder"):
+            embedding = self.get_embeddings([text], token_ids=token_ids)[0]
+        
+        with self._timed(timings, "language"):
+            lang_info = self.detect_language(text, use_model="language_model" in stages)
         
-        # Use embedding similarity to classify (simplified)
-        category_scores = self._classify_by_similarity(text, categories)
+        sentiment_score = None
+        if "sentiment" in stages and self.sentiment_analyzer is not None:
+            with self._timed(timings, "sentiment"):
+                sentiment = self.sentiment_analyzer(text[:512])
+                sentiment_score = sentiment[0]['score'] if sentiment else 0.5
         
-        # Determine severity based on keywords and sentiment
-        severity = self._determine_severity(text, sentiment_score)
+        # Similarity against the precomputed category prototypes
+        with self._timed(timings, "category_head"):
+            category_scores = self._classify_by_similarity(text, CATEGORIES, embedding=embedding)
+        
+        # Determine severity based on keywords, then severity prototypes
+        with self._timed(timings, "severity_head"):
+            severity = self._determine_severity(text, sentiment_score, embedding=embedding)
         
         # Determine urgency based on category and severity
         urgency = self._determine_urgency(category_scores['category'], severity)
         
+        timings["total"] = time.perf_counter() - started
+        self._record_timings(timings)
+        
         return {
             'category': category_scores['category'],
             'severity': severity,
@@ -158,44 +463,26 @@ class MultilingualNLP:
             'confidence': category_scores['confidence'],
             'language': lang_info['language'],
             'sentiment': sentiment_score,
-            'embedding': embedding.tolist()
+            'embedding': embedding.tolist(),
+            'timings_ms': {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
         }
     
-    def _classify_by_similarity(self, text: str, categories: List[str]) -> Dict[str, Any]:
+    def _classify_by_similarity(self, text: str, categories: Optional[List[str]] = None,
+                                embedding: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """
-        Classify text by similarity to category descriptions
+        Classify text by similarity to category descriptions.
+        Only the complaint is embedded; the descriptions are the cached
+        prototype matrix, so this is one forward pass and one matmul.
         """
-        # Category descriptions for similarity matching
-        category_descriptions = {
-            "Road & Potholes": "road pothole damage crack street repair traffic",
-            "Garbage & Sanitation": "garbage trash waste dustbin cleaning sanitation",
-            "Streetlight": "streetlight light dark night pole electricity",
-            "Water Supply": "water supply tap pipe drinking shortage",
-            "Sewage & Drainage": "sewage drainage drain overflow blockage",
-            "Electricity": "electricity power cut outage transformer wire",
-            "Traffic & Signals": "traffic signal jam vehicle road accident",
-            "Noise Pollution": "noise loud speaker horn pollution sound",
-            "Park & Recreation": "park garden playground recreation maintenance",
-            "Corruption & Misconduct": "corruption bribe misconduct official illegal",
-            "Building & Construction": "building construction illegal demolition",
-            "Public Safety": "safety security police crime emergency",
-            "Transport & Bus": "transport bus stop vehicle schedule",
-            "Healthcare": "hospital medical healthcare doctor emergency",
-            "Education": "school education teacher student facility"
-        }
-        
-        # Get embeddings for text and all categories
-        all_texts = [text] + list(category_descriptions.values())
-        embeddings = self.get_embeddings(all_texts)
-        
-        text_embedding = embeddings[0]
-        category_embeddings = embeddings[1:]
+        categories = categories or CATEGORIES
+        if embedding is None:
+            embedding = self.get_embeddings([text])[0]
         
-        # Calculate similarities
-        similarities = cosine_similarity([text_embedding], category_embeddings)[0]
+        rows = [CATEGORIES.index(c) for c in categories]
+        similarities = self.prototypes['category'][rows] @ _l2_normalize(embedding)
         
         # Get best category
-        best_idx = np.argmax(similarities)
+        best_idx = int(np.argmax(similarities))
         best_category = categories[best_idx]
         confidence = float(similarities[best_idx])
         
@@ -205,26 +492,28 @@ class MultilingualNLP:
             'all_scores': dict(zip(categories, similarities.tolist()))
         }
     
-    def _determine_severity(self, text: str, sentiment_score: float) -> int:
+    def _determine_severity(self, text: str, sentiment_score: Optional[float],
+                            embedding: Optional[np.ndarray] = None) -> int:
         """
         Determine severity (1-5) based on text content and sentiment
         """
-        severity_keywords = {
-            5: ["emergency", "critical", "danger", "accident", "fire", "life threatening"],
-            4: ["urgent", "immediate", "serious", "major", "severe"],
-            3: ["important", "significant", "problem", "issue"],
-            2: ["minor", "small", "little", "slight"],
-            1: ["suggestion", "request", "question", "information"]
-        }
-        
         text_lower = text.lower()
         
         # Check for severity keywords
-        for level, keywords in severity_keywords.items():
+        for level, keywords in SEVERITY_KEYWORDS.items():
             if any(keyword in text_lower for keyword in keywords):
                 return level
         
+        # Nearest severity prototype when the embedding is at hand and the match is clear
+        if embedding is not None:
+            similarities = self.prototypes['severity'] @ _l2_normalize(embedding)
+            runner_up, best = np.sort(similarities)[-2:]
+            if best >= SEVERITY_MIN_SIMILARITY and best - runner_up >= SEVERITY_MIN_MARGIN:
+                return int(self.prototypes['severity_levels'][int(np.argmax(similarities))])
+        
         # Use sentiment as fallback
+        if sentiment_score is None:
+            return 2
         if sentiment_score < 0.3:  # Very negative
             return 4
         elif sentiment_score < 0.5:  # Negative
@@ -295,12 +584,24 @@ class TextEmbedding:
 
 
 # Initialize global instances
-multilingual_nlp = MultilingualNLP()
 text_embedding = TextEmbedding()
+_multilingual_nlp: Optional[MultilingualNLP] = None
+
+
+def __getattr__(name: str):
+    # multilingual_nlp is built on first access so importing app.models stays cheap
+    global _multilingual_nlp
+    if name == "multilingual_nlp":
+        if _multilingual_nlp is None:
+            _multilingual_nlp = MultilingualNLP()
+        return _multilingual_nlp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == "__main__":
     # Test the NLP models
     print("Testing NLP Models...")
+    multilingual_nlp = MultilingualNLP()
     
     # Test language detection
     test_texts = [
@@ -0,0 +1,359 @@
+"""
+ONNX Runtime Inference Backend
+Exports the local PyTorch models to ONNX, optionally applies dynamic int8
+quantization, and serves them through ONNX Runtime with tuned thread settings.
+
+Backends (selected per model through MODEL_BACKENDS in ModelLoader):
+  - torch       eager fp32 PyTorch (default)
+  - onnx        fp32 ONNX graph, ORT graph optimizations
+  - onnx-int8   ONNX graph with dynamically quantized MatMul/Gemm weights
+
+Exported graphs live in MODEL_DIR/onnx, each next to its own metadata file
+(<name>.json, <name>.int8.json) holding a fingerprint of the source weights,
+so a graph is re-exported whenever the PyTorch weights it was built from change.
+
+CLI (export + parity check, exits non-zero when drift exceeds the bounds):
+    python -m app.models.onnx_backend --model complaint_classifier --backend onnx-int8
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError:
+    ORT_AVAILABLE = False
+
+logger = logging.getLogger("ai-engine.onnx")
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_OPSET = 17
+
+# Thread tuning: one intra-op pool per session sized to the cores this process
+# may use, a single inter-op thread (the graphs are sequential), and spinning
+# off by default so idle sessions do not burn CPU on shared nodes.
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", str(os.cpu_count() or 1)))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "1"))
+ORT_ALLOW_SPINNING = os.getenv("ORT_ALLOW_SPINNING", "0")
+
+# Parity bounds: per-sample cosine similarity of every output and top-1
+# agreement of the classification outputs against the PyTorch model
+PARITY_MIN_COSINE = {"onnx": 0.9999, "onnx-int8": 0.99}
+PARITY_MIN_ARGMAX_AGREEMENT = {"onnx": 1.0, "onnx-int8": 0.95}
+
+
+class _TupleOutputs(nn.Module):
+    """Exports a dict-returning module as an ordered tuple of named outputs"""
+
+    def __init__(self, module: nn.Module, output_names: List[str], call: Optional[Callable] = None):
+        super().__init__()
+        self.module = module
+        self.output_names = output_names
+        self.call = call
+
+    def forward(self, *inputs):
+        outputs = self.call(self.module, *inputs) if self.call else self.module(*inputs)
+        return tuple(outputs[name] for name in self.output_names)
+
+
+def _nlp_encoder_call(model, input_ids, attention_mask):
+    return {"last_hidden_state": model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state}
+
+
+# name -> how to build sample inputs and which outputs to export
+EXPORT_SPECS: Dict[str, Dict[str, Any]] = {
+    "complaint_classifier": {
+        "inputs": {"x": {0: "batch"}},
+        "outputs": ["category", "severity", "urgency", "features"],
+        "sample": lambda batch: (torch.randn(batch, 768),),
+        "argmax_outputs": ["category", "severity", "urgency"],
+    },
+    "infrastructure_analyzer": {
+        "inputs": {"image": {0: "batch"}},
+        "outputs": ["classification", "severity", "pothole_map", "streetlight_map", "water_leak_map", "features"],
+        "sample": lambda batch: (torch.randn(batch, 3, 224, 224),),
+        "argmax_outputs": ["classification", "severity"],
+    },
+    "nlp_encoder": {
+        "inputs": {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"}},
+        "outputs": ["last_hidden_state"],
+        "sample": lambda batch: (torch.randint(5, 1000, (batch, 32)), torch.ones(batch, 32, dtype=torch.long)),
+        "argmax_outputs": [],
+        "call": _nlp_encoder_call,
+    },
+}
+
+
+class OrtOutputs(dict):
+    """Dict of outputs that also allows attribute access (outputs.last_hidden_state)"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class OrtModule:
+    """
+    Drop-in stand-in for an exported nn.Module. Calling it returns the same
+    dict of tensors the PyTorch forward returns, and helper methods defined
+    on the source class (predict, label maps) keep working on top of it.
+    """
+
+    def __init__(self, name: str, path: str, backend: str, source_cls: type,
+                 intra_op_threads: int = ORT_INTRA_OP_THREADS,
+                 inter_op_threads: int = ORT_INTER_OP_THREADS):
+        self.name = name
+        self.path = path
+        self.backend = backend
+        self.source_cls = source_cls
+        self.spec = EXPORT_SPECS[name]
+        self.session = create_session(path, intra_op_threads, inter_op_threads)
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.calls = 0
+        self.total_seconds = 0.0
+
+    def __getattr__(self, name):
+        # Only reuse what the model class itself defines, never nn.Module internals
+        source_cls = self.__dict__.get("source_cls")
+        if source_cls is not None and name in vars(source_cls):
+            attr = vars(source_cls)[name]
+            return attr.__get__(self) if hasattr(attr, "__get__") else attr
+        raise AttributeError(name)
+
+    def forward(self, *args, **kwargs) -> OrtOutputs:
+        feeds = dict(zip(self.input_names, args))
+        feeds.update(kwargs)
+        feeds = {
+            k: (v.detach().cpu().numpy() if isinstance(v, torch.Tensor) else np.asarray(v))
+            for k, v in feeds.items() if k in self.input_names
+        }
+        started = time.perf_counter()
+        results = self.session.run(self.spec["outputs"], feeds)
+        self.total_seconds += time.perf_counter() - started
+        self.calls += 1
+        return OrtOutputs((name, torch.from_numpy(r)) for name, r in zip(self.spec["outputs"], results))
+
+    __call__ = forward
+
+    def eval(self):
+        return self
+
+    def to(self, *args, **kwargs):
+        return self
+
+    def cpu(self):
+        return self
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "path": self.path,
+            "size_mb": round(os.path.getsize(self.path) / 1e6, 2),
+            "calls": self.calls,
+            "mean_ms": round(self.total_seconds / self.calls * 1000, 3) if self.calls else None,
+        }
+
+
+def create_session(path: str, intra_op_threads: int = ORT_INTRA_OP_THREADS,
+                   inter_op_threads: int = ORT_INTER_OP_THREADS):
+    if not ORT_AVAILABLE:
+        raise RuntimeError("onnxruntime is not installed")
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.add_session_config_entry("session.intra_op.allow_spinning", ORT_ALLOW_SPINNING)
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def weights_fingerprint(module: nn.Module) -> str:
+    """Hash of every parameter and buffer, so stale exports are detected"""
+    digest = hashlib.sha1()
+    for key, tensor in module.state_dict().items():
+        digest.update(key.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def onnx_paths(name: str, backend: str, model_dir: str) -> Tuple[str, str]:
+    base = os.path.join(model_dir, "onnx", name)
+    if backend == "onnx-int8":
+        base += ".int8"
+    return base + ".onnx", base + ".json"
+
+
+def export_onnx(name: str, module: nn.Module, path: str):
+    spec = EXPORT_SPECS[name]
+    module.eval()
+    wrapper = _TupleOutputs(module, spec["outputs"], spec.get("call")).eval()
+    dynamic_axes = dict(spec["inputs"])
+    dynamic_axes.update({out: {0: "batch"} for out in spec["outputs"]})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # The fused multi-head attention fast path has no ONNX symbolic
+    fastpath = torch.backends.mha.get_fastpath_enabled()
+    torch.backends.mha.set_fastpath_enabled(False)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                wrapper,
+                spec["sample"](2),
+                path,
+                input_names=list(spec["inputs"].keys()),
+                output_names=spec["outputs"],
+                dynamic_axes=dynamic_axes,
+                opset_version=ONNX_OPSET,
+                dynamo=False,
+            )
+    finally:
+        torch.backends.mha.set_fastpath_enabled(fastpath)
+
+
+def quantize_int8(fp32_path: str, int8_path: str):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    # Only the weight-heavy ops; conv activations stay fp32
+    quantize_dynamic(fp32_path, int8_path, op_types_to_quantize=["MatMul", "Gemm"],
+                     weight_type=QuantType.QInt8, per_channel=True)
+
+
+def _is_current(path: str, meta_path: str, fingerprint: str) -> bool:
+    if not (os.path.exists(path) and os.path.exists(meta_path)):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return meta.get("fingerprint") == fingerprint and meta.get("opset") == ONNX_OPSET
+
+
+def _write_meta(meta_path: str, fingerprint: str):
+    with open(meta_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "opset": ONNX_OPSET, "exported_at": time.time()}, f)
+
+
+def ensure_exported(name: str, module: nn.Module, backend: str, model_dir: str, force: bool = False) -> str:
+    """Export (and quantize) `module` unless an up-to-date graph is already on disk"""
+    path, meta_path = onnx_paths(name, backend, model_dir)
+    fingerprint = weights_fingerprint(module)
+    if not force and _is_current(path, meta_path, fingerprint):
+        return path
+
+    # The int8 graph is quantized from the fp32 one, so that is refreshed first
+    fp32_path, fp32_meta_path = onnx_paths(name, "onnx", model_dir)
+    if force or not _is_current(fp32_path, fp32_meta_path, fingerprint):
+        logger.info(f"Exporting {name} to ONNX")
+        export_onnx(name, module, fp32_path)
+        _write_meta(fp32_meta_path, fingerprint)
+    if backend == "onnx-int8":
+        logger.info(f"Quantizing {name} to int8")
+        quantize_int8(fp32_path, path)
+        _write_meta(meta_path, fingerprint)
+    return path
+
+
+def load_backend(name: str, module: nn.Module, backend: str, model_dir: str) -> OrtModule:
+    if backend not in BACKENDS or backend == "torch":
+        raise ValueError(f"Unknown ONNX backend '{backend}' (expected one of {BACKENDS[1:]})")
+    path = ensure_exported(name, module, backend, model_dir)
+    return OrtModule(name, path, backend, type(module))
+
+
+def parse_backends(value: str) -> Dict[str, str]:
+    """'nlp=onnx-int8,complaint_classifier=onnx' -> {'nlp': 'onnx-int8', ...}"""
+    backends = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        name, backend = (part.strip() for part in item.split("=", 1))
+        if backend not in BACKENDS:
+            logger.warning(f"Ignoring unknown backend '{backend}' for {name}")
+            continue
+        backends[name] = backend
+    return backends
+
+
+def check_parity(name: str, module: nn.Module, ort_module: OrtModule, batches: int = 8,
+                 batch_size: int = 16) -> Dict[str, Any]:
+    """
+    Compare ORT outputs against the PyTorch module on random inputs.
+    Reports absolute drift and worst-case cosine similarity per output,
+    and argmax agreement for the classification outputs.
+    """
+    spec = EXPORT_SPECS[name]
+    call = spec.get("call")
+    module.eval()
+    drift = {out: [] for out in spec["outputs"]}
+    cosine = {out: [] for out in spec["outputs"]}
+    agree = {out: [] for out in spec["argmax_outputs"]}
+
+    for _ in range(batches):
+        inputs = spec["sample"](batch_size)
+        with torch.no_grad():
+            expected = call(module, *inputs) if call else module(*inputs)
+        actual = ort_module(*inputs)
+        for out in spec["outputs"]:
+            drift[out].append((expected[out] - actual[out]).abs().flatten())
+            cosine[out].append(float(torch.nn.functional.cosine_similarity(
+                expected[out].flatten(1), actual[out].flatten(1), dim=1).min()))
+        for out in spec["argmax_outputs"]:
+            agree[out].append((expected[out].argmax(dim=1) == actual[out].argmax(dim=1)).float())
+
+    report = {"model": name, "backend": ort_module.backend, "outputs": {}}
+    for out in spec["outputs"]:
+        diffs = torch.cat(drift[out])
+        report["outputs"][out] = {
+            "max_abs_diff": float(diffs.max()),
+            "mean_abs_diff": float(diffs.mean()),
+            "min_cosine": float(min(cosine[out])),
+        }
+    for out in spec["argmax_outputs"]:
+        report["outputs"][out]["argmax_agreement"] = float(torch.cat(agree[out]).mean())
+
+    min_cosine = PARITY_MIN_COSINE[ort_module.backend]
+    min_agreement = PARITY_MIN_ARGMAX_AGREEMENT[ort_module.backend]
+    report["passed"] = all(
+        stats["min_cosine"] >= min_cosine and stats.get("argmax_agreement", 1.0) >= min_agreement
+        for stats in report["outputs"].values()
+    )
+    return report
+
+
+def build_source_module(name: str) -> nn.Module:
+    if name == "complaint_classifier":
+        from app.models.complaint_models import ComplaintClassifier
+        return ComplaintClassifier()
+    if name == "infrastructure_analyzer":
+        from app.models.vision_models import InfrastructureAnalyzer
+        return InfrastructureAnalyzer()
+    if name == "nlp_encoder":
+        from transformers import AutoModel
+        return AutoModel.from_pretrained("xlm-roberta-base")
+    raise ValueError(f"Unknown model '{name}'")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export a model to ONNX and check parity against PyTorch")
+    parser.add_argument("--model", choices=list(EXPORT_SPECS.keys()), required=True)
+    parser.add_argument("--backend", choices=BACKENDS[1:], default="onnx-int8")
+    parser.add_argument("--model-dir", default=os.getenv("MODEL_DIR", "models"))
+    parser.add_argument("--force", action="store_true", help="Re-export even if the graph is up to date")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    source = build_source_module(args.model).eval()
+    path = ensure_exported(args.model, source, args.backend, args.model_dir, force=args.force)
+    report = check_parity(args.model, source, OrtModule(args.model, path, args.backend, type(source)))
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["passed"] else 1)
@@ -3,16 +3,43 @@ Computer Vision Models for Infrastructure Analysis
 Handles image analysis, object detection, and infrastructure monitoring
 """
 
+import io
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-import torchvision.transforms as transforms
 from PIL import Image
 import numpy as np
 from typing import Dict, List, Any, Tuple, Optional
 import cv2
 from transformers import AutoImageProcessor, AutoModelForImageClassification
 
+IMAGE_SIZE = 224
+IMAGENET_MEAN = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+IMAGENET_STD = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+
+
+def decode_image(data: bytes) -> Image.Image:
+    """
+    Decode encoded image bytes. JPEGs are decoded straight at reduced scale
+    (DCT scaling via draft) when the frame is much larger than the model input.
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (IMAGE_SIZE, IMAGE_SIZE))
+    return image
+
+
+def frame_to_array(image: Image.Image) -> np.ndarray:
+    """Resize to the model input and return an HWC uint8 RGB array"""
+    image = image.convert("RGB").resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR)
+    return np.array(image, dtype=np.uint8)
+
+
+def normalize_batch(frames: torch.Tensor) -> torch.Tensor:
+    """NHWC uint8 frames -> normalized NCHW float batch, on the frames' device"""
+    batch = frames.permute(0, 3, 1, 2).contiguous().float().div_(255.0)
+    return batch.sub_(IMAGENET_MEAN.to(batch.device)).div_(IMAGENET_STD.to(batch.device))
+
+
 class InfrastructureAnalyzer(nn.Module):
     """
     Deep learning model for analyzing infrastructure images
@@ -133,39 +160,47 @@ class InfrastructureAnalyzer(nn.Module):
         """
         Make predictions on a single image
         """
-        # Preprocess image
-        transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], 
-                               std=[0.229, 0.224, 0.225])
-        ])
-        
-        input_tensor = transform(image).unsqueeze(0)
-        
-        with torch.no_grad():
-            outputs = self.forward(input_tensor)
+        frames = torch.from_numpy(frame_to_array(image)).unsqueeze(0)
+        return self.predict_batch(normalize_batch(frames))[0]
+    
+    def predict_batch(self, batch: torch.Tensor) -> List[Dict[str, Any]]:
+        """
+        Make predictions on a normalized (N, 3, 224, 224) batch in one forward pass
+        """
+        with torch.inference_mode():
+            outputs = self(batch)
         
-        # Process outputs
-        category_idx = torch.argmax(outputs['classification'], dim=1)[0].item()
-        severity_idx = torch.argmax(outputs['severity'], dim=1)[0].item() + 1
+        # Reduce on the device, then move a handful of numbers per frame to the host
+        classification = outputs['classification']
+        overall_conf, category_idx = classification.max(dim=1)
+        severity_idx = outputs['severity'].argmax(dim=1) + 1
         
         # Detection confidence
-        pothole_conf = torch.max(outputs['pothole_map']).item()
-        streetlight_conf = torch.max(outputs['streetlight_map']).item()
-        water_leak_conf = torch.max(outputs['water_leak_map']).item()
-        
-        return {
-            'category': self._get_category_name(category_idx),
-            'severity': severity_idx,
-            'pothole_detected': pothole_conf > 0.5,
-            'pothole_confidence': pothole_conf,
-            'streetlight_detected': streetlight_conf > 0.5,
-            'streetlight_confidence': streetlight_conf,
-            'water_leak_detected': water_leak_conf > 0.5,
-            'water_leak_confidence': water_leak_conf,
-            'overall_confidence': torch.max(outputs['classification']).item()
-        }
+        detection = torch.stack([
+            outputs[name].flatten(1).max(dim=1).values
+            for name in ('pothole_map', 'streetlight_map', 'water_leak_map')
+        ], dim=1)
+        
+        category_idx = category_idx.tolist()
+        severity_idx = severity_idx.tolist()
+        overall_conf = overall_conf.tolist()
+        detection = detection.tolist()
+        
+        results = []
+        for i in range(len(category_idx)):
+            pothole_conf, streetlight_conf, water_leak_conf = detection[i]
+            results.append({
+                'category': self._get_category_name(category_idx[i]),
+                'severity': severity_idx[i],
+                'pothole_detected': pothole_conf > 0.5,
+                'pothole_confidence': pothole_conf,
+                'streetlight_detected': streetlight_conf > 0.5,
+                'streetlight_confidence': streetlight_conf,
+                'water_leak_detected': water_leak_conf > 0.5,
+                'water_leak_confidence': water_leak_conf,
+                'overall_confidence': overall_conf[i]
+            })
+        return results
     
     def _get_category_name(self, idx: int) -> str:
         """Map category index to name"""
@@ -177,6 +212,43 @@ class InfrastructureAnalyzer(nn.Module):
         return categories[idx] if idx < len(categories) else 'Unknown'
 
 
+class FrameFeatures:
+    """
+    Per-frame intermediates shared by the classical detectors. Each one is
+    computed on first use and then reused, so running every detector on a
+    frame converts colour spaces and runs edge detection once.
+    """
+    
+    def __init__(self, image: np.ndarray):
+        self.image = image
+        self._gray: Optional[np.ndarray] = None
+        self._hsv: Optional[np.ndarray] = None
+        self._edges: Optional[np.ndarray] = None
+    
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+    
+    @property
+    def hsv(self) -> np.ndarray:
+        if self._hsv is None:
+            self._hsv = cv2.cvtColor(self.image, cv2.COLOR_BGR2HSV)
+        return self._hsv
+    
+    @property
+    def edges(self) -> np.ndarray:
+        if self._edges is None:
+            self._edges = cv2.Canny(self.gray, 50, 150)
+        return self._edges
+
+
+def _label_components(mask: np.ndarray) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+    """8-connected labelling of a 0/1 mask; BBDT is ~2.5x faster than the default on large frames"""
+    return cv2.connectedComponentsWithStatsWithAlgorithm(mask, 8, cv2.CV_32S, cv2.CCL_BBDT)
+
+
 class PotholeDetector:
     """
     Specialized pothole detection using computer vision techniques
@@ -186,45 +258,49 @@ class PotholeDetector:
         self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
         # Note: In production, use a proper pothole detection model
         
-    def detect_potholes(self, image: np.ndarray) -> List[Dict[str, Any]]:
+    def detect_potholes(self, image: np.ndarray, frame: Optional[FrameFeatures] = None) -> List[Dict[str, Any]]:
         """
         Detect potholes in road images
         """
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        frame = frame if frame is not None else FrameFeatures(image)
+        
+        # Dark regions (potential potholes); outer boundaries only, so a region
+        # with a hole in it counts its full extent
+        _, dark = cv2.threshold(frame.gray, 100, 255, cv2.THRESH_BINARY_INV)
+        contours, _ = cv2.findContours(dark, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return []
+        
+        # Filter small contours
+        areas = np.array([cv2.contourArea(contour) for contour in contours])
+        keep = np.flatnonzero(areas > 100)
+        if keep.size == 0:
+            return []
+        contours = [contours[i] for i in keep]
+        areas = areas[keep]
+        perimeters = np.array([cv2.arcLength(contour, True) for contour in contours])
+        
+        # Calculate circularity (potholes are roughly circular)
+        circularity = np.divide(4 * np.pi * areas, perimeters * perimeters,
+                                out=np.zeros_like(areas), where=perimeters > 0)
+        
+        # Confidence based on area and circularity
+        confidence = np.minimum(1.0, (areas / 1000) * circularity)
         
-        # Apply thresholding to find dark regions (potential potholes)
-        _, thresh = cv2.threshold(gray, 100, 255, cv2.THRESH_BINARY_INV)
-        
-        # Find contours
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Sort by confidence
+        order = np.argsort(-confidence, kind='stable')
+        boxes = [cv2.boundingRect(contour) for contour in contours]
         
         potholes = []
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area > 100:  # Filter small contours
-                x, y, w, h = cv2.boundingRect(contour)
-                
-                # Calculate circularity (potholes are roughly circular)
-                perimeter = cv2.arcLength(contour, True)
-                if perimeter > 0:
-                    circularity = 4 * np.pi * area / (perimeter * perimeter)
-                else:
-                    circularity = 0
-                
-                # Confidence based on area and circularity
-                confidence = min(1.0, (area / 1000) * circularity)
-                
-                potholes.append({
-                    'bbox': [x, y, w, h],
-                    'area': area,
-                    'circularity': circularity,
-                    'confidence': confidence,
-                    'center': [x + w//2, y + h//2]
-                })
-        
-        # Sort by confidence
-        potholes.sort(key=lambda x: x['confidence'], reverse=True)
+        for i in order.tolist():
+            x, y, w, h = boxes[i]
+            potholes.append({
+                'bbox': [x, y, w, h],
+                'area': float(areas[i]),
+                'circularity': float(circularity[i]),
+                'confidence': float(confidence[i]),
+                'center': [x + w//2, y + h//2]
+            })
         
         return potholes
 
@@ -237,26 +313,24 @@ class StreetlightAnalyzer:
     def __init__(self):
         self.brightness_threshold = 100
         
-    def analyze_streetlight(self, image: np.ndarray) -> Dict[str, Any]:
+    def analyze_streetlight(self, image: np.ndarray, frame: Optional[FrameFeatures] = None) -> Dict[str, Any]:
         """
         Analyze streetlight for damage or functionality issues
         """
-        # Convert to different color spaces
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        frame = frame if frame is not None else FrameFeatures(image)
         
         # Check for light emission (brightness)
-        avg_brightness = np.mean(gray)
+        avg_brightness = cv2.mean(frame.gray)[0]
         
         # Check for broken glass (detect sharp edges)
-        edges = cv2.Canny(gray, 50, 150)
-        edge_density = np.sum(edges > 0) / edges.size
+        edges = frame.edges
+        edge_density = cv2.countNonZero(edges) / edges.size
         
         # Check for rust (orange/brown regions in HSV)
         lower_rust = np.array([10, 100, 100])
         upper_rust = np.array([20, 255, 255])
-        rust_mask = cv2.inRange(hsv, lower_rust, upper_rust)
-        rust_ratio = np.sum(rust_mask > 0) / rust_mask.size
+        rust_mask = cv2.inRange(frame.hsv, lower_rust, upper_rust)
+        rust_ratio = cv2.countNonZero(rust_mask) / rust_mask.size
         
         # Determine condition
         if avg_brightness > self.brightness_threshold:
@@ -296,47 +370,33 @@ class WaterLeakDetector:
     def __init__(self):
         self.moisture_threshold = 150
         
-    def detect_water_leak(self, image: np.ndarray) -> Dict[str, Any]:
+    def detect_water_leak(self, image: np.ndarray, frame: Optional[FrameFeatures] = None) -> Dict[str, Any]:
         """
         Detect water leaks based on color and texture analysis
         """
-        # Convert to different color spaces
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        
-        # Water appears as dark, wet regions
-        water_mask = gray < self.moisture_threshold
+        frame = frame if frame is not None else FrameFeatures(image)
         
-        # Check for wet reflections (high saturation in HSV)
-        saturation = hsv[:, :, 1]
-        high_saturation = saturation > 200
-        
-        # Combine masks
-        potential_water = water_mask & high_saturation
+        # Water appears as dark, wet regions with wet reflections (high saturation in HSV)
+        _, dark = cv2.threshold(frame.gray, self.moisture_threshold - 1, 1, cv2.THRESH_BINARY_INV)
+        _, saturated = cv2.threshold(cv2.extractChannel(frame.hsv, 1), 200, 1, cv2.THRESH_BINARY)
+        potential_water = cv2.bitwise_and(dark, saturated)
         
         # Find connected components
-        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
-            potential_water.astype(np.uint8)
-        )
-        
-        # Filter small regions
-        water_regions = []
-        for i in range(1, num_labels):  # Skip background (0)
-            area = stats[i, cv2.CC_STAT_AREA]
-            if area > 50:  # Minimum area threshold
-                water_regions.append({
-                    'area': area,
-                    'centroid': centroids[i].tolist(),
-                    'bbox': [
-                        stats[i, cv2.CC_STAT_LEFT],
-                        stats[i, cv2.CC_STAT_TOP],
-                        stats[i, cv2.CC_STAT_WIDTH],
-                        stats[i, cv2.CC_STAT_HEIGHT]
-                    ]
-                })
+        num_labels, labels, stats, centroids = _label_components(potential_water)
+        
+        # Filter small regions, skipping background (0)
+        keep = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] > 50) + 1  # Minimum area threshold
+        water_regions = [
+            {'area': area, 'centroid': centroid, 'bbox': bbox}
+            for area, centroid, bbox in zip(
+                stats[keep, cv2.CC_STAT_AREA].tolist(),
+                centroids[keep].tolist(),
+                stats[keep, :4].tolist()
+            )
+        ]
         
         # Calculate leak probability
-        water_ratio = np.sum(potential_water) / potential_water.size
+        water_ratio = cv2.countNonZero(potential_water) / potential_water.size
         leak_probability = min(1.0, water_ratio * 10)
         
         return {
@@ -349,11 +409,35 @@ class WaterLeakDetector:
 
 
 # Initialize global instances
-infrastructure_analyzer = InfrastructureAnalyzer()
+_infrastructure_analyzer: Optional[InfrastructureAnalyzer] = None
 pothole_detector = PotholeDetector()
 streetlight_analyzer = StreetlightAnalyzer()
 water_leak_detector = WaterLeakDetector()
 
+
+def analyze_frame(image: np.ndarray) -> Dict[str, Any]:
+    """
+    Run every classical detector on one BGR frame, sharing grayscale, HSV
+    and edge maps between them
+    """
+    frame = FrameFeatures(image)
+    return {
+        'potholes': pothole_detector.detect_potholes(image, frame),
+        'streetlight': streetlight_analyzer.analyze_streetlight(image, frame),
+        'water_leak': water_leak_detector.detect_water_leak(image, frame)
+    }
+
+
+def __getattr__(name: str):
+    # The analyzer holds ~470M parameters; build it only when something asks for it
+    global _infrastructure_analyzer
+    if name == "infrastructure_analyzer":
+        if _infrastructure_analyzer is None:
+            _infrastructure_analyzer = InfrastructureAnalyzer()
+        return _infrastructure_analyzer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
     # Test the vision models
     print("Testing Vision Models...")
@@ -0,0 +1,336 @@
+"""
+Vision Batch Pipeline — streaming frame analysis for CCTV / satellite ingest
+
+Stages:
+  1. fetch + decode   thread pool; HTTP fetch (shared httpx client), reduced-scale
+                      JPEG decode and resize to the model input as uint8
+  2. batch            frames are queued and grouped up to VISION_MAX_BATCH, or
+                      for at most VISION_MAX_WAIT_MS after the first frame
+  3. forward          frames are copied into a preallocated (pinned, on CUDA)
+                      uint8 buffer, normalized on the device and run through
+                      InfrastructureAnalyzer.predict_batch in one pass, via
+                      run_inference: on the inference workers when they serve
+                      the model (one batch in flight per worker), else on a
+                      thread in this process
+  4. fan-out          each caller's future gets its own frame's result
+
+Reported stages: fetch_decode, queue_wait, stage (buffer copy + normalize)
+and forward (forward pass + result reduction), in ms per frame.
+
+Fetching and decoding for the next batch overlap with the current forward
+pass. get_stats() reports frames per second and per-stage timings.
+
+URLs come from API callers, so fetches are restricted: http(s) only, hosts
+in VISION_ALLOWED_HOSTS when set (otherwise any host that does not resolve to
+a private, loopback, link-local or reserved address), redirects re-checked
+hop by hop, and bodies streamed with a VISION_MAX_IMAGE_BYTES cap. Without an
+allowlist the connection goes to the address that was checked (original Host
+header and TLS server name kept), so DNS cannot rebind the host in between.
+"""
+
+import os
+import time
+import socket
+import asyncio
+import logging
+import threading
+import ipaddress
+from urllib.parse import urljoin, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+import numpy as np
+import torch
+from PIL import Image
+
+from app.models.vision_models import IMAGE_SIZE, decode_image, frame_to_array, normalize_batch
+from app.services.inference_workers import get_inference_pool, run_inference
+
+logger = logging.getLogger("ai-engine.vision-pipeline")
+
+VISION_MAX_BATCH = int(os.getenv("VISION_MAX_BATCH", "32"))
+VISION_MAX_WAIT_MS = float(os.getenv("VISION_MAX_WAIT_MS", "20"))
+VISION_FETCH_WORKERS = int(os.getenv("VISION_FETCH_WORKERS", "8"))
+VISION_FETCH_TIMEOUT = float(os.getenv("VISION_FETCH_TIMEOUT", "10"))
+VISION_MAX_INFLIGHT = int(os.getenv("VISION_MAX_INFLIGHT", "0"))  # concurrent batches; 0 = one per inference worker
+VISION_MAX_IMAGE_BYTES = int(os.getenv("VISION_MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+# Comma-separated hosts; "example.com" also admits its subdomains. Empty = any public host
+VISION_ALLOWED_HOSTS = [h.strip().lower() for h in os.getenv("VISION_ALLOWED_HOSTS", "").split(",") if h.strip()]
+VISION_MAX_REDIRECTS = 3
+VISION_MODEL = "infrastructure_analyzer"
+
+FrameSource = Union[str, bytes, Image.Image, np.ndarray]
+STAGES = ("fetch_decode", "queue_wait", "stage", "forward")
+
+
+def _check_url(url: str) -> Optional[str]:
+    """
+    Reject non-http(s) URLs and hosts outside the allowlist or on internal networks.
+    Returns the validated address to connect to, or None for allowlisted hosts.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise ValueError(f"Only http(s) frame URLs are allowed: {url!r}")
+    if VISION_ALLOWED_HOSTS:
+        if not any(host == allowed or host.endswith("." + allowed) for allowed in VISION_ALLOWED_HOSTS):
+            raise ValueError(f"Frame host '{host}' is not in VISION_ALLOWED_HOSTS")
+        return None
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or None, proto=socket.IPPROTO_TCP)}
+    except socket.gaierror as e:
+        raise ValueError(f"Cannot resolve frame host '{host}': {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if not ip.is_global:
+            raise ValueError(f"Frame host '{host}' resolves to a non-public address")
+    return sorted(addresses)[0].split("%", 1)[0]
+
+
+def _read_limited(response, max_bytes: int) -> bytes:
+    length = response.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > max_bytes:
+        raise ValueError(f"Frame is {length} bytes, the limit is {max_bytes}")
+    chunks, size = [], 0
+    for chunk in response.iter_bytes():
+        size += len(chunk)
+        if size > max_bytes:
+            raise ValueError(f"Frame exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class VisionBatchPipeline:
+    def __init__(self, model_name: str = VISION_MODEL,
+                 runner: Callable[..., Awaitable[Any]] = run_inference,
+                 max_batch_size: int = VISION_MAX_BATCH,
+                 max_wait_ms: float = VISION_MAX_WAIT_MS,
+                 fetch_workers: int = VISION_FETCH_WORKERS,
+                 max_inflight: int = VISION_MAX_INFLIGHT):
+        self.model_name = model_name
+        self.runner = runner
+        self.max_inflight = max_inflight
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="vision-fetch")
+        self.device = torch.device("cpu")
+        self._http = None
+        self._http_lock = threading.Lock()
+        self._buffer: Optional[torch.Tensor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+
+        self.stats = {"frames": 0, "batches": 0, "failed": 0}
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        self._first_frame_at: Optional[float] = None
+        self._last_frame_at: Optional[float] = None
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def analyze(self, source: FrameSource) -> Dict[str, Any]:
+        """
+        Analyze one frame (URL, encoded bytes, PIL image or HWC RGB array);
+        batched transparently with concurrent callers
+        """
+        self._ensure_batcher()
+        loop = asyncio.get_running_loop()
+
+        started = time.perf_counter()
+        try:
+            frame = await loop.run_in_executor(self.fetch_pool, self._load_frame, source)
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        self.stage_seconds["fetch_decode"] += time.perf_counter() - started
+
+        future = loop.create_future()
+        await self._queue.put((frame, future, time.perf_counter()))
+        return await future
+
+    async def analyze_many(self, sources: List[FrameSource]) -> List[Dict[str, Any]]:
+        """Analyze many frames; a frame that fails returns an error entry instead of raising"""
+        results = await asyncio.gather(*(self.analyze(source) for source in sources), return_exceptions=True)
+        return [
+            {"error": f"{type(r).__name__}: {r}"} if isinstance(r, Exception) else r
+            for r in results
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        frames = self.stats["frames"]
+        batches = self.stats["batches"]
+        elapsed = (self._last_frame_at - self._first_frame_at) if frames > 1 else 0.0
+        return {
+            **self.stats,
+            "fps": round(frames / elapsed, 2) if elapsed > 0 else None,
+            "avg_batch_size": round(frames / batches, 2) if batches else None,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "stage_ms_per_frame": {
+                stage: round(seconds * 1000 / frames, 3) if frames else None
+                for stage, seconds in self.stage_seconds.items()
+            },
+        }
+
+    async def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+        for task in list(self._tasks):
+            task.cancel()
+        self.fetch_pool.shutdown(wait=False)
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+
+    def _load_frame(self, source: FrameSource) -> np.ndarray:
+        if isinstance(source, np.ndarray):
+            if source.shape[:2] != (IMAGE_SIZE, IMAGE_SIZE):
+                source = Image.fromarray(source)
+            else:
+                return np.ascontiguousarray(source, dtype=np.uint8)
+        if isinstance(source, str):
+            source = self._fetch(source)
+        if isinstance(source, (bytes, bytearray)):
+            source = decode_image(bytes(source))
+        return frame_to_array(source)
+
+    def _fetch(self, url: str) -> bytes:
+        import httpx
+        with self._http_lock:
+            if self._http is None:
+                # httpx.Client is thread-safe and pools connections across fetch workers;
+                # redirects are followed here so every hop is checked
+                self._http = httpx.Client(timeout=VISION_FETCH_TIMEOUT, follow_redirects=False)
+        for _ in range(VISION_MAX_REDIRECTS + 1):
+            address = _check_url(url)
+            target, headers, extensions = httpx.URL(url), {}, {}
+            if address is not None:
+                # Connect to the checked address; Host and SNI (so certificate checks) keep the hostname
+                headers["Host"] = target.netloc.decode("ascii")
+                extensions["sni_hostname"] = target.host
+                target = target.copy_with(host=address)
+            with self._http.stream("GET", target, headers=headers, extensions=extensions) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers["location"])
+                    continue
+                response.raise_for_status()
+                return _read_limited(response, VISION_MAX_IMAGE_BYTES)
+        raise ValueError(f"Too many redirects fetching frame (max {VISION_MAX_REDIRECTS})")
+
+    def _ensure_batcher(self):
+        if self._batcher is None or self._batcher.done():
+            limit = self.max_inflight
+            if limit <= 0:
+                pool = get_inference_pool()
+                limit = pool.num_workers if pool is not None and pool.serves(self.model_name) else 1
+            self._inflight = asyncio.Semaphore(limit)
+            self._queue = asyncio.Queue()
+            self._batcher = asyncio.create_task(self._run_batcher())
+
+    async def _run_batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            dequeued = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.stage_seconds["queue_wait"] += dequeued - enqueued
+            futures = [future for _, future, _ in batch]
+
+            # Staging reuses one buffer, so it stays sequential; forward passes
+            # overlap up to the in-flight limit
+            await self._inflight.acquire()
+            try:
+                inputs = await asyncio.to_thread(self._stage, [frame for frame, _, _ in batch])
+            except Exception as e:
+                self._inflight.release()
+                self._fail(futures, e)
+                continue
+            task = asyncio.create_task(self._forward(futures, inputs))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _fail(self, futures: List[asyncio.Future], error: Exception):
+        logger.error(f"Vision batch of {len(futures)} failed: {error}")
+        self.stats["failed"] += len(futures)
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def _stage(self, frames: List[np.ndarray]) -> torch.Tensor:
+        started = time.perf_counter()
+        buffer = self._batch_buffer()
+        host = buffer.numpy()
+        for i, frame in enumerate(frames):
+            host[i] = frame
+        inputs = normalize_batch(buffer[:len(frames)].to(self.device, non_blocking=True))
+        if self.device.type == "cuda":
+            # The next batch overwrites the staging buffer
+            torch.cuda.current_stream(self.device).synchronize()
+        self.stage_seconds["stage"] += time.perf_counter() - started
+        if self._first_frame_at is None:
+            self._first_frame_at = started
+        return inputs
+
+    async def _forward(self, futures: List[asyncio.Future], inputs: torch.Tensor):
+        started = time.perf_counter()
+        try:
+            # Includes the on-device reduction and per-frame result fan-out
+            results = await self.runner(self.model_name, "predict_batch", inputs)
+        except Exception as e:
+            self._fail(futures, e)
+            return
+        finally:
+            self._inflight.release()
+        finished = time.perf_counter()
+
+        self.stage_seconds["forward"] += finished - started
+        self.stats["frames"] += len(futures)
+        self.stats["batches"] += 1
+        self._last_frame_at = finished
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _resolve_device(self) -> torch.device:
+        """Inference workers take CPU tensors; an in-process model may sit on the GPU"""
+        pool = get_inference_pool()
+        if pool is not None and pool.serves(self.model_name):
+            return torch.device("cpu")
+        from app.services.model_loader import get_model_loader
+        model = get_model_loader().get_model(self.model_name)
+        if model is None:
+            raise RuntimeError("Infrastructure analyzer is not available")
+        try:
+            return next(model.parameters()).device
+        except (AttributeError, StopIteration, TypeError):
+            return torch.device("cpu")
+
+    def _batch_buffer(self) -> torch.Tensor:
+        if self._buffer is None:
+            self.device = self._resolve_device()
+            buffer = torch.empty((self.max_batch_size, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=torch.uint8)
+            # Page-locked staging memory makes the host->GPU copy asynchronous
+            self._buffer = buffer.pin_memory() if self.device.type == "cuda" else buffer
+        return self._buffer
+
+
+vision_pipeline = VisionBatchPipeline()
@@ -1,4 +1,7 @@
 from .agent import rl_agent
 from .environment import ComplaintResolutionEnv
+from .replay_buffer import ReplayBuffer, ReplayLearner
 
 env = ComplaintResolutionEnv()
+replay_buffer = ReplayBuffer(state_dim=env.state_dim)
+replay_learner = ReplayLearner(rl_agent, replay_buffer)
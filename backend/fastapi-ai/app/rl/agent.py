@@ -1,66 +1,78 @@
 import numpy as np
 import os
-import pickle
 import logging
+from typing import Optional
+
+from app.rl.policy_store import DenseQTable, RL_POLICY_DIR, RL_LEGACY_POLICY_PATH
+from app.rl.persistence import PolicyPersistence
 
 logger = logging.getLogger("ai-engine")
 
 class QLearningAgent:
-    def __init__(self, state_dim: int, action_dim: int, learning_rate=0.1, discount_factor=0.9, epsilon=0.1):
+    def __init__(self, state_dim: int, action_dim: int, learning_rate=0.1, discount_factor=0.9, epsilon=0.1,
+                 policy_dir: Optional[str] = RL_POLICY_DIR):
         self.state_dim = state_dim
         self.action_dim = action_dim
         self.lr = learning_rate
         self.gamma = discount_factor
         self.epsilon = epsilon
-        self.q_table = {} # Using a dict for sparse state space
-        self.model_path = "models/rl_policy.pkl"
+        self.model_path = policy_dir
+        self.legacy_model_path = RL_LEGACY_POLICY_PATH
+        self.q_table: DenseQTable = None
+        self.persistence: PolicyPersistence = None
         self._load_policy()
 
-    def _get_state_key(self, state: np.ndarray) -> tuple:
-        # Discretize state for tabular Q-learning
-        return tuple(np.round(state, 1))
+    def _get_state_key(self, state: np.ndarray) -> int:
+        # Discretize state into the dense table's fixed bins
+        return self.q_table.state_index(state)
 
     def get_action(self, state: np.ndarray) -> int:
-        state_key = self._get_state_key(state)
-        
         # Exploration
         if np.random.rand() < self.epsilon:
             return np.random.randint(self.action_dim)
-        
-        # Exploitation
-        if state_key not in self.q_table:
+
+        # Exploitation; never-visited states explore as well
+        best, visited = self.q_table.best_actions(self._get_state_key(state))
+        if not visited:
             return np.random.randint(self.action_dim)
-            
-        return np.argmax(self.q_table[state_key])
+
+        return int(best)
+
+    def get_actions(self, states: np.ndarray, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """Epsilon-greedy actions for a batch of states (N, state_dim)"""
+        rng = rng or np.random.default_rng()
+        best, visited = self.q_table.best_actions(self.q_table.state_index(states))
+        explore = ~visited | (rng.random(len(best)) < self.epsilon)
+        return np.where(explore, rng.integers(self.action_dim, size=len(best)), best)
 
     def update(self, state: np.ndarray, action: int, reward: float, next_state: np.ndarray):
-        state_key = self._get_state_key(state)
-        next_state_key = self._get_state_key(next_state)
-        
-        if state_key not in self.q_table:
-            self.q_table[state_key] = np.zeros(self.action_dim)
-        if next_state_key not in self.q_table:
-            self.q_table[next_state_key] = np.zeros(self.action_dim)
-            
         # Q-Learning update rule
-        best_next_action = np.argmax(self.q_table[next_state_key])
-        td_target = reward + self.gamma * self.q_table[next_state_key][best_next_action]
-        td_error = td_target - self.q_table[state_key][action]
-        self.q_table[state_key][action] += self.lr * td_error
+        state_key = self._get_state_key(state)
+        self.q_table.update(state_key, action, reward, self._get_state_key(next_state), self.lr, self.gamma)
+        self.persistence.record(state_key, action)
+
+    def update_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+                     next_states: np.ndarray, dones: Optional[np.ndarray] = None) -> np.ndarray:
+        """Vectorized Q-learning update over a batch of transitions; returns TD errors"""
+        index = self.q_table.state_index(states)
+        td_errors = self.q_table.update(index, actions, rewards, self.q_table.state_index(next_states),
+                                        self.lr, self.gamma, dones)
+        self.persistence.record(index, actions)
+        return td_errors
 
     def save_policy(self):
-        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        with open(self.model_path, "wb") as f:
-            pickle.dump(self.q_table, f)
-        logger.info("RL Policy saved.")
+        # Synchronous full snapshot; request handlers rely on the background flusher instead
+        self.persistence.snapshot_sync()
 
     def _load_policy(self):
-        if os.path.exists(self.model_path):
+        self.q_table = DenseQTable(self.action_dim, path=self.model_path)
+        self.persistence = PolicyPersistence(self.q_table)
+        # One-time upgrade from the legacy dict-of-arrays pickle
+        if self.q_table.persistent and len(self.q_table) == 0 and os.path.exists(self.legacy_model_path):
             try:
-                with open(self.model_path, "rb") as f:
-                    self.q_table = pickle.load(f)
-                logger.info("RL Policy loaded.")
+                self.q_table.migrate_legacy(self.legacy_model_path)
+                self.save_policy()
             except Exception as e:
-                logger.error(f"Failed to load RL Policy: {e}")
+                logger.error(f"Failed to migrate legacy RL Policy: {e}")
 
 rl_agent = QLearningAgent(state_dim=5, action_dim=5)
@@ -1,38 +1,53 @@
 import numpy as np
 from typing import Dict, List, Any, Tuple
 
+CATEGORIES = ["Roads", "Water", "Electricity", "Sanitation", "Traffic", "Others"]
+SEVERITIES = ["Low", "Medium", "High", "Critical"]
+
 class ComplaintResolutionEnv:
     def __init__(self):
         # State: [Category_Idx, Severity_Idx, Workload_Idx, Lat, Lon]
         # Actions: [Assign_Officer_0, Assign_Officer_1, Assign_Officer_2, Escalate, Merge]
         self.state_dim = 5
         self.action_dim = 5
-        self.categories = ["Roads", "Water", "Electricity", "Sanitation", "Traffic", "Others"]
-        self.severities = ["Low", "Medium", "High", "Critical"]
+        self.categories = list(CATEGORIES)
+        self.severities = list(SEVERITIES)
         
     def get_state_vector(self, category: str, severity: str, workload: float, lat: float, lon: float) -> np.ndarray:
         cat_idx = self.categories.index(category) if category in self.categories else 5
         sev_idx = self.severities.index(severity) if severity in self.severities else 1
         return np.array([cat_idx, sev_idx, workload, lat, lon], dtype=np.float32)
 
+    def get_state_vectors(self, category_idx: np.ndarray, severity_idx: np.ndarray, workload: np.ndarray,
+                          lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Batch of state vectors (N, state_dim) from index / value arrays"""
+        return np.stack([category_idx, severity_idx, workload, lat, lon], axis=1).astype(np.float32)
+
     def calculate_reward(self, action: int, outcome: Dict[str, Any]) -> float:
-        reward = 0.0
+        outcomes = {key: np.array([value], dtype=np.float64) for key, value in outcome.items()
+                    if key in ('resolution_days', 'was_overridden', 'duplicate_detection_correct')}
+        return float(self.calculate_rewards(np.array([action]), outcomes)[0])
+
+    def calculate_rewards(self, actions: np.ndarray, outcomes: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Vectorized reward for a batch of outcomes; each outcome field is an
+        array aligned with actions (missing fields / NaN take the defaults)
+        """
+        n = len(actions)
+        reward = np.zeros(n)
         
         # 1. Resolution Speed Reward (Faster is better)
-        # Assuming outcome['resolution_days'] is provided
-        days = outcome.get('resolution_days', 10)
-        if days < 2: reward += 10.0
-        elif days < 5: reward += 5.0
-        else: reward -= 5.0
+        days = np.asarray(outcomes.get('resolution_days', np.full(n, 10.0)), dtype=np.float64)
+        days = np.where(np.isnan(days), 10.0, days)
+        reward += np.select([days < 2, days < 5], [10.0, 5.0], -5.0)
 
         # 2. Correctness/Override Penalty
-        if outcome.get('was_overridden'):
-            reward -= 20.0
-        else:
-            reward += 10.0
+        overridden = np.nan_to_num(np.asarray(outcomes.get('was_overridden', np.zeros(n)), dtype=np.float64)).astype(bool)
+        reward += np.where(overridden, -20.0, 10.0)
 
         # 3. Duplicate Accuracy
-        if outcome.get('duplicate_detection_correct'):
-            reward += 5.0
+        duplicate_correct = np.nan_to_num(
+            np.asarray(outcomes.get('duplicate_detection_correct', np.zeros(n)), dtype=np.float64)).astype(bool)
+        reward += np.where(duplicate_correct, 5.0, 0.0)
 
         return reward
@@ -0,0 +1,152 @@
+"""
+Debounced persistence for the RL policy.
+
+Q-updates only mark cells dirty and queue a small delta record. A background
+task on the event loop then:
+  - appends queued delta records to the current generation's log every
+    RL_DELTA_FLUSH_SECONDS (a crash loses at most that window), and
+  - takes a full snapshot once RL_SNAPSHOT_EVERY_UPDATES updates have
+    accumulated, or RL_SNAPSHOT_INTERVAL_SECONDS after the first unsaved one.
+
+Snapshot arrays are copied on the loop (a memcpy of a few MB) so the table
+keeps taking updates; the file writes, fsyncs and renames run in a worker
+thread. Callers outside an event loop (training scripts, migration) use
+snapshot_sync().
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.rl.policy_store import DenseQTable
+
+logger = logging.getLogger("ai-engine.rl-persistence")
+
+RL_SNAPSHOT_EVERY_UPDATES = int(os.getenv("RL_SNAPSHOT_EVERY_UPDATES", "1000"))
+RL_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("RL_SNAPSHOT_INTERVAL_SECONDS", "300"))
+RL_DELTA_FLUSH_SECONDS = float(os.getenv("RL_DELTA_FLUSH_SECONDS", "1.0"))
+RL_DELTA_FSYNC = os.getenv("RL_DELTA_FSYNC", "true").lower() == "true"
+
+
+class PolicyPersistence:
+    def __init__(self, table: DenseQTable,
+                 snapshot_every: int = RL_SNAPSHOT_EVERY_UPDATES,
+                 snapshot_interval: float = RL_SNAPSHOT_INTERVAL_SECONDS,
+                 delta_flush_interval: float = RL_DELTA_FLUSH_SECONDS):
+        self.table = table
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.delta_flush_interval = delta_flush_interval
+
+        self.dirty = 0
+        self._dirty_since: Optional[float] = None
+        self._pending: List[np.ndarray] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"updates": 0, "delta_records": 0, "delta_flushes": 0, "snapshots": 0,
+                      "last_snapshot_ms": None, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.table.persistent
+
+    def record(self, index, actions):
+        """Note updated (state, action) cells; no I/O"""
+        if not self.enabled:
+            return
+        records = self.table.delta_records(index, actions)
+        with self._lock:
+            self._pending.append(records)
+            self.dirty += len(records)
+            self.stats["updates"] += len(records)
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+
+    def ensure_started(self):
+        """Start the background flusher on the running loop (idempotent)"""
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.delta_flush_interval)
+            try:
+                if self._snapshot_due():
+                    await self.snapshot()
+                else:
+                    await self.flush_deltas()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"RL policy persistence failed: {e}")
+
+    def _snapshot_due(self) -> bool:
+        with self._lock:
+            if not self.dirty:
+                return False
+            return (self.dirty >= self.snapshot_every
+                    or time.monotonic() - self._dirty_since >= self.snapshot_interval)
+
+    def _take_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return np.concatenate(pending) if pending else None
+
+    async def flush_deltas(self):
+        records = self._take_pending()
+        if records is not None:
+            await asyncio.to_thread(self._append, self.table.generation, records)
+
+    def _append(self, generation: int, records: np.ndarray):
+        self.table.append_deltas(generation, records, fsync=RL_DELTA_FSYNC)
+        self.stats["delta_records"] += len(records)
+        self.stats["delta_flushes"] += 1
+
+    def _begin_snapshot(self):
+        """Copy the table and roll to a new generation; runs where updates happen"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self.dirty = 0
+            self._dirty_since = None
+            q, visits = np.array(self.table.q), np.array(self.table.visits)
+            previous = self.table.generation
+            self.table.generation += 1
+        return previous, np.concatenate(pending) if pending else None, q, visits
+
+    def _write_snapshot(self, previous: int, pending: Optional[np.ndarray], q: np.ndarray, visits: np.ndarray):
+        started = time.perf_counter()
+        # Log first: if the snapshot write dies, replay of the previous generation still covers these
+        if pending is not None:
+            self._append(previous, pending)
+        self.table.write_snapshot(previous + 1, q, visits)
+        self.stats["snapshots"] += 1
+        self.stats["last_snapshot_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(f"RL Policy snapshot {previous + 1} saved.")
+
+    async def snapshot(self):
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self._write_snapshot, *self._begin_snapshot())
+
+    def snapshot_sync(self):
+        if self.enabled:
+            self._write_snapshot(*self._begin_snapshot())
+
+    async def close(self):
+        """Stop the background task and persist everything outstanding"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.dirty:
+            await self.snapshot()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = sum(len(p) for p in self._pending)
+            dirty = self.dirty
+        return {**self.stats, "enabled": self.enabled, "dirty": dirty, "pending_delta_records": pending,
+                "generation": self.table.generation, "running": self._task is not None and not self._task.done()}
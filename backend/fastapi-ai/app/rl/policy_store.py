@@ -0,0 +1,329 @@
+"""
+Dense Q-table for the routing agent.
+
+States are discretized into a fixed grid instead of keying a dict on rounded
+raw floats:
+
+    category (6) x severity (4) x workload bucket (RL_WORKLOAD_BINS)
+        x geo cell (RL_GEO_CELL_DEG grid over RL_GEO_BOUNDS, plus cell 0 for
+          coordinates outside the bounds or missing)
+
+so the table has a fixed size, every lookup is an array index, and batches of
+states are looked up and updated with single NumPy operations.
+
+On disk the store is a series of generations:
+
+    snapshot.json        commit point: current generation + layout
+    q-<gen>.npy          Q-values at that generation
+    visits-<gen>.npy     per-state visit counts at that generation
+    delta-<gen>.log      updates made after snapshot <gen> was taken
+
+Snapshots are written to temp files, fsynced and renamed into place; the
+manifest rename is what commits a generation, so a crash mid-write leaves the
+previous one intact. Delta records hold the post-update value of each touched
+cell, so replaying every log from the committed generation onwards is
+idempotent and restores the table to its last logged state. Snapshots are
+mapped copy-on-write on load: pages are read lazily and updates stay private
+until the next snapshot. A store whose layout does not match the running
+config is left untouched and the agent runs in memory.
+
+Migrating a legacy dict policy:
+    python -m app.rl.policy_store migrate models/rl_policy.pkl --out models/rl_policy
+"""
+
+import os
+import re
+import json
+import pickle
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.rl.environment import CATEGORIES, SEVERITIES
+
+logger = logging.getLogger("ai-engine.rl-policy")
+
+RL_POLICY_DIR = os.getenv("RL_POLICY_DIR", "models/rl_policy")
+RL_LEGACY_POLICY_PATH = os.getenv("RL_LEGACY_POLICY_PATH", "models/rl_policy.pkl")
+RL_WORKLOAD_BINS = int(os.getenv("RL_WORKLOAD_BINS", "10"))
+RL_GEO_CELL_DEG = float(os.getenv("RL_GEO_CELL_DEG", "1.0"))
+# lat_min, lat_max, lon_min, lon_max — India by default
+RL_GEO_BOUNDS = tuple(float(v) for v in os.getenv("RL_GEO_BOUNDS", "6,38,68,98").split(","))
+
+STORE_VERSION = 2
+MANIFEST_FILE = "snapshot.json"
+DELTA_DTYPE = np.dtype([("index", "<i8"), ("action", "<i2"), ("q", "<f4"), ("visits", "<u4")])
+
+
+class DenseQTable:
+    def __init__(self, action_dim: int, path: Optional[str] = RL_POLICY_DIR,
+                 workload_bins: int = RL_WORKLOAD_BINS, geo_cell_deg: float = RL_GEO_CELL_DEG,
+                 geo_bounds: Tuple[float, float, float, float] = RL_GEO_BOUNDS):
+        self.action_dim = action_dim
+        self.path = path
+        self.workload_bins = workload_bins
+        self.geo_cell_deg = geo_cell_deg
+        self.lat_min, self.lat_max, self.lon_min, self.lon_max = geo_bounds
+
+        self.lat_cells = int(np.ceil((self.lat_max - self.lat_min) / geo_cell_deg))
+        self.lon_cells = int(np.ceil((self.lon_max - self.lon_min) / geo_cell_deg))
+        self.geo_cells = self.lat_cells * self.lon_cells + 1  # + "unknown location"
+        self.shape = (len(CATEGORIES), len(SEVERITIES), workload_bins, self.geo_cells)
+        self.num_states = int(np.prod(self.shape))
+        # Row-major strides to flatten (category, severity, workload, cell) into one index
+        self.strides = np.array([int(np.prod(self.shape[i + 1:])) for i in range(4)], dtype=np.int64)
+
+        self.persistent = False
+        self.generation = 0
+        self._io_lock = threading.Lock()
+        self.q, self.visits = self._open()
+
+    # ------------------------------------------------------------------
+    # Layout / persistence
+    # ------------------------------------------------------------------
+
+    def layout(self) -> Dict[str, Any]:
+        return {
+            "version": STORE_VERSION,
+            "categories": list(CATEGORIES),
+            "severities": list(SEVERITIES),
+            "workload_bins": self.workload_bins,
+            "geo_cell_deg": self.geo_cell_deg,
+            "geo_bounds": [self.lat_min, self.lat_max, self.lon_min, self.lon_max],
+            "action_dim": self.action_dim,
+        }
+
+    def _file(self, kind: str, generation: int) -> str:
+        suffix = "log" if kind == "delta" else "npy"
+        return os.path.join(self.path, f"{kind}-{generation}.{suffix}")
+
+    def _generations(self, kind: str) -> List[int]:
+        pattern = re.compile(rf"^{kind}-(\d+)\.(npy|log)$")
+        return sorted(int(m.group(1)) for m in map(pattern.match, os.listdir(self.path)) if m)
+
+    def _open(self) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.path:
+            return self._in_memory()
+
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            if os.path.exists(manifest_path):
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+                if manifest.get("layout") != self.layout():
+                    logger.error(f"RL policy store at {self.path} has a different layout; running in memory "
+                                 f"(migrate or remove it to persist)")
+                    return self._in_memory()
+                self.generation = manifest["generation"]
+                q = np.lib.format.open_memmap(self._file("q", self.generation), mode="c")
+                visits = np.lib.format.open_memmap(self._file("visits", self.generation), mode="c")
+            else:
+                q, visits = self._in_memory()
+
+            self.persistent = True
+            replayed = self._replay_deltas(q, visits)
+            logger.info(f"RL Policy loaded (generation {self.generation}, {replayed} delta records replayed, "
+                        f"{int(np.count_nonzero(visits))} visited states).")
+            return q, visits
+        except Exception as e:
+            logger.error(f"Failed to open RL policy store at {self.path}, running in memory: {e}")
+            return self._in_memory()
+
+    def _in_memory(self) -> Tuple[np.ndarray, np.ndarray]:
+        self.persistent = False
+        return (np.zeros((self.num_states, self.action_dim), dtype=np.float32),
+                np.zeros(self.num_states, dtype=np.uint32))
+
+    def _replay_deltas(self, q: np.ndarray, visits: np.ndarray) -> int:
+        records = [self._read_deltas(g) for g in self._generations("delta") if g >= self.generation]
+        records = [r for r in records if len(r)]
+        if not records:
+            return 0
+        records = np.concatenate(records)
+        # Keep the last record per cell; logs are chronological
+        cells = records["index"] * self.action_dim + records["action"]
+        _, last = np.unique(cells[::-1], return_index=True)
+        latest = records[::-1][last]
+        q[latest["index"], latest["action"]] = latest["q"]
+        np.maximum.at(visits, latest["index"], latest["visits"])
+        return len(records)
+
+    def _read_deltas(self, generation: int) -> np.ndarray:
+        with open(self._file("delta", generation), "rb") as f:
+            data = f.read()
+        # A crash can leave a partial trailing record
+        usable = len(data) - len(data) % DELTA_DTYPE.itemsize
+        return np.frombuffer(data[:usable], dtype=DELTA_DTYPE)
+
+    def delta_records(self, index: np.ndarray, actions: np.ndarray) -> np.ndarray:
+        """Post-update state of the given (state, action) cells, as delta log records"""
+        index = np.atleast_1d(index)
+        actions = np.atleast_1d(actions)
+        records = np.empty(len(index), dtype=DELTA_DTYPE)
+        records["index"] = index
+        records["action"] = actions
+        records["q"] = self.q[index, actions]
+        records["visits"] = self.visits[index]
+        return records
+
+    def append_deltas(self, generation: int, records: np.ndarray, fsync: bool = True):
+        with self._io_lock, open(self._file("delta", generation), "ab") as f:
+            f.write(records.tobytes())
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+
+    def write_snapshot(self, generation: int, q: np.ndarray, visits: np.ndarray):
+        """Atomically commit arrays as `generation`, then drop older generations"""
+        with self._io_lock:
+            for kind, array in (("q", q), ("visits", visits)):
+                self._atomic_write(self._file(kind, generation), lambda f, a=array: np.save(f, a))
+            manifest = {"generation": generation, "layout": self.layout()}
+            self._atomic_write(os.path.join(self.path, MANIFEST_FILE),
+                               lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+
+            for kind in ("q", "visits", "delta"):
+                for old in self._generations(kind):
+                    if old < generation:
+                        try:
+                            os.remove(self._file(kind, old))
+                        except OSError:
+                            pass
+
+    @staticmethod
+    def _atomic_write(path: str, write):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    # ------------------------------------------------------------------
+    # Discretization
+    # ------------------------------------------------------------------
+
+    def state_index(self, states: np.ndarray) -> np.ndarray:
+        """
+        Flat table index for one state (shape (5,)) or a batch (shape (N, 5)) of
+        [category_idx, severity_idx, workload, lat, lon] vectors
+        """
+        states = np.asarray(states, dtype=np.float64)
+        single = states.ndim == 1
+        states = np.atleast_2d(states)
+
+        category = np.clip(states[:, 0].astype(np.int64), 0, self.shape[0] - 1)
+        severity = np.clip(states[:, 1].astype(np.int64), 0, self.shape[1] - 1)
+        workload = np.clip((states[:, 2] * self.workload_bins).astype(np.int64), 0, self.workload_bins - 1)
+
+        lat, lon = states[:, 3], states[:, 4]
+        lat_cell = np.floor((lat - self.lat_min) / self.geo_cell_deg).astype(np.int64)
+        lon_cell = np.floor((lon - self.lon_min) / self.geo_cell_deg).astype(np.int64)
+        inside = (lat_cell >= 0) & (lat_cell < self.lat_cells) & (lon_cell >= 0) & (lon_cell < self.lon_cells)
+        cell = np.where(inside, lat_cell * self.lon_cells + lon_cell + 1, 0)
+
+        index = np.stack([category, severity, workload, cell], axis=1) @ self.strides
+        return index[0] if single else index
+
+    # ------------------------------------------------------------------
+    # Lookup / update
+    # ------------------------------------------------------------------
+
+    def best_actions(self, index: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Greedy action per state and whether the state has ever been updated"""
+        return self.q[index].argmax(axis=-1), self.visits[index] > 0
+
+    def update(self, index: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+               next_index: np.ndarray, lr: float, gamma: float,
+               dones: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Batched Q-learning step. TD targets use the table as it was before the
+        batch and terminal transitions (dones) do not bootstrap. A (state,
+        action) pair that appears several times takes one step along its mean
+        TD error, so replayed duplicates cannot overshoot. Returns the TD errors.
+        """
+        index = np.atleast_1d(index)
+        actions = np.atleast_1d(actions)
+        rewards = np.atleast_1d(np.asarray(rewards, dtype=np.float32))
+        next_index = np.atleast_1d(next_index)
+
+        bootstrap = self.q[next_index].max(axis=1)
+        if dones is not None:
+            bootstrap = np.where(np.atleast_1d(dones), 0.0, bootstrap)
+        td_target = rewards + gamma * bootstrap
+        td_error = td_target - self.q[index, actions]
+
+        cells, inverse, counts = np.unique(index * self.action_dim + actions,
+                                           return_inverse=True, return_counts=True)
+        mean_error = np.bincount(inverse, weights=td_error) / counts
+        self.q[cells // self.action_dim, cells % self.action_dim] += (lr * mean_error).astype(np.float32)
+        np.add.at(self.visits, index, 1)
+        return td_error
+
+    def __len__(self) -> int:
+        """Number of states that have been visited"""
+        return int(np.count_nonzero(self.visits))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "states": self.num_states,
+            "visited_states": len(self),
+            "memory_mb": round((self.q.nbytes + self.visits.nbytes) / 1024 / 1024, 2),
+            "persistent": self.persistent,
+            "path": self.path if self.persistent else None,
+            "generation": self.generation,
+        }
+
+    # ------------------------------------------------------------------
+    # Migration
+    # ------------------------------------------------------------------
+
+    def migrate_legacy(self, legacy_path: str) -> int:
+        """
+        Fold a legacy {tuple(rounded state): q-values} pickle into the table.
+        Legacy keys that land in the same cell are averaged. Returns the number
+        of cells written.
+        """
+        with open(legacy_path, "rb") as f:
+            legacy = pickle.load(f)
+        if not legacy:
+            return 0
+
+        states = np.array([list(key) for key in legacy.keys()], dtype=np.float64)
+        values = np.array([np.asarray(v, dtype=np.float32)[:self.action_dim] for v in legacy.values()])
+        index = self.state_index(states)
+
+        cells, inverse, counts = np.unique(index, return_inverse=True, return_counts=True)
+        sums = np.zeros((len(cells), self.action_dim), dtype=np.float64)
+        np.add.at(sums, inverse, values)
+        self.q[cells] = (sums / counts[:, None]).astype(np.float32)
+        self.visits[cells] = np.maximum(self.visits[cells], counts.astype(np.uint32))
+
+        logger.info(f"Migrated {len(legacy)} legacy RL states from {legacy_path} into {len(cells)} cells")
+        return len(cells)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Dense RL policy store tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="Convert a legacy rl_policy.pkl into a dense store")
+    migrate.add_argument("legacy_path", nargs="?", default=RL_LEGACY_POLICY_PATH)
+    migrate.add_argument("--out", default=RL_POLICY_DIR)
+    migrate.add_argument("--action-dim", type=int, default=5)
+    sub.add_parser("stats", help="Print store statistics").add_argument("--path", default=RL_POLICY_DIR)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        store = DenseQTable(args.action_dim, path=args.out)
+        cells = store.migrate_legacy(args.legacy_path)
+        store.generation += 1
+        store.write_snapshot(store.generation, store.q, store.visits)
+        print(json.dumps({"cells_written": cells, **store.get_stats()}, indent=2))
+    else:
+        print(json.dumps(DenseQTable(5, path=args.path).get_stats(), indent=2))
@@ -0,0 +1,185 @@
+"""
+Experience replay for the routing agent.
+
+Resolution feedback is appended to a fixed-capacity ring of preallocated
+NumPy arrays instead of being applied once and discarded. A background
+learner on the event loop samples mini-batches and applies them with one
+vectorized Q-update each. Learning is paced by a replay ratio (sampled
+transitions per new transition) so an idle service does no work, and the
+cost of learning no longer sits on the event-handling path.
+
+The buffer is saved atomically (temp file + rename) from a worker thread at
+most every RL_REPLAY_SAVE_SECONDS while new transitions arrive, and on
+shutdown, so scarce real feedback survives restarts.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("ai-engine.rl-replay")
+
+RL_REPLAY_CAPACITY = int(os.getenv("RL_REPLAY_CAPACITY", "100000"))
+RL_REPLAY_PATH = os.getenv("RL_REPLAY_PATH", "models/rl_replay.npz")
+RL_REPLAY_BATCH = int(os.getenv("RL_REPLAY_BATCH", "64"))
+RL_REPLAY_RATIO = float(os.getenv("RL_REPLAY_RATIO", "8"))  # sampled per new transition
+RL_REPLAY_MIN_SIZE = int(os.getenv("RL_REPLAY_MIN_SIZE", "1"))
+RL_LEARN_INTERVAL_SECONDS = float(os.getenv("RL_LEARN_INTERVAL_SECONDS", "2.0"))
+RL_REPLAY_SAVE_SECONDS = float(os.getenv("RL_REPLAY_SAVE_SECONDS", "60"))
+
+
+class ReplayBuffer:
+    def __init__(self, capacity: int = RL_REPLAY_CAPACITY, state_dim: int = 5,
+                 path: Optional[str] = RL_REPLAY_PATH):
+        self.capacity = capacity
+        self.state_dim = state_dim
+        self.path = path
+        self.states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int16)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.size = 0
+        self.head = 0  # next slot to write
+        self.added = 0  # lifetime count, survives restarts
+        self._load()
+
+    def add(self, state: np.ndarray, action: int, reward: float, next_state: np.ndarray, done: bool = True):
+        slot = self.head
+        self.states[slot] = state
+        self.actions[slot] = action
+        self.rewards[slot] = reward
+        self.next_states[slot] = next_state
+        self.dones[slot] = done
+        self.head = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.added += 1
+
+    def sample(self, batch_size: int, rng: np.random.Generator) -> Tuple[np.ndarray, ...]:
+        idx = rng.integers(self.size, size=batch_size)
+        return self.states[idx], self.actions[idx], self.rewards[idx], self.next_states[idx], self.dones[idx]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        # Oldest-first, so a reload with a different capacity keeps the newest transitions
+        order = np.roll(np.arange(self.size), -self.head) if self.size == self.capacity else np.arange(self.size)
+        return {
+            "states": self.states[order], "actions": self.actions[order], "rewards": self.rewards[order],
+            "next_states": self.next_states[order], "dones": self.dones[order],
+            "added": np.array(self.added),
+        }
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Copy of the live contents, safe to write from another thread"""
+        return self._arrays()
+
+    def save(self, arrays: Optional[Dict[str, np.ndarray]] = None):
+        if not self.path:
+            return
+        arrays = arrays if arrays is not None else self._arrays()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                n = min(len(data["actions"]), self.capacity)
+                if data["states"].shape[1] != self.state_dim:
+                    raise ValueError(f"state_dim {data['states'].shape[1]} != {self.state_dim}")
+                self.states[:n] = data["states"][-n:]
+                self.actions[:n] = data["actions"][-n:]
+                self.rewards[:n] = data["rewards"][-n:]
+                self.next_states[:n] = data["next_states"][-n:]
+                self.dones[:n] = data["dones"][-n:]
+                self.added = int(data["added"])
+            self.size = n
+            self.head = n % self.capacity
+            logger.info(f"Replay buffer loaded ({n} transitions).")
+        except Exception as e:
+            logger.error(f"Failed to load replay buffer: {e}")
+
+
+class ReplayLearner:
+    def __init__(self, agent, buffer: ReplayBuffer, batch_size: int = RL_REPLAY_BATCH,
+                 replay_ratio: float = RL_REPLAY_RATIO, min_size: int = RL_REPLAY_MIN_SIZE,
+                 interval: float = RL_LEARN_INTERVAL_SECONDS, save_interval: float = RL_REPLAY_SAVE_SECONDS):
+        self.agent = agent
+        self.buffer = buffer
+        self.batch_size = batch_size
+        self.replay_ratio = replay_ratio
+        self.min_size = min_size
+        self.interval = interval
+        self.save_interval = save_interval
+        self.rng = np.random.default_rng()
+        self._seen = buffer.added
+        self._saved = buffer.added
+        self._last_save = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"batches": 0, "samples": 0, "saves": 0, "last_td_error": None, "errors": 0}
+
+    def ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.learn()
+                await self._maybe_save()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Replay learner step failed: {e}")
+
+    def learn(self) -> int:
+        """Apply mini-batch updates for transitions added since the last call; returns batches run"""
+        new = self.buffer.added - self._seen
+        self._seen = self.buffer.added
+        if new <= 0 or len(self.buffer) < self.min_size:
+            return 0
+
+        batches = int(np.ceil(new * self.replay_ratio / self.batch_size))
+        batch_size = min(self.batch_size, len(self.buffer) * int(np.ceil(self.replay_ratio)))
+        for _ in range(batches):
+            states, actions, rewards, next_states, dones = self.buffer.sample(batch_size, self.rng)
+            td_errors = self.agent.update_batch(states, actions, rewards, next_states, dones)
+            self.stats["batches"] += 1
+            self.stats["samples"] += batch_size
+            self.stats["last_td_error"] = round(float(np.abs(td_errors).mean()), 4)
+        return batches
+
+    async def _maybe_save(self, force: bool = False):
+        if self.buffer.added == self._saved:
+            return
+        if not force and time.monotonic() - self._last_save < self.save_interval:
+            return
+        added = self.buffer.added
+        await asyncio.to_thread(self.buffer.save, self.buffer.snapshot())
+        self._saved = added
+        self._last_save = time.monotonic()
+        self.stats["saves"] += 1
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.learn()
+        await self._maybe_save(force=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "buffer_size": len(self.buffer), "capacity": self.buffer.capacity,
+                "transitions_added": self.buffer.added,
+                "running": self._task is not None and not self._task.done()}
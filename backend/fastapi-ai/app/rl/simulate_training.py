@@ -1,61 +1,158 @@
-import numpy as np
+"""
+Offline RL training simulation for the routing agent.
+
+Each step generates a whole batch of synthetic complaints as arrays, picks
+epsilon-greedy actions for all of them at once, computes rewards with
+ComplaintResolutionEnv.calculate_rewards and applies one batched Q-update.
+Independent seeds train in parallel processes on copies of the current policy;
+their results are merged (visit-weighted) back into rl_agent's table.
+
+Usage (from backend/fastapi-ai):
+    python -m app.rl.simulate_training --episodes 200000 --seeds 4
+"""
+import os
+import time
+import argparse
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
 from app.rl import rl_agent, env
+from app.rl.agent import QLearningAgent
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("rl-training")
 
-def run_simulation(episodes=1000):
-    logger.info(f"Starting RL training simulation for {episodes} episodes...")
-    
-    total_rewards = []
-    
-    for e in range(episodes):
-        # 1. Generate random state
-        category = np.random.choice(env.categories)
-        severity = np.random.choice(env.severities)
-        workload = np.random.uniform(0, 1)
-        lat, lon = 28.6, 77.2 # Dummy Delhi coords
-        
-        state = env.get_state_vector(category, severity, workload, lat, lon)
-        
-        # 2. Get action from agent
-        action = rl_agent.get_action(state)
-        
-        # 3. Simulate outcome (Simplified)
-        # In a real environment, this would come from historical resolution data
-        # Action 0, 1, 2 are assignments. action 3 is escalate, 4 is merge.
-        is_correct_action = (action == 0 and category == "Roads") or \
-                           (action == 1 and category == "Water") or \
-                           (action == 2 and category == "Sanitation")
-                           
-        outcome = {
-            'resolution_days': np.random.randint(1, 4) if is_correct_action else np.random.randint(5, 15),
-            'was_overridden': not is_correct_action and np.random.rand() > 0.8,
-            'duplicate_detection_correct': True
-        }
-        
-        # 4. Calculate reward
-        reward = env.calculate_reward(action, outcome)
-        
-        # 5. Update agent
-        # For simplicity in this env, next_state is new complaint state
-        next_state = env.get_state_vector(
-            np.random.choice(env.categories),
-            np.random.choice(env.severities),
-            np.random.uniform(0, 1),
-            28.6, 77.2
+# Category handled correctly by assignment actions 0, 1, 2 (Roads, Water, Sanitation)
+CORRECT_CATEGORY_FOR_ACTION = np.array([
+    env.categories.index("Roads"), env.categories.index("Water"), env.categories.index("Sanitation"), -1, -1
+])
+
+
+def simulate_batch(agent: QLearningAgent, batch_size: int, rng: np.random.Generator,
+                   bounds: tuple) -> np.ndarray:
+    """One vectorized step over batch_size synthetic complaints; returns the rewards"""
+    lat_min, lat_max, lon_min, lon_max = bounds
+
+    def random_states():
+        return env.get_state_vectors(
+            rng.integers(len(env.categories), size=batch_size),
+            rng.integers(len(env.severities), size=batch_size),
+            rng.uniform(0, 1, size=batch_size),
+            rng.uniform(lat_min, lat_max, size=batch_size),
+            rng.uniform(lon_min, lon_max, size=batch_size),
         )
-        
-        rl_agent.update(state, action, reward, next_state)
-        total_rewards.append(reward)
-        
-        if e % 100 == 0:
-            avg_reward = np.mean(total_rewards[-100:])
-            logger.info(f"Episode {e} | Avg Reward (last 100): {avg_reward:.2f} | Epsilon: {rl_agent.epsilon:.2f}")
+
+    # 1. Generate random states
+    states = random_states()
+
+    # 2. Get actions from agent
+    actions = agent.get_actions(states, rng)
+
+    # 3. Simulate outcomes (Simplified)
+    # In a real environment, this would come from historical resolution data
+    is_correct_action = CORRECT_CATEGORY_FOR_ACTION[actions] == states[:, 0].astype(np.int64)
+    outcomes = {
+        'resolution_days': np.where(is_correct_action, rng.integers(1, 4, size=batch_size),
+                                    rng.integers(5, 15, size=batch_size)),
+        'was_overridden': ~is_correct_action & (rng.random(batch_size) > 0.8),
+        'duplicate_detection_correct': np.ones(batch_size, dtype=bool),
+    }
+
+    # 4. Calculate rewards
+    rewards = env.calculate_rewards(actions, outcomes)
+
+    # 5. Update agent; next_state is the next (independent) complaint
+    agent.update_batch(states, actions, rewards, random_states())
+    return rewards
+
+
+def train_seed(seed: int, episodes: int, batch_size: int, q: np.ndarray, visits: np.ndarray,
+               bounds: tuple, curve_points: int) -> Dict[str, Any]:
+    """Train an in-memory copy of the policy; runs in a worker process"""
+    agent = QLearningAgent(state_dim=rl_agent.state_dim, action_dim=rl_agent.action_dim,
+                           learning_rate=rl_agent.lr, discount_factor=rl_agent.gamma,
+                           epsilon=rl_agent.epsilon, policy_dir=None)
+    agent.q_table.q[:] = q
+    agent.q_table.visits[:] = visits
+    rng = np.random.default_rng(seed)
+
+    # Full batches, then a final partial batch for the remainder
+    sizes = [batch_size] * (episodes // batch_size) + ([episodes % batch_size] if episodes % batch_size else [])
+    steps = len(sizes)
+    step_rewards = np.empty(steps)
+    for step, size in enumerate(sizes):
+        step_rewards[step] = simulate_batch(agent, size, rng, bounds).mean()
+
+    # Convergence curve: mean reward over equal slices of training
+    curve = [float(chunk.mean()) for chunk in np.array_split(step_rewards, min(curve_points, steps))]
+    return {
+        "seed": seed,
+        "episodes": episodes,
+        "q": agent.q_table.q,
+        "new_visits": agent.q_table.visits - visits,
+        "curve": curve,
+    }
+
+
+def merge_results(results: List[Dict[str, Any]]):
+    """Visit-weighted average of the seeds' Q-values, written into rl_agent's table"""
+    table = rl_agent.q_table
+    new_visits = np.sum([r["new_visits"] for r in results], axis=0, dtype=np.float64)
+    touched = np.flatnonzero(new_visits)
+    weighted = np.zeros((len(touched), table.action_dim))
+    for r in results:
+        weighted += r["q"][touched] * r["new_visits"][touched, None]
+    table.q[touched] = (weighted / new_visits[touched, None]).astype(np.float32)
+    table.visits[touched] += new_visits[touched].astype(np.uint32)
+
+
+def run_simulation(episodes=1000, seeds: int = 1, batch_size: int = 4096, curve_points: int = 20):
+    logger.info(f"Starting RL training simulation for {episodes} episodes across {seeds} seed(s)...")
+
+    table = rl_agent.q_table
+    bounds = (table.lat_min, table.lat_max, table.lon_min, table.lon_max)
+    episodes = max(1, episodes)
+    if seeds > episodes:
+        logger.info(f"Using {episodes} seed(s) instead of {seeds}: each seed needs at least one episode")
+        seeds = episodes
+    # Every episode is run: the remainder is spread over the first seeds
+    per_seed = [episodes // seeds + (1 if seed < episodes % seeds else 0) for seed in range(seeds)]
+    batch_size = max(1, min(batch_size, per_seed[-1]))
+    # Same number of curve points for every seed, so their curves can be averaged
+    curve_points = max(1, min(curve_points, -(-per_seed[-1] // batch_size)))
+    q, visits = np.array(table.q), np.array(table.visits)
+
+    started = time.perf_counter()
+    if seeds == 1:
+        results = [train_seed(0, per_seed[0], batch_size, q, visits, bounds, curve_points)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(seeds, os.cpu_count() or 1)) as pool:
+            futures = [pool.submit(train_seed, seed, per_seed[seed], batch_size, q, visits, bounds, curve_points)
+                       for seed in range(seeds)]
+            results = [f.result() for f in futures]
+    merge_results(results)
+    elapsed = time.perf_counter() - started
+
+    total = sum(r["episodes"] for r in results)
+    curve = np.mean([r["curve"] for r in results], axis=0)
+    for i, avg_reward in enumerate(curve):
+        logger.info(f"Progress {100 * (i + 1) / len(curve):5.1f}% | Avg Reward: {avg_reward:.2f} | Epsilon: {rl_agent.epsilon:.2f}")
+    logger.info(f"{total} episodes in {elapsed:.2f}s ({total / elapsed:,.0f} episodes/s), "
+                f"{len(table)} visited states")
 
     rl_agent.save_policy()
     logger.info("Training complete.")
+    return {"episodes": total, "seconds": elapsed, "episodes_per_s": total / elapsed,
+            "curve": curve.tolist(), "visited_states": len(table)}
+
 
 if __name__ == "__main__":
-    run_simulation()
+    parser = argparse.ArgumentParser(description="Train the routing policy on synthetic complaints")
+    parser.add_argument("--episodes", type=int, default=200000)
+    parser.add_argument("--seeds", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--curve-points", type=int, default=20)
+    args = parser.parse_args()
+    run_simulation(args.episodes, args.seeds, args.batch_size, args.curve_points)
@@ -85,6 +85,65 @@ class ResolutionVerifyResponse(BaseModel):
     feedback: str
     requires_admin: bool
 
+class OfficerPositionUpdate(BaseModel):
+    officer_id: str
+    department: str
+    latitude: float
+    longitude: float
+    available: bool = True
+    timestamp: Optional[float] = None
+
+class BatchRouteComplaint(BaseModel):
+    complaint_id: str
+    category: str
+    severity: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    priority: Optional[str] = None  # derived from severity when omitted
+    sla_hours: Optional[float] = None  # defaults per priority
+
+class BatchRouteOfficer(BaseModel):
+    officer_id: str
+    department: str
+    capacity: int
+    current_load: int = 0
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+class BatchRouteRequest(BaseModel):
+    complaints: List[BatchRouteComplaint] = Field(..., min_length=1, max_length=1000)
+    officers: Optional[List[BatchRouteOfficer]] = Field(default=None, max_length=1000)  # live roster, load and positions when omitted
+    reserve: bool = False  # count the assignments in the live officer load index
+
+class BatchRouteAssignment(BaseModel):
+    complaint_id: str
+    department: str
+    officer_id: Optional[str] = None
+    priority: str
+    travel_km: Optional[float] = None
+    eta_hours: Optional[float] = None
+    sla_hours: float
+    sla_met: bool
+
+class BatchRouteResponse(BaseModel):
+    assignments: List[BatchRouteAssignment]
+    assigned: int
+    unassigned: int
+    sla_breaches: int
+    solver: str
+    solve_ms: float
+
+class FederatedRoundRequest(BaseModel):
+    # Each district trains in a worker process on its own simulated data, so both are capped
+    districts: List[str] = Field(default=["District_A", "District_B", "District_C"], min_length=1, max_length=32)
+    samples_per_district: int = Field(default=100, gt=0, le=10_000)
+
+class VisionBatchRequest(BaseModel):
+    source_type: str
+    image_urls: List[str] = Field(..., min_length=1, max_length=64)
+    lat: float
+    lng: float
+
 class AIProcessWorkflowRequest(BaseModel):
     complaint_id: str
     text: str
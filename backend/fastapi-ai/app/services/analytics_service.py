@@ -38,7 +38,7 @@ class AnalyticsService:
         return {
             "is_active": True,
             "current_round": federated_coordinator.current_round,
-            "global_accuracy": latest["avg_accuracy"] if latest else 0.0,
+            "global_accuracy": latest["global_accuracy"] if latest else 0.0,
             "total_districts": len(federated_coordinator.nodes),
             "total_samples": latest["total_samples"] if latest else 0,
             "privacy_compliance": "High",
@@ -0,0 +1,210 @@
+"""
+Batch routing with global assignment.
+
+During surges (disaster mode) hundreds of complaints arrive together, and
+routing them one at a time piles work onto whichever officers look best to
+each complaint in turn. Here a whole batch is solved as one assignment
+problem per department:
+
+- every officer contributes one column per free capacity slot, and the k-th
+  slot sits k complaints deep in that officer's queue;
+- a complaint's cost for a slot is its expected completion time (travel at
+  BATCH_TRAVEL_SPEED_KMH, plus BATCH_HANDLING_HOURS per complaint ahead of it
+  and for itself), plus BATCH_SLA_PENALTY per hour past its SLA, all weighted
+  by priority;
+- every complaint can instead take an "unassigned" column priced at
+  BATCH_UNASSIGNED_HOURS weighted by its priority, so when slots run short
+  (or a complaint's only slots are out of reach) the lowest-priority
+  complaints are the ones left over.
+
+The minimum-cost matching is solved exactly with SciPy's Hungarian-style
+linear_sum_assignment (without SciPy, complaints pick their cheapest free
+column in priority order). Departments are
+independent, so solving them separately is still globally optimal.
+
+A department's cost matrix has complaints x (slots + complaints) cells; a
+batch with a department above BATCH_MAX_MATRIX_CELLS is rejected before any
+matrix is built.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.schemas import (
+    BatchRouteRequest, BatchRouteResponse, BatchRouteAssignment, BatchRouteComplaint, BatchRouteOfficer,
+)
+from app.services.routing_service import DEPARTMENTS, DEPARTMENT_ALIASES, resolve_department, priority_for
+from app.services.officer_load import officer_load
+from app.services.officer_geo import officer_geo, OFFICER_GEO_MAX_RADIUS_KM
+from app.utils.geo_utils import haversine_matrix
+
+logger = logging.getLogger("ai-engine.batch-routing")
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+BATCH_TRAVEL_SPEED_KMH = float(os.getenv("BATCH_TRAVEL_SPEED_KMH", "20"))
+BATCH_HANDLING_HOURS = float(os.getenv("BATCH_HANDLING_HOURS", "2"))
+BATCH_SLA_PENALTY = float(os.getenv("BATCH_SLA_PENALTY", "10"))  # cost per hour past SLA, relative to ETA hours
+BATCH_UNASSIGNED_HOURS = float(os.getenv("BATCH_UNASSIGNED_HOURS", "1000"))
+# float64 cells per department cost matrix (4M = 32 MB, a handful of same-sized copies are made)
+BATCH_MAX_MATRIX_CELLS = int(os.getenv("BATCH_MAX_MATRIX_CELLS", "4000000"))
+
+PRIORITY_WEIGHTS = {"Urgent": 8.0, "High": 4.0, "Normal": 2.0, "Low": 1.0}
+DEFAULT_SLA_HOURS = {"Urgent": 4.0, "High": 24.0, "Normal": 72.0, "Low": 168.0}
+
+
+class BatchTooLargeError(ValueError):
+    pass
+
+
+class BatchRoutingService:
+    async def route_batch(self, request: BatchRouteRequest) -> BatchRouteResponse:
+        live = request.officers is None
+        officers = await self._live_roster(request.complaints) if live else request.officers
+
+        started = time.perf_counter()
+        # CPU-bound solve stays off the event loop
+        assignments = await asyncio.to_thread(self.solve, request.complaints, officers, live)
+        solve_ms = (time.perf_counter() - started) * 1000
+
+        if request.reserve:
+            for assignment in assignments:
+                if assignment.officer_id:
+                    await officer_load.assign(assignment.complaint_id, assignment.department, assignment.officer_id)
+
+        assigned = sum(1 for a in assignments if a.officer_id)
+        response = BatchRouteResponse(
+            assignments=assignments,
+            assigned=assigned,
+            unassigned=len(assignments) - assigned,
+            sla_breaches=sum(1 for a in assignments if not a.sla_met),
+            solver="hungarian" if SCIPY_AVAILABLE else "greedy",
+            solve_ms=round(solve_ms, 2),
+        )
+        logger.info(f"[Batch Routing] {len(assignments)} complaints, {len(officers)} officers: "
+                    f"{assigned} assigned, {response.sla_breaches} SLA breaches in {solve_ms:.1f} ms")
+        return response
+
+    async def _live_roster(self, complaints: List[BatchRouteComplaint]) -> List[BatchRouteOfficer]:
+        """Department rosters plus geo-indexed officers, with live load and positions"""
+        roster = []
+        for department in sorted({resolve_department(c.category) for c in complaints}):
+            officer_ids = list(DEPARTMENTS[department])
+            officer_ids += [officer_id for officer_id, position in officer_geo.positions.items()
+                            if position.department == department and position.available and officer_id not in officer_ids]
+            loads = await officer_load.loads(department, officer_ids)
+            for officer_id in officer_ids:
+                position = officer_geo.positions.get(officer_id)
+                roster.append(BatchRouteOfficer(
+                    officer_id=officer_id, department=department,
+                    capacity=int(officer_load.capacity), current_load=int(loads[officer_id]),
+                    latitude=position.lat if position else None, longitude=position.lon if position else None,
+                ))
+        return roster
+
+    def solve(self, complaints: List[BatchRouteComplaint], officers: List[BatchRouteOfficer],
+              live: bool = False) -> List[BatchRouteAssignment]:
+        # Live rosters use the routing service's departments; caller rosters keep their own names
+        department_of = resolve_department if live else (lambda name: DEPARTMENT_ALIASES.get(name, name))
+        by_department: Dict[str, Tuple[List[int], List[BatchRouteOfficer]]] = {}
+        for i, complaint in enumerate(complaints):
+            by_department.setdefault(department_of(complaint.category), ([], []))[0].append(i)
+        for officer in officers:
+            group = by_department.get(department_of(officer.department))
+            if group is not None:
+                group[1].append(officer)
+        for department, (rows, dept_officers) in by_department.items():
+            n = len(rows)
+            cells = n * (sum(min(max(o.capacity - o.current_load, 0), n) for o in dept_officers) + n)
+            if cells > BATCH_MAX_MATRIX_CELLS:
+                raise BatchTooLargeError(f"Department {department} needs a {cells:,}-cell assignment matrix, "
+                                         f"the limit is {BATCH_MAX_MATRIX_CELLS:,}; split the batch")
+
+        results: List[Optional[BatchRouteAssignment]] = [None] * len(complaints)
+        for department, (rows, dept_officers) in by_department.items():
+            for i, assignment in zip(rows, self._solve_department(department, [complaints[i] for i in rows],
+                                                                   dept_officers)):
+                results[i] = assignment
+        return results
+
+    def _solve_department(self, department: str, complaints: List[BatchRouteComplaint],
+                          officers: List[BatchRouteOfficer]) -> List[BatchRouteAssignment]:
+        n = len(complaints)
+        priorities = [c.priority or priority_for(c.severity) for c in complaints]
+        weights = np.array([PRIORITY_WEIGHTS.get(p, 2.0) for p in priorities])
+        sla = np.array([c.sla_hours if c.sla_hours is not None else DEFAULT_SLA_HOURS.get(p, 72.0)
+                        for c, p in zip(complaints, priorities)])
+
+        # Slot columns: (officer, queue position), never more than the batch per officer
+        free = [max(o.capacity - o.current_load, 0) for o in officers]
+        slot_officer = np.repeat(np.arange(len(officers), dtype=np.int64), [min(f, n) for f in free])
+        slot_depth = np.concatenate([np.arange(o.current_load, o.current_load + min(f, n))
+                                     for o, f in zip(officers, free)] or [np.zeros(0)]).astype(np.float64)
+
+        travel_km = self._travel_km(complaints, officers)  # (n, officers), NaN where a location is unknown
+        slot_km = travel_km[:, slot_officer]
+        eta = np.nan_to_num(slot_km) / BATCH_TRAVEL_SPEED_KMH + (slot_depth[None, :] + 1) * BATCH_HANDLING_HOURS
+        cost = weights[:, None] * (eta + BATCH_SLA_PENALTY * np.maximum(eta - sla[:, None], 0.0))
+        forbidden = slot_km > OFFICER_GEO_MAX_RADIUS_KM  # NaN compares False
+        cost[forbidden] = 1e12
+
+        # One priority-priced "unassigned" column per complaint, so leaving a
+        # complaint out is always an option and never a forbidden slot: whoever
+        # is left over (slot shortfall or out of reach) has the lowest priority
+        unassigned = np.broadcast_to(weights[:, None] * BATCH_UNASSIGNED_HOURS, (n, n))
+        full = np.hstack([cost, unassigned])
+        if SCIPY_AVAILABLE:
+            rows, cols = linear_sum_assignment(full)
+        else:
+            rows, cols = self._priority_greedy(full, weights)
+
+        assignments = []
+        chosen = dict(zip(rows.tolist(), cols.tolist()))
+        for i, complaint in enumerate(complaints):
+            col = chosen.get(i, -1)
+            if 0 <= col < len(slot_officer) and not forbidden[i, col]:
+                km = slot_km[i, col]
+                assignments.append(BatchRouteAssignment(
+                    complaint_id=complaint.complaint_id, department=department,
+                    officer_id=officers[slot_officer[col]].officer_id, priority=priorities[i],
+                    travel_km=None if np.isnan(km) else round(float(km), 3),
+                    eta_hours=round(float(eta[i, col]), 2), sla_hours=float(sla[i]),
+                    sla_met=bool(eta[i, col] <= sla[i]),
+                ))
+            else:
+                assignments.append(BatchRouteAssignment(
+                    complaint_id=complaint.complaint_id, department=department, priority=priorities[i],
+                    sla_hours=float(sla[i]), sla_met=False,
+                ))
+        return assignments
+
+    @staticmethod
+    def _priority_greedy(cost: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Fallback without SciPy: highest priority first, each takes its cheapest free column"""
+        rows = np.argsort(-weights, kind="stable")
+        taken = np.zeros(cost.shape[1], dtype=bool)
+        cols = np.empty(len(rows), dtype=int)
+        for k, row in enumerate(rows):
+            col = int(np.argmin(np.where(taken, np.inf, cost[row])))
+            taken[col] = True
+            cols[k] = col
+        return rows, cols
+
+    @staticmethod
+    def _travel_km(complaints: List[BatchRouteComplaint], officers: List[BatchRouteOfficer]) -> np.ndarray:
+        def coords(items):
+            return np.radians(np.array([[np.nan if item.latitude is None else item.latitude,
+                                         np.nan if item.longitude is None else item.longitude]
+                                        for item in items], dtype=np.float64).reshape(-1, 2))
+        return haversine_matrix(coords(complaints), coords(officers))
+
+
+batch_routing_service = BatchRoutingService()
@@ -1,13 +1,51 @@
+import os
+import logging
 import openai
 from app.config import settings
 from app.schemas import ClassifyResponse
 import json
 
+logger = logging.getLogger("ai-engine")
+
+# openai: the LLM (default). local: opt-in, the multilingual prototype matcher
+# (inference workers or in-process), falling back to the LLM when it fails
+CLASSIFICATION_BACKEND = os.getenv("CLASSIFICATION_BACKEND", "openai")
+
+# MultilingualNLP categories -> the coarse categories used for routing
+LOCAL_CATEGORY_MAP = {
+    "Road & Potholes": "Roads",
+    "Garbage & Sanitation": "Sanitation",
+    "Streetlight": "Electricity",
+    "Water Supply": "Water",
+    "Sewage & Drainage": "Sanitation",
+    "Electricity": "Electricity",
+    "Traffic & Signals": "Traffic",
+    "Transport & Bus": "Traffic",
+}
+LOCAL_SEVERITY_MAP = {5: "Critical", 4: "High", 3: "Medium", 2: "Low", 1: "Low"}
+
 class ClassificationService:
     def __init__(self):
         self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
 
+    async def _classify_local(self, text: str) -> ClassifyResponse:
+        from app.services.inference_workers import run_inference
+        result = await run_inference("nlp", "classify_complaint", text)
+        return ClassifyResponse(
+            category=LOCAL_CATEGORY_MAP.get(result["category"], "Others"),
+            severity=LOCAL_SEVERITY_MAP.get(result["severity"], "Medium"),
+            confidence=max(0.0, min(float(result["confidence"]), 1.0)),
+            reasoning=f"Multilingual model: closest category '{result['category']}', "
+                      f"severity {result['severity']}/5 ({result['language']})"
+        )
+
     async def classify_complaint(self, text: str) -> ClassifyResponse:
+        if CLASSIFICATION_BACKEND == "local":
+            try:
+                return await self._classify_local(text)
+            except Exception as e:
+                logger.warning(f"Local classification failed, using LLM: {e}")
+
         prompt = f"""
         Analyze the following civic complaint and provide:
         1. Category (Roads, Water, Electricity, Sanitation, Traffic, Others)
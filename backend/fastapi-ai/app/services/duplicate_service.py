@@ -8,9 +8,10 @@ from typing import List, Dict, Any
 logger = logging.getLogger("ai-engine")
 
 class DuplicateService:
-    async def check_duplicate(self, text: str, lat: float, lon: float) -> DuplicateCheckResponse:
+    async def check_duplicate(self, text: str, lat: float, lon: float, complaint_id: str = None) -> DuplicateCheckResponse:
         # 1. Semantic Search via Vector DB
-        similar_complaints = await vector_store.search_similar(text, threshold=0.85, limit=5)
+        # One extra result in case the complaint's own vector is among them (a retried event stored it already)
+        similar_complaints = await vector_store.search_similar(text, threshold=0.85, limit=6 if complaint_id else 5)
         
         is_duplicate = False
         max_similarity = 0.0
@@ -20,6 +21,8 @@ class DuplicateService:
         # 2. Geo-Spatial Filter & Refinement
         for complaint in similar_complaints:
             comp_id = complaint.get('complaint_id')
+            if complaint_id is not None and comp_id == complaint_id:
+                continue
             comp_lat = complaint.get('latitude')
             comp_lon = complaint.get('longitude')
             
@@ -37,7 +40,7 @@ class DuplicateService:
                 "longitude": lon,
             }
             # Note: The actual workflow in main.py also triggers storage with the real ticket ID
-            await vector_store.store_complaint(text, str(uuid.uuid4()), metadata)
+            await vector_store.store_complaint(text, complaint_id or str(uuid.uuid4()), metadata)
 
         return DuplicateCheckResponse(
             is_duplicate=is_duplicate,
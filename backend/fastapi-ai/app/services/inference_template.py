@@ -0,0 +1,49 @@
+"""
+Inference Worker Template
+Imported only as the forkserver preload of the inference worker pool (see
+inference_workers). Importing it loads the served models into the forkserver
+process, which then forks every worker, so workers inherit one copy of the
+weights copy-on-write.
+
+The forkserver is a fresh interpreter, so no event-loop, ORT or OpenMP threads
+exist when it forks. Loading here is kept single-threaded for the same reason:
+torch and ONNX Runtime are pinned to one thread and tokenizer parallelism is
+off, so no thread pool is started before the fork. Workers set their own
+thread count after forking.
+"""
+
+import os
+import gc
+import logging
+from typing import Any, Dict
+
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+os.environ["ORT_INTRA_OP_THREADS"] = "1"
+os.environ["ORT_INTER_OP_THREADS"] = "1"
+
+import torch
+
+logger = logging.getLogger("ai-engine.inference-template")
+
+models: Dict[str, Any] = {}
+load_errors: Dict[str, str] = {}
+
+
+def _load_models():
+    from app.services.model_loader import get_model_loader, IS_PRODUCTION
+    from app.services.inference_workers import served_model_names
+    if IS_PRODUCTION:
+        return
+    loader = get_model_loader()
+    for name in served_model_names():
+        try:
+            models[name] = loader._build_model(name)
+        except Exception as e:
+            load_errors[name] = f"{type(e).__name__}: {e}"
+            logger.error(f"Inference template failed to load '{name}': {e}")
+    # Keep collections in the workers from writing to inherited object pages
+    gc.freeze()
+
+
+torch.set_num_threads(1)
+_load_models()
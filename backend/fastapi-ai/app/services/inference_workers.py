@@ -0,0 +1,393 @@
+"""
+Inference Worker Pool
+Runs model inference in N worker processes so throughput scales with cores
+instead of being serialised by the API process's GIL.
+
+Workers are created through a multiprocessing forkserver whose preload module
+(inference_template) loads the served models (INFERENCE_MODELS, default: the
+node's preload list). The forkserver is a fresh, single-threaded interpreter,
+so forking never happens in a process with live event-loop, ORT or OpenMP
+threads, whatever the API process has started by then. Every worker is forked
+from that template and inherits one copy of the weights copy-on-write; the API
+process does not preload the models the pool serves.
+
+The API process submits (model, method, args) jobs to the least-loaded
+worker's own job queue and awaits an asyncio future; per-worker collector
+threads resolve futures as results come back. Each worker reports the models
+it serves once it is up. Queues are per worker because a process killed while
+holding a shared queue's lock would wedge every other worker. A monitor thread
+restarts crashed workers (re-forked from the template, so a restart costs
+milliseconds) on fresh queues and fails the jobs sent to the dead worker.
+Workers are opt-in via INFERENCE_WORKERS; run_inference() is the entry point
+for callers and serves in-process when the pool does not serve a model.
+"""
+
+import os
+import sys
+import time
+import queue
+import asyncio
+import logging
+import threading
+import itertools
+from typing import Any, Dict, List, Optional
+
+import torch
+import torch.multiprocessing as mp
+
+logger = logging.getLogger("ai-engine.inference-workers")
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))  # 0 = in-process inference
+INFERENCE_WORKER_THREADS = int(os.getenv("INFERENCE_WORKER_THREADS", "1"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "1024"))
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "30"))
+HEARTBEAT_INTERVAL = 1.0
+IDLE_JOB = -1
+READY_JOB = -2  # worker start-up report on the results queue
+TEMPLATE_MODULE = "app.services.inference_template"
+
+
+def served_model_names() -> List[str]:
+    """INFERENCE_MODELS (comma-separated), or the node's preload list"""
+    from app.services.model_loader import MODEL_NAMES, _resolve_preload
+    names = [n.strip() for n in os.getenv("INFERENCE_MODELS", "").split(",") if n.strip()]
+    return [n for n in names if n in MODEL_NAMES] if names else _resolve_preload()
+
+
+class InferenceQueueFull(RuntimeError):
+    pass
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+def _worker_main(index: int, jobs, results, heartbeats, current_jobs, completed, threads: int):
+    # Forked from the forkserver, which already imported (and loaded) the template;
+    # never load models here, that would give every worker its own copy
+    template = sys.modules.get(TEMPLATE_MODULE)
+    models = template.models if template is not None else {}
+    errors = template.load_errors if template is not None else {"*": "inference template was not preloaded"}
+    torch.set_num_threads(threads)
+    results.put((READY_JOB, index, (sorted(models), dict(errors))))
+    while True:
+        heartbeats[index] = time.time()
+        try:
+            job = jobs.get(timeout=HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            continue
+        if job is None:
+            break
+
+        job_id, model_name, method, args, kwargs = job
+        current_jobs[index] = job_id
+        try:
+            model = models[model_name]
+            target = getattr(model, method) if method else model
+            with torch.inference_mode():
+                result = target(*args, **kwargs)
+            results.put((job_id, True, result))
+        except Exception as e:
+            results.put((job_id, False, f"{type(e).__name__}: {e}"))
+        current_jobs[index] = IDLE_JOB
+        completed[index] += 1
+
+
+class InferenceWorkerPool:
+    def __init__(self, models: List[str], num_workers: int = INFERENCE_WORKERS,
+                 threads_per_worker: int = INFERENCE_WORKER_THREADS,
+                 max_queue: int = INFERENCE_QUEUE_SIZE):
+        self.models = list(models)  # requested; `served` once the workers report
+        self.served: Optional[List[str]] = None
+        self.load_errors: Dict[str, str] = {}
+        self.num_workers = max(1, num_workers)
+        self.threads_per_worker = threads_per_worker
+        self.max_queue = max_queue
+        self.ctx = mp.get_context("forkserver")
+        self.ctx.set_forkserver_preload([TEMPLATE_MODULE])
+
+        self.job_queues: List[Optional[Any]] = [None] * self.num_workers
+        self.result_queues: List[Optional[Any]] = [None] * self.num_workers
+        self.outstanding = [0] * self.num_workers
+        self.heartbeats = self.ctx.Array("d", self.num_workers, lock=False)
+        self.current_jobs = self.ctx.Array("q", [IDLE_JOB] * self.num_workers, lock=False)
+        self.completed = self.ctx.Array("q", self.num_workers, lock=False)
+
+        self.workers: List[Optional[Any]] = [None] * self.num_workers
+        self.reported = [False] * self.num_workers
+        self.restarts = [0] * self.num_workers
+        self.stats = {"submitted": 0, "succeeded": 0, "failed": 0, "crashed": 0, "rejected": 0, "timed_out": 0}
+
+        self._job_ids = itertools.count()
+        self._pending: Dict[int, Any] = {}  # job id -> (loop, future, submitted_at, worker index)
+        self._lock = threading.Lock()
+        self._running = False
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """
+        Start the workers. Blocks while the forkserver loads the template
+        models, so call it off the event loop.
+        """
+        self._running = True
+        try:
+            for index in range(self.num_workers):
+                self._spawn(index)
+        except Exception:
+            self.stop()  # run_inference falls back to in-process serving
+            raise
+
+        targets = [(self._collect_results, (index,), f"inference-results-{index}") for index in range(self.num_workers)]
+        targets.append((self._monitor, (), "inference-monitor"))
+        for target, args, name in targets:
+            thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.num_workers} inference workers for: {', '.join(self.models)}")
+
+    @property
+    def ready(self) -> bool:
+        return self.served is not None and all(self.reported)
+
+    def serves(self, model_name: str) -> bool:
+        """Requested models count as served until the workers report what actually loaded"""
+        return model_name in (self.models if self.served is None else self.served)
+
+    def _spawn(self, index: int):
+        # Fresh queues: the previous worker may have died holding their locks
+        self.job_queues[index] = self.ctx.Queue()
+        self.result_queues[index] = self.ctx.Queue()
+        self.current_jobs[index] = IDLE_JOB
+        self.heartbeats[index] = time.time()
+        self.reported[index] = False
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(index, self.job_queues[index], self.result_queues[index], self.heartbeats,
+                  self.current_jobs, self.completed, self.threads_per_worker),
+            name=f"inference-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self.workers[index] = process
+
+    async def submit(self, model_name: str, method: Optional[str] = None, *args,
+                     timeout: float = INFERENCE_TIMEOUT_SECONDS, **kwargs) -> Any:
+        """
+        Run model(*args) or model.<method>(*args) on a worker and await the result
+        """
+        if not self.serves(model_name):
+            raise KeyError(f"Model '{model_name}' is not served by the worker pool")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if len(self._pending) >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise InferenceQueueFull(f"Inference queue full ({self.max_queue} jobs pending)")
+            job_id = next(self._job_ids)
+            index = min(range(self.num_workers), key=self.outstanding.__getitem__)
+            self._pending[job_id] = (loop, future, time.perf_counter(), index)
+            self.outstanding[index] += 1
+            self.stats["submitted"] += 1
+            # Under the lock so the monitor cannot swap this worker's queue in between
+            self.job_queues[index].put((job_id, model_name, method, args, kwargs))
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if self._pending.pop(job_id, None) is not None:
+                    self.outstanding[index] -= 1
+                self.stats["timed_out"] += 1
+            raise
+
+    def _resolve(self, job_id: int, ok: bool, payload: Any):
+        with self._lock:
+            entry = self._pending.pop(job_id, None)
+            if entry is None:
+                return  # timed out or already failed by the monitor
+            self.outstanding[entry[3]] -= 1
+            self.stats["succeeded" if ok else "failed"] += 1
+
+        loop, future, _, _ = entry
+
+        def settle():
+            if future.done():
+                return
+            if ok:
+                future.set_result(payload)
+            elif isinstance(payload, BaseException):
+                future.set_exception(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+        loop.call_soon_threadsafe(settle)
+
+    def _collect_results(self, index: int):
+        while self._running:
+            # Re-read each time: a restarted worker gets a new queue
+            results = self.result_queues[index]
+            try:
+                job_id, ok, payload = results.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                continue
+            if job_id == READY_JOB:
+                self._worker_ready(ok, *payload)
+                continue
+            self._resolve(job_id, ok, payload)
+
+    def _worker_ready(self, index: int, served: List[str], errors: Dict[str, str]):
+        if self.served is None:
+            self.served = served
+            self.load_errors = errors
+            missing = [name for name in self.models if name not in served]
+            if missing:
+                logger.warning(f"Inference workers could not load {missing}; serving them in-process: {errors}")
+        self.reported[index] = True
+
+    def _monitor(self):
+        while self._running:
+            time.sleep(HEARTBEAT_INTERVAL)
+            for index, process in enumerate(self.workers):
+                if not self._running or process is None or process.is_alive():
+                    continue
+
+                logger.error(f"Inference worker {index} (pid {process.pid}) exited with code {process.exitcode}; restarting")
+                with self._lock:
+                    # Everything queued on the dead worker goes with its queue
+                    lost = [job_id for job_id, entry in self._pending.items() if entry[3] == index]
+                    self.stats["crashed"] += len(lost)
+                    self.restarts[index] += 1
+                    self._spawn(index)
+                for job_id in lost:
+                    self._resolve(job_id, False, WorkerCrashed(f"Worker {index} crashed before finishing job {job_id}"))
+
+    def stop(self, timeout: float = 5.0):
+        if not self._running:
+            return
+        self._running = False
+        for jobs in self.job_queues:
+            if jobs is not None:
+                jobs.put(None)
+        for process in self.workers:
+            if process is not None:
+                process.join(timeout)
+                if process.is_alive():
+                    process.terminate()
+        for thread in self._threads:
+            thread.join(timeout)
+
+        with self._lock:
+            pending = list(self._pending)
+        for job_id in pending:
+            self._resolve(job_id, False, RuntimeError("Inference worker pool stopped"))
+        logger.info("Inference workers stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        workers = []
+        for index, process in enumerate(self.workers):
+            alive = process is not None and process.is_alive()
+            workers.append({
+                "index": index,
+                "pid": process.pid if process is not None else None,
+                "alive": alive,
+                "busy": self.current_jobs[index] != IDLE_JOB,
+                "heartbeat_age_s": round(now - self.heartbeats[index], 2),
+                "jobs_completed": self.completed[index],
+                "restarts": self.restarts[index],
+            })
+
+        with self._lock:
+            pending = len(self._pending)
+            stats = dict(self.stats)
+        try:
+            queued = sum(jobs.qsize() for jobs in self.job_queues if jobs is not None)
+        except NotImplementedError:  # macOS
+            queued = None
+
+        return {
+            "running": self._running,
+            "ready": self.ready,
+            "workers": workers,
+            "healthy_workers": sum(1 for w in workers if w["alive"]),
+            "queue_depth": queued,
+            "in_flight": pending,
+            "max_queue": self.max_queue,
+            "models": list(self.models),
+            "served": self.served,
+            "load_errors": self.load_errors,
+            **stats,
+        }
+
+
+_inference_pool: Optional[InferenceWorkerPool] = None
+
+
+def create_inference_workers(num_workers: int = INFERENCE_WORKERS) -> Optional[InferenceWorkerPool]:
+    """
+    Create (not start) the pool, so the API process knows which models not to
+    preload; no-op when disabled or there is nothing to serve
+    """
+    global _inference_pool
+    if num_workers <= 0:
+        return None
+    if _inference_pool is None:
+        models = served_model_names()
+        if not models:
+            return None
+        _inference_pool = InferenceWorkerPool(models, num_workers)
+    return _inference_pool
+
+
+def start_inference_workers() -> Optional[InferenceWorkerPool]:
+    """Start the created pool; blocks while the template loads, run it on a thread"""
+    pool = _inference_pool
+    if pool is not None and not pool._running:
+        pool.start()
+    return pool
+
+
+def stop_inference_workers():
+    global _inference_pool
+    if _inference_pool is not None:
+        _inference_pool.stop()
+        _inference_pool = None
+
+
+def get_inference_pool() -> Optional[InferenceWorkerPool]:
+    return _inference_pool
+
+
+def model_available(model_name: str) -> bool:
+    """Whether this node serves a model without a lazy load: on the workers, loaded or preloaded"""
+    from app.services.model_loader import get_model_loader
+    pool = _inference_pool
+    if pool is not None and pool._running and pool.serves(model_name):
+        return True
+    loader = get_model_loader()
+    return model_name in loader.models or model_name in loader.preload
+
+
+async def run_inference(model_name: str, method: Optional[str] = None, *args, **kwargs) -> Any:
+    """
+    Run inference on the worker pool when it serves the model, otherwise on a
+    thread in this process
+    """
+    pool = _inference_pool
+    if pool is not None and pool._running and pool.serves(model_name):
+        return await pool.submit(model_name, method, *args, **kwargs)
+
+    from app.services.model_loader import get_model_loader
+    model = await get_model_loader().get_model_async(model_name)
+    if model is None:
+        raise KeyError(f"Model '{model_name}' is not available")
+    target = getattr(model, method) if method else model
+
+    def call():
+        with torch.inference_mode():
+            return target(*args, **kwargs)
+
+    return await asyncio.to_thread(call)
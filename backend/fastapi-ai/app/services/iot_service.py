@@ -1,7 +1,17 @@
+import os
+import time
+import asyncio
 import logging
 from typing import Dict, Any, List
 from datetime import datetime
+import numpy as np
 from app.events.kafka_client import kafka_client
+from app.services.telemetry_aggregator import telemetry_aggregator
+from app.utils.telemetry_codecs import validate
+
+MAX_REPORTED_REJECTIONS = 100
+# How often rollup windows of sensors that stopped reporting are flushed
+ROLLUP_FLUSH_SECONDS = float(os.getenv("TELEMETRY_ROLLUP_FLUSH_SECONDS", "15"))
 
 logger = logging.getLogger("ai-engine")
 
@@ -11,7 +21,8 @@ class IoTIngestionService:
         Process incoming IoT sensor data.
         Types: water_level, air_quality, smart_meter
         """
-        timestamp = datetime.now().isoformat()
+        now = datetime.now()
+        timestamp = now.isoformat()
         telemetry_data = {
             "sensor_id": sensor_id,
             "type": sensor_type,
@@ -21,14 +32,100 @@ class IoTIngestionService:
             "timestamp": timestamp
         }
         
-        logger.info(f"Ingested {sensor_type} data from {sensor_id}: {value} {unit}")
+        logger.debug(f"Ingested {sensor_type} data from {sensor_id}: {value} {unit}")
         
-        # Emit to Kafka for real-time processing and risk analysis
-        await kafka_client.emit_event("sensor_telemetry", telemetry_data)
+        # Fold into rolling per-sensor state; only state changes, alerts and rollups go to Kafka.
+        # On a thread: the aggregator lock may be held by a bulk batch being folded
+        events, sensor_state = await asyncio.to_thread(
+            self._ingest_one, sensor_id, sensor_type, value, unit, location, now.timestamp(),
+        )
+        for topic, payload in events:
+            await kafka_client.emit_event(topic, payload)
         
-        return telemetry_data
+        return {
+            **telemetry_data,
+            "status": sensor_state["status"],
+            "anomaly_score": sensor_state["anomaly_score"],
+            "events_emitted": len(events)
+        }
+
+    @staticmethod
+    def _ingest_one(sensor_id: str, sensor_type: str, value: float, unit: str,
+                    location: Dict[str, float], ts: float):
+        events = telemetry_aggregator.ingest(sensor_id, sensor_type, value, unit, location, ts=ts)
+        return events, telemetry_aggregator.get_sensor(sensor_id)
+
+    async def process_telemetry_batch(self, batch: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        """
+        Process a decoded columnar batch (see app.utils.telemetry_codecs).
+        Rows are validated as a whole, grouped by sensor type and folded into
+        the aggregator in timestamp order on a worker thread, so a large batch
+        does not block the event loop; resulting events are forwarded as one
+        batched produce call per topic.
+        """
+        reasons, outgoing, by_type = await asyncio.to_thread(self._fold_batch, batch)
+        accepted = np.flatnonzero(reasons == None)  # noqa: E711 (elementwise on object array)
+        rejected = np.flatnonzero(reasons != None)  # noqa: E711
+
+        emitted = 0
+        for topic, records in outgoing.items():
+            emitted += await kafka_client.emit_batch(topic, records, key_func=lambda r: r["sensor_id"])
+
+        logger.info(f"Bulk ingest: {accepted.size} accepted, {rejected.size} rejected, {emitted} events emitted")
+        return {
+            "accepted": int(accepted.size),
+            "rejected": int(rejected.size),
+            "accepted_by_type": by_type,
+            "rejections": [
+                {"index": int(i), "reason": reasons[i]} for i in rejected[:MAX_REPORTED_REJECTIONS]
+            ],
+            "events_emitted": emitted,
+        }
+
+    @staticmethod
+    def _fold_batch(batch: Dict[str, np.ndarray]):
+        reasons = validate(batch)
+        accepted = np.flatnonzero(reasons == None)  # noqa: E711 (elementwise on object array)
+
+        outgoing: Dict[str, List[Dict[str, Any]]] = {}
+        by_type: Dict[str, int] = {}
+        sensor_types = batch["sensor_type"][accepted]
+        for sensor_type in np.unique(sensor_types):
+            rows = accepted[sensor_types == sensor_type]
+            rows = rows[np.argsort(batch["timestamp"][rows], kind="stable")]
+            by_type[sensor_type] = int(rows.size)
+            for i in rows:
+                events = telemetry_aggregator.ingest(
+                    batch["sensor_id"][i], sensor_type, batch["value"][i], batch["unit"][i],
+                    {"lat": float(batch["lat"][i]), "lng": float(batch["lng"][i])},
+                    ts=float(batch["timestamp"][i]),
+                )
+                for topic, payload in events:
+                    outgoing.setdefault(topic, []).append(payload)
+        return reasons, outgoing, by_type
+
+    async def run_rollup_flusher(self):
+        """Periodically emit rollups whose windows have ended, even if no reading arrives to close them."""
+        while True:
+            await asyncio.sleep(ROLLUP_FLUSH_SECONDS)
+            try:
+                outgoing: Dict[str, List[Dict[str, Any]]] = {}
+                expired = await asyncio.to_thread(telemetry_aggregator.flush_expired, time.time())
+                for topic, payload in expired:
+                    outgoing.setdefault(topic, []).append(payload)
+                for topic, records in outgoing.items():
+                    await kafka_client.emit_batch(topic, records, key_func=lambda r: r["sensor_id"])
+            except Exception as e:
+                logger.error(f"Rollup flush failed: {e}")
 
     async def get_active_sensors(self) -> List[Dict[str, Any]]:
+        live_sensors = await asyncio.to_thread(telemetry_aggregator.get_active_sensors)
+        if live_sensors:
+            return [
+                {"id": s["sensor_id"], "type": s["type"], "status": s["status"].lower(), "last_value": s["value"],
+                 "ewma": s["ewma"], "rate_per_hour": s["rate_per_hour"], "anomaly_score": s["anomaly_score"]}
+                for s in live_sensors
+            ]
         # Mocking active sensors for demonstration
         return [
             {"id": "WL-001", "type": "water_level", "status": "online", "last_value": 4.2},
@@ -1,11 +1,23 @@
 """
 Model Loader Service
 Handles loading and initialization of all AI/ML models
+
+Models are built lazily on the first get_model() call, each behind its own
+lock so concurrent first requests load a model once. Only the models in the
+node's preload list (DEPLOYMENT_ROLE / MODEL_PRELOAD) are loaded at startup,
+in parallel on a thread pool so the event loop keeps serving requests; the
+loader's state ("starting", "loading", "ready", "degraded") is what health
+checks report. With MODEL_MEMORY_BUDGET_MB set, the least recently used models
+that are not preloaded are unloaded whenever a new load pushes the total over
+budget.
 """
 
 import logging
 import asyncio
-from typing import Dict, Any, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 import os
 
 # Check if we're in production environment
@@ -27,6 +39,42 @@ else:
 
 logger = logging.getLogger("ai-engine.model-loader")
 
+MODEL_GROUPS = {
+    'nlp': ['nlp', 'text_embedding'],
+    'ml': ['complaint_classifier', 'eta_predictor', 'duplicate_detector'],
+    'vision': ['infrastructure_analyzer'],
+    'prediction': ['risk_predictor', 'resource_optimizer', 'predictive_maintenance'],
+}
+MODEL_NAMES = [name for names in MODEL_GROUPS.values() for name in names]
+
+# Models kept warm per deployment role; everything else loads on first use
+ROLE_PRELOAD = {
+    'all': MODEL_NAMES,
+    'nlp': MODEL_GROUPS['nlp'] + ['complaint_classifier', 'duplicate_detector'],
+    'vision': MODEL_GROUPS['vision'],
+    'prediction': MODEL_GROUPS['prediction'] + ['eta_predictor'],
+    'api': [],
+}
+DEPLOYMENT_ROLE = os.getenv("DEPLOYMENT_ROLE", "api")
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "")  # comma-separated, overrides the role list
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))  # 0 = unlimited
+MODEL_LOAD_WORKERS = int(os.getenv("MODEL_LOAD_WORKERS", "4"))
+
+
+def _resolve_preload() -> List[str]:
+    if MODEL_PRELOAD:
+        names = [n.strip() for n in MODEL_PRELOAD.split(",") if n.strip()]
+    else:
+        names = ROLE_PRELOAD.get(DEPLOYMENT_ROLE)
+        if names is None:
+            logger.warning(f"Unknown DEPLOYMENT_ROLE '{DEPLOYMENT_ROLE}', nothing preloaded")
+            names = []
+    unknown = [n for n in names if n not in MODEL_NAMES]
+    if unknown:
+        logger.warning(f"Ignoring unknown models in preload list: {unknown}")
+    return [n for n in names if n in MODEL_NAMES]
+
+
 class ModelLoader:
     """
     Centralized model loading and management service
@@ -36,155 +84,256 @@ class ModelLoader:
         self.models: Dict[str, Any] = {}
         self.is_loaded = False
         self.device = "cpu"  # Use CPU for production
+        self.backends: Dict[str, str] = {}
+        self.preload = _resolve_preload()
+        self.remote: List[str] = []  # served by inference workers; not preloaded in this process
+        self.memory_budget = int(MODEL_MEMORY_BUDGET_MB * 1024 * 1024)
+        self.model_sizes: Dict[str, int] = {}
+        self.last_used: Dict[str, float] = {}
+        self.load_seconds: Dict[str, float] = {}
+        self.state = "starting"
+        self.model_states: Dict[str, str] = {}  # name -> loading / ready / failed
+        self.load_errors: Dict[str, str] = {}
+        self._load_locks = {name: threading.Lock() for name in MODEL_NAMES}
+        self._budget_lock = threading.Lock()
         
         if IS_PRODUCTION:
             # Skip ML models in production
             self.is_loaded = True
+            self.state = "ready"
             logger.info("Production mode: ML models disabled")
             return
-            
+        
         # Development mode - load ML models
         import torch
         from pathlib import Path
         self.model_dir = Path("/app/models")  # Docker mount path
         self.device = "cpu"  # Use CPU for now
         
+        # Per-model inference backend, e.g. MODEL_BACKENDS="nlp=onnx-int8,complaint_classifier=onnx-int8"
+        from app.models.onnx_backend import parse_backends
+        self.backends = parse_backends(os.getenv("MODEL_BACKENDS", ""))
+    
     async def load_all_models(self) -> bool:
         """
-        Load all AI/ML models asynchronously
+        Load the models this node preloads; the rest load on first use
         """
         if IS_PRODUCTION:
             logger.info("Production mode: Skipping ML model loading")
             return True
-            
+        
         try:
             logger.info(f"Loading models on device: {self.device}")
-            
-            # Load NLP models
-            await self._load_nlp_models()
-            
-            # Load ML models
-            await self._load_ml_models()
-            
-            # Load vision models
-            await self._load_vision_models()
-            
-            # Load prediction models
-            await self._load_prediction_models()
-            
-            self.is_loaded = True
-            logger.info("All models loaded successfully")
-            return True
-            
+            preload = [name for name in self.preload if name not in self.remote]
+            logger.info(f"Role '{DEPLOYMENT_ROLE}' preloads: {', '.join(preload) or 'none'}"
+                        + (f" (inference workers serve: {', '.join(self.remote)})" if self.remote else ""))
+            self.state = "loading"
+            started = time.perf_counter()
+            
+            # Blocking construction / from_pretrained runs on worker threads, in parallel
+            loop = asyncio.get_running_loop()
+            workers = max(1, min(MODEL_LOAD_WORKERS, len(preload)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model-load") as pool:
+                results = await asyncio.gather(
+                    *(loop.run_in_executor(pool, self._load_model, name) for name in preload),
+                    return_exceptions=True
+                )
+            
+            failed = [name for name, result in zip(preload, results) if isinstance(result, Exception)]
+            self.is_loaded = not failed
+            self.state = "degraded" if failed else "ready"
+            logger.info(f"Preloaded models {self.state} in {time.perf_counter() - started:.2f}s"
+                        + (f" (failed: {', '.join(failed)})" if failed else ""))
+            return not failed
+        
         except Exception as e:
+            self.state = "degraded"
             logger.error(f"Failed to load models: {e}")
             return False
     
-    async def _load_nlp_models(self):
-        """Load NLP and text processing models"""
-        try:
-            logger.info("Loading NLP models...")
-            from app.models import MultilingualNLP, TextEmbedding
-            
-            # Initialize multilingual NLP
-            nlp_model = MultilingualNLP()
-            self.models['nlp'] = nlp_model
-            
-            # Initialize text embedding
-            text_embedding = TextEmbedding()
-            self.models['text_embedding'] = text_embedding
-            
-            logger.info("NLP models loaded")
-            
-        except Exception as e:
-            logger.error(f"Failed to load NLP models: {e}")
-            raise
+    def _build_model(self, name: str) -> Any:
+        """Construct one model by name"""
+        if name == 'nlp':
+            from app.models import MultilingualNLP
+            return MultilingualNLP(backend=self.backends.get('nlp', 'torch'))
+        if name == 'text_embedding':
+            from app.models import TextEmbedding
+            return TextEmbedding()
+        if name == 'complaint_classifier':
+            from app.models import ComplaintClassifier
+            return self._apply_backend(name, ComplaintClassifier().to(self.device).eval())
+        if name == 'eta_predictor':
+            from app.models import ETAPredictor
+            return ETAPredictor().to(self.device)
+        if name == 'duplicate_detector':
+            from app.models import DuplicateDetector
+            return DuplicateDetector().to(self.device)
+        if name == 'infrastructure_analyzer':
+            from app.models import InfrastructureAnalyzer
+            return self._apply_backend(name, InfrastructureAnalyzer().to(self.device).eval())
+        if name == 'risk_predictor':
+            from app.models import RiskPredictor
+            return RiskPredictor().to(self.device)
+        if name == 'resource_optimizer':
+            from app.models import ResourceOptimizer
+            return ResourceOptimizer()
+        if name == 'predictive_maintenance':
+            from app.models import PredictiveMaintenance
+            return PredictiveMaintenance()
+        raise KeyError(f"Unknown model '{name}'")
     
-    async def _load_ml_models(self):
-        """Load machine learning models"""
-        try:
-            logger.info("Loading ML models...")
-            from app.models import ComplaintClassifier, ETAPredictor, DuplicateDetector
-            
-            # Load complaint classifier
-            classifier = ComplaintClassifier().to(self.device)
-            self.models['complaint_classifier'] = classifier
-            
-            # Load ETA predictor
-            eta_predictor = ETAPredictor().to(self.device)
-            self.models['eta_predictor'] = eta_predictor
-            
-            # Load duplicate detector
-            duplicate_detector = DuplicateDetector().to(self.device)
-            self.models['duplicate_detector'] = duplicate_detector
-            
-            logger.info("ML models loaded")
-            
-        except Exception as e:
-            logger.error(f"Failed to load ML models: {e}")
-            raise
+    def _load_model(self, name: str) -> Any:
+        """Load a model once; concurrent callers wait on the model's lock"""
+        with self._load_locks[name]:
+            model = self.models.get(name)
+            if model is not None:
+                return model
+            
+            logger.info(f"Loading model '{name}'...")
+            self.model_states[name] = "loading"
+            started = time.perf_counter()
+            try:
+                model = self._build_model(name)
+            except Exception as e:
+                self.model_states[name] = "failed"
+                self.load_errors[name] = str(e)
+                raise
+            self.load_seconds[name] = round(time.perf_counter() - started, 3)
+            self.model_states[name] = "ready"
+            self.load_errors.pop(name, None)
+            self.model_sizes[name] = self._estimate_size(model)
+            self.last_used[name] = time.time()
+            self.models[name] = model
+            logger.info(f"Model '{name}' loaded in {self.load_seconds[name]}s "
+                        f"({self.model_sizes[name] / 1024 / 1024:.1f} MB)")
+        
+        self._enforce_memory_budget(keep=name)
+        return model
     
-    async def _load_vision_models(self):
-        """Load computer vision models"""
+    def _apply_backend(self, name: str, module: Any) -> Any:
+        """Swap a PyTorch module for its ONNX Runtime session when configured"""
+        backend = self.backends.get(name, 'torch')
+        if backend == 'torch':
+            return module
         try:
-            logger.info("Loading vision models...")
-            from app.models import InfrastructureAnalyzer
-            
-            # Load infrastructure analyzer
-            vision_model = InfrastructureAnalyzer().to(self.device)
-            self.models['infrastructure_analyzer'] = vision_model
-            
-            logger.info("Vision models loaded")
-            
+            from app.models.onnx_backend import load_backend
+            return load_backend(name, module, backend, str(self.model_dir))
         except Exception as e:
-            logger.error(f"Failed to load vision models: {e}")
-            raise
+            logger.warning(f"Failed to load {backend} backend for {name}, using PyTorch: {e}")
+            return module
     
-    async def _load_prediction_models(self):
-        """Load prediction and optimization models"""
-        try:
-            logger.info("Loading prediction models...")
-            from app.models import RiskPredictor, ResourceOptimizer, PredictiveMaintenance
-            
-            # Load risk predictor
-            risk_predictor = RiskPredictor().to(self.device)
-            self.models['risk_predictor'] = risk_predictor
-            
-            # Initialize resource optimizer
-            resource_optimizer = ResourceOptimizer()
-            self.models['resource_optimizer'] = resource_optimizer
-            
-            # Initialize predictive maintenance
-            predictive_maintenance = PredictiveMaintenance()
-            self.models['predictive_maintenance'] = predictive_maintenance
-            
-            logger.info("Prediction models loaded")
-            
-        except Exception as e:
-            logger.error(f"Failed to load prediction models: {e}")
-            raise
+    @staticmethod
+    def _estimate_size(model: Any) -> int:
+        """Bytes held by the tensors / ONNX graphs a model object owns"""
+        from app.models.onnx_backend import OrtModule
+        
+        def size_of(obj) -> int:
+            if isinstance(obj, torch.nn.Module):
+                tensors = list(obj.parameters()) + list(obj.buffers())
+                return sum(t.numel() * t.element_size() for t in tensors)
+            if isinstance(obj, OrtModule):
+                return os.path.getsize(obj.path)
+            return 0
+        
+        if isinstance(model, (torch.nn.Module, OrtModule)):
+            return size_of(model)
+        
+        # Wrappers such as MultilingualNLP: count the modules they hold (one level deep)
+        total = 0
+        for value in vars(model).values():
+            children = value.values() if isinstance(value, dict) else [value]
+            for child in children:
+                total += size_of(child) or size_of(getattr(child, 'model', None))
+        return total
+    
+    def _enforce_memory_budget(self, keep: str):
+        """Unload least recently used, non-preloaded models until under budget"""
+        if not self.memory_budget:
+            return
+        
+        with self._budget_lock:
+            used = sum(self.model_sizes.get(n, 0) for n in self.models)
+            if used <= self.memory_budget:
+                return
+            
+            victims = []
+            candidates = sorted(
+                (n for n in self.models if n != keep and n not in self.preload),
+                key=lambda n: self.last_used.get(n, 0.0)
+            )
+            for name in candidates:
+                if used <= self.memory_budget:
+                    break
+                victims.append(name)
+                used -= self.model_sizes.get(name, 0)
+        
+        if victims:
+            logger.info(f"Memory budget exceeded, unloading idle models: {victims}")
+            self.unload_models(victims)
+        if used > self.memory_budget:
+            logger.warning(f"Loaded models use {used / 1024 / 1024:.1f} MB, over the "
+                           f"{self.memory_budget / 1024 / 1024:.1f} MB budget")
     
     def get_model(self, model_name: str) -> Optional[Any]:
         """
-        Get a loaded model by name
+        Get a model by name, loading it on first use
         """
-        if not self.is_loaded:
-            logger.warning("Models not loaded yet")
-            return None
+        model = self.models.get(model_name)
         
-        return self.models.get(model_name)
+        if model is None:
+            if IS_PRODUCTION or model_name not in MODEL_NAMES:
+                return None
+            try:
+                model = self._load_model(model_name)
+            except Exception as e:
+                logger.error(f"Failed to load model '{model_name}': {e}")
+                return None
+        
+        self.last_used[model_name] = time.time()
+        return model
+    
+    async def get_model_async(self, model_name: str) -> Optional[Any]:
+        """
+        get_model for request handlers: a lazy load runs on a worker thread
+        instead of blocking the event loop
+        """
+        model = self.models.get(model_name)
+        if model is not None:
+            self.last_used[model_name] = time.time()
+            return model
+        return await asyncio.to_thread(self.get_model, model_name)
+    
+    def get_readiness(self) -> Dict[str, Any]:
+        """Startup progress for health checks"""
+        return {
+            'ready': self.state == "ready",
+            'state': self.state,
+            'loading': [n for n, s in self.model_states.items() if s == "loading"],
+            'failed': dict(self.load_errors),
+        }
     
     def get_model_status(self) -> Dict[str, Any]:
         """
         Get status of all loaded models
         """
+        used = sum(self.model_sizes.get(n, 0) for n in self.models)
         status = {
             'loaded': self.is_loaded,
+            'state': self.state,
             'device': str(self.device),
+            'backends': self.backends,
+            'role': DEPLOYMENT_ROLE,
+            'preload': self.preload,
+            'served_by_workers': self.remote,
+            'memory': {
+                'used_mb': round(used / 1024 / 1024, 1),
+                'budget_mb': round(self.memory_budget / 1024 / 1024, 1) if self.memory_budget else None,
+            },
+            'available': [n for n in MODEL_NAMES if n not in self.models],
             'models': {}
         }
         
-        for name, model in self.models.items():
+        for name, model in list(self.models.items()):
             try:
                 if hasattr(model, 'parameters'):
                     # PyTorch model
@@ -192,7 +341,7 @@ class ModelLoader:
                     status['models'][name] = {
                         'type': 'pytorch',
                         'parameters': param_count,
-                        'device': next(model.parameters()).device
+                        'device': str(next(model.parameters()).device)
                     }
                 else:
                     # Other model types
@@ -200,6 +349,13 @@ class ModelLoader:
                         'type': type(model).__name__,
                         'status': 'loaded'
                     }
+                if hasattr(model, 'get_stats'):
+                    status['models'][name]['stats'] = model.get_stats()
+                status['models'][name].update({
+                    'memory_mb': round(self.model_sizes.get(name, 0) / 1024 / 1024, 1),
+                    'load_seconds': self.load_seconds.get(name),
+                    'idle_seconds': round(time.time() - self.last_used.get(name, time.time()), 1),
+                })
             except Exception as e:
                 status['models'][name] = {
                     'type': type(model).__name__,
@@ -210,28 +366,31 @@ class ModelLoader:
     
     async def warm_up_models(self):
         """
-        Warm up models with dummy data to ensure they're ready
+        Warm up loaded models with dummy data to ensure they're ready
         """
         try:
             logger.info("Warming up models...")
             
-            # Warm up NLP models
-            nlp = self.get_model('nlp')
+            # Only models already in memory; warm-up must not trigger lazy loads
+            warm_ups = []
+            
+            nlp = self.models.get('nlp')
             if nlp:
-                await self._warm_up_nlp(nlp)
+                warm_ups.append(self._warm_up_nlp(nlp))
             
-            # Warm up ML models
-            classifier = self.get_model('complaint_classifier')
+            classifier = self.models.get('complaint_classifier')
             if classifier:
-                await self._warm_up_classifier(classifier)
+                warm_ups.append(self._warm_up_classifier(classifier))
             
-            # Warm up vision models
-            vision = self.get_model('infrastructure_analyzer')
+            vision = self.models.get('infrastructure_analyzer')
             if vision:
-                await self._warm_up_vision(vision)
+                warm_ups.append(self._warm_up_vision(vision))
             
-            logger.info("Model warm-up completed")
+            # Each warm-up runs its forward passes on a worker thread
+            await asyncio.gather(*warm_ups)
             
+            logger.info("Model warm-up completed")
+        
         except Exception as e:
             logger.error(f"Model warm-up failed: {e}")
     
@@ -239,11 +398,11 @@ class ModelLoader:
         """Warm up NLP models"""
         try:
             # Test language detection
-            nlp_model.detect_language("Hello world")
+            await asyncio.to_thread(nlp_model.detect_language, "Hello world")
             
             # Test classification
-            nlp_model.classify_complaint("There is a water leak")
-            
+            await asyncio.to_thread(nlp_model.classify_complaint, "There is a water leak")
+        
         except Exception as e:
             logger.error(f"NLP warm-up failed: {e}")
     
@@ -251,8 +410,7 @@ class ModelLoader:
         """Warm up ML classifier"""
         try:
             dummy_input = torch.randn(1, 768).to(self.device)
-            with torch.no_grad():
-                classifier(dummy_input)
+            await asyncio.to_thread(self._no_grad_forward, classifier, dummy_input)
         except Exception as e:
             logger.error(f"Classifier warm-up failed: {e}")
     
@@ -260,19 +418,33 @@ class ModelLoader:
         """Warm up vision models"""
         try:
             dummy_input = torch.randn(1, 3, 224, 224).to(self.device)
-            with torch.no_grad():
-                vision_model(dummy_input)
+            await asyncio.to_thread(self._no_grad_forward, vision_model, dummy_input)
         except Exception as e:
             logger.error(f"Vision model warm-up failed: {e}")
     
-    def unload_models(self):
+    @staticmethod
+    def _no_grad_forward(model, inputs):
+        with torch.no_grad():
+            return model(inputs)
+    
+    def unload_models(self, names: Optional[List[str]] = None):
         """
-        Unload all models to free memory
+        Unload models to free memory (all of them when no names are given)
         """
+        unload_all = names is None
+        names = list(self.models.keys()) if unload_all else names
+        
         try:
-            logger.info("Unloading models...")
-            
-            for name, model in self.models.items():
+            logger.info(f"Unloading models: {', '.join(names) or 'none'}")
+            
+            for name in names:
+                with self._load_locks.get(name, self._budget_lock):
+                    model = self.models.pop(name, None)
+                    self.model_sizes.pop(name, None)
+                    self.last_used.pop(name, None)
+                    self.model_states.pop(name, None)
+                if model is None:
+                    continue
                 try:
                     if hasattr(model, 'cpu'):
                         model.cpu()
@@ -286,11 +458,12 @@ class ModelLoader:
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
             
-            self.models.clear()
-            self.is_loaded = False
+            if unload_all:
+                self.is_loaded = False
+                self.state = "starting"
             
             logger.info("Models unloaded successfully")
-            
+        
         except Exception as e:
             logger.error(f"Failed to unload models: {e}")
 
@@ -0,0 +1,174 @@
+"""
+Geo-proximity index of field officers for dispatch.
+
+Officers' last reported positions are bucketed per department into a uniform
+lat/lon grid (OFFICER_GEO_CELL_DEG). A position update only moves the officer
+between two cell sets, and a nearest-officer query scans rings of cells
+outward from the complaint, stopping as soon as no unscanned cell can hold a
+closer officer. Queries touch a handful of cells, not the whole roster; once
+the rings have visited more cells than the department occupies (sparse areas,
+or high latitudes where cells narrow), the occupied cells are scanned instead.
+Positions and queries outside OFFICER_GEO_BOUNDS (the RL_GEO_BOUNDS service
+area by default) are rejected.
+
+Batch dispatch (many complaints at once) is solved as an assignment problem
+by batch_routing_service on top of these positions.
+"""
+import os
+import math
+import time
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.utils.geo_utils import calculate_haversine_distance
+
+logger = logging.getLogger("ai-engine.officer-geo")
+
+OFFICER_GEO_CELL_DEG = float(os.getenv("OFFICER_GEO_CELL_DEG", "0.01"))  # ~1.1 km
+OFFICER_GEO_MAX_RADIUS_KM = float(os.getenv("OFFICER_GEO_MAX_RADIUS_KM", "25"))
+OFFICER_GEO_TTL_SECONDS = float(os.getenv("OFFICER_GEO_TTL_SECONDS", "1800"))  # older positions are ignored
+# lat_min, lat_max, lon_min, lon_max
+OFFICER_GEO_BOUNDS = tuple(float(v) for v in
+                           os.getenv("OFFICER_GEO_BOUNDS", os.getenv("RL_GEO_BOUNDS", "6,38,68,98")).split(","))
+KM_PER_DEG = 111.195
+
+Cell = Tuple[int, int]
+
+
+class OfficerPosition:
+    __slots__ = ("department", "lat", "lon", "cell", "available", "updated_at")
+
+    def __init__(self, department: str, lat: float, lon: float, cell: Cell, available: bool, updated_at: float):
+        self.department = department
+        self.lat = lat
+        self.lon = lon
+        self.cell = cell
+        self.available = available
+        self.updated_at = updated_at
+
+
+class OfficerGeoIndex:
+    def __init__(self, cell_deg: float = OFFICER_GEO_CELL_DEG, max_radius_km: float = OFFICER_GEO_MAX_RADIUS_KM,
+                 ttl_seconds: float = OFFICER_GEO_TTL_SECONDS,
+                 bounds: Tuple[float, float, float, float] = OFFICER_GEO_BOUNDS):
+        self.cell_deg = cell_deg
+        self.lat_min, self.lat_max, self.lon_min, self.lon_max = bounds
+        self.max_radius_km = max_radius_km
+        self.ttl_seconds = ttl_seconds
+        self.positions: Dict[str, OfficerPosition] = {}
+        self.grids: Dict[str, Dict[Cell, Set[str]]] = {}  # department -> cell -> officer ids
+        self.stats = {"updates": 0, "queries": 0}
+
+    def in_bounds(self, lat: float, lon: float) -> bool:
+        return self.lat_min <= lat <= self.lat_max and self.lon_min <= lon <= self.lon_max
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def update(self, officer_id: str, department: str, lat: float, lon: float,
+               available: bool = True, timestamp: Optional[float] = None):
+        """Insert or move an officer; O(1)"""
+        if not self.in_bounds(lat, lon):
+            raise ValueError(f"Position ({lat}, {lon}) of officer {officer_id} is outside the service area")
+        cell = self._cell(lat, lon)
+        current = self.positions.get(officer_id)
+        if current is not None and (current.department != department or current.cell != cell):
+            self._unlink(officer_id, current)
+        if current is None or current.department != department or current.cell != cell:
+            self.grids.setdefault(department, {}).setdefault(cell, set()).add(officer_id)
+        self.positions[officer_id] = OfficerPosition(department, lat, lon, cell, available,
+                                                     timestamp if timestamp is not None else time.time())
+        self.stats["updates"] += 1
+
+    def remove(self, officer_id: str):
+        current = self.positions.pop(officer_id, None)
+        if current is not None:
+            self._unlink(officer_id, current)
+
+    def _unlink(self, officer_id: str, position: OfficerPosition):
+        grid = self.grids.get(position.department, {})
+        members = grid.get(position.cell)
+        if members is not None:
+            members.discard(officer_id)
+            if not members:
+                del grid[position.cell]
+
+    def _usable(self, position: OfficerPosition, now: float) -> bool:
+        return position.available and (self.ttl_seconds <= 0 or now - position.updated_at <= self.ttl_seconds)
+
+    def nearest(self, department: str, lat: float, lon: float, k: int = 1,
+                max_radius_km: Optional[float] = None, exclude: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Up to k available officers of the department nearest to (lat, lon), as
+        (officer_id, km) sorted by distance, within max_radius_km
+        """
+        self.stats["queries"] += 1
+        grid = self.grids.get(department)
+        if not grid or not self.in_bounds(lat, lon):
+            return []
+        max_radius_km = self.max_radius_km if max_radius_km is None else max_radius_km
+        now = time.time()
+        exclude = exclude or set()
+
+        # Every cell outside ring r is at least r * (smaller cell side) away; the
+        # east-west side shrinks with latitude, so take it at the far edge of the radius
+        edge_lat = min(abs(lat) + max_radius_km / KM_PER_DEG, 89.0)
+        cell_km = self.cell_deg * KM_PER_DEG * math.cos(math.radians(edge_lat))
+        max_ring = int(math.ceil(max_radius_km / cell_km)) + 1
+        ci, cj = self._cell(lat, lon)
+        found: List[Tuple[float, str]] = []
+        scanned = 0
+
+        def scan(members: Set[str]):
+            for officer_id in members:
+                position = self.positions[officer_id]
+                if officer_id in exclude or not self._usable(position, now):
+                    continue
+                km = calculate_haversine_distance((lat, lon), (position.lat, position.lon))
+                if km <= max_radius_km:
+                    found.append((km, officer_id))
+
+        visited = 0
+        for ring in range(max_ring + 1):
+            for cell in self._ring(ci, cj, ring):
+                visited += 1
+                members = grid.get(cell)
+                if not members:
+                    continue
+                scan(members)
+                scanned += 1
+            found.sort()
+            if len(found) >= k and found[k - 1][0] <= ring * cell_km:
+                break
+            # Every occupied cell of the department has been scanned
+            if scanned >= len(grid):
+                break
+            # Sparse rings (far from officers, or narrow cells at high latitude) already cost
+            # more than the occupied cells do: scan those directly so a query stays bounded
+            if visited > len(grid):
+                found.clear()
+                for members in grid.values():
+                    scan(members)
+                found.sort()
+                break
+        return [(officer_id, km) for km, officer_id in found[:k]]
+
+    @staticmethod
+    def _ring(ci: int, cj: int, ring: int):
+        if ring == 0:
+            yield ci, cj
+            return
+        for dj in range(-ring, ring + 1):
+            yield ci - ring, cj + dj
+            yield ci + ring, cj + dj
+        for di in range(-ring + 1, ring):
+            yield ci + di, cj - ring
+            yield ci + di, cj + ring
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "officers": len(self.positions),
+                "departments": {name: sum(len(m) for m in grid.values()) for name, grid in self.grids.items()},
+                "cell_deg": self.cell_deg}
+
+
+officer_geo = OfficerGeoIndex()
@@ -0,0 +1,282 @@
+"""
+Live officer load index for workload-aware routing.
+
+Every department keeps its officers ordered by open assignments, so the
+least-loaded officers are found in O(log n) instead of scanning a static
+workload table:
+
+- Redis sorted sets (`officer_load:<department>`, ZINCRBY / ZRANGE) when
+  reachable, shared by every consumer in the group;
+- otherwise an in-process min-heap per department with lazy invalidation.
+
+Loads move on complaint_processed (+1 for the assigned officer) and
+complaint_resolved (-1). Assignments are keyed by complaint_id, so the
+reservation taken right after routing, the consumed complaint_processed
+event and any redeliveries are counted once.
+
+In Redis each open assignment is its own key (`officer_load:assignment:<id>`)
+that expires after OFFICER_LOAD_ASSIGNMENT_TTL_SECONDS, so complaints that are
+never resolved do not pile up. reconcile() recomputes every department's
+sorted set from the live assignment keys, dropping expired ones from the
+loads; run_reconciliation() does that every OFFICER_LOAD_RECONCILE_SECONDS on
+one consumer at a time.
+
+After a Redis flush the sorted sets and assignment keys are gone together,
+so every officer restarts at zero open assignments and loads rebuild as
+complaint_processed events arrive. To restore them at once, re-emit
+complaint_processed for the complaints that are still open; assign() is
+idempotent per complaint, so doing so is safe.
+"""
+import asyncio
+import os
+import json
+import time
+import heapq
+import itertools
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.redis_client import redis_client
+
+logger = logging.getLogger("ai-engine.officer-load")
+
+LOAD_PREFIX = "officer_load"
+ASSIGNMENT_PREFIX = f"{LOAD_PREFIX}:assignment:"
+RECONCILE_LOCK_KEY = f"{LOAD_PREFIX}:reconcile-lock"
+OFFICER_CAPACITY = float(os.getenv("OFFICER_CAPACITY", "10"))  # open complaints at which an officer is saturated
+OFFICER_LOAD_MAX_ASSIGNMENTS = int(os.getenv("OFFICER_LOAD_MAX_ASSIGNMENTS", "200000"))
+OFFICER_LOAD_ASSIGNMENT_TTL_SECONDS = int(os.getenv("OFFICER_LOAD_ASSIGNMENT_TTL_SECONDS", str(30 * 24 * 3600)))
+OFFICER_LOAD_RECONCILE_SECONDS = float(os.getenv("OFFICER_LOAD_RECONCILE_SECONDS", "3600"))
+REDIS_RETRY_SECONDS = 30
+
+
+class _DepartmentHeap:
+    """Min-heap of (load, seq, officer); superseded entries are skipped when popped."""
+
+    def __init__(self):
+        self.loads: Dict[str, float] = {}
+        self._version: Dict[str, int] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+
+    def _push(self, officer: str, load: float):
+        seq = next(self._seq)
+        self.loads[officer] = load
+        self._version[officer] = seq
+        heapq.heappush(self._heap, (load, seq, officer))
+        # Bound the garbage left by lazy invalidation
+        if len(self._heap) > 4 * len(self.loads) + 64:
+            self._heap = [(l, self._version[o], o) for o, l in self.loads.items()]
+            heapq.heapify(self._heap)
+
+    def ensure(self, officer: str):
+        if officer not in self.loads:
+            self._push(officer, 0.0)
+
+    def add(self, officer: str, delta: float) -> float:
+        load = max(self.loads.get(officer, 0.0) + delta, 0.0)
+        self._push(officer, load)
+        return load
+
+    def smallest(self, k: int) -> List[Tuple[str, float]]:
+        """k least-loaded officers, O(k log n); ties go to the least recently changed"""
+        valid = []
+        while self._heap and len(valid) < k:
+            entry = heapq.heappop(self._heap)
+            if self._version.get(entry[2]) == entry[1]:
+                valid.append(entry)
+        for entry in valid:
+            heapq.heappush(self._heap, entry)
+        return [(officer, load) for load, _, officer in valid]
+
+
+class OfficerLoadIndex:
+    def __init__(self, capacity: float = OFFICER_CAPACITY, redis=redis_client):
+        self.capacity = capacity
+        self.redis = redis  # None keeps the index process-local
+        self._redis_down_until = 0.0
+        self._seeded = set()  # departments whose roster is already in Redis
+        self.departments: Dict[str, _DepartmentHeap] = {}
+        self.assignments: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()  # complaint_id -> (department, officer)
+        self.stats = {"assigned": 0, "released": 0, "duplicates_ignored": 0, "reconciled": 0}
+
+    @staticmethod
+    def _key(department: str) -> str:
+        return f"{LOAD_PREFIX}:{department}"
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.time() >= self._redis_down_until
+
+    def _redis_failed(self, e: Exception):
+        logger.warning(f"[OfficerLoad] Redis unavailable, using local index for {REDIS_RETRY_SECONDS}s: {e}")
+        self._redis_down_until = time.time() + REDIS_RETRY_SECONDS
+
+    def _heap(self, department: str) -> _DepartmentHeap:
+        heap = self.departments.get(department)
+        if heap is None:
+            heap = self.departments[department] = _DepartmentHeap()
+        return heap
+
+    def utilization(self, load: float) -> float:
+        """Load as a fraction of capacity in [0, 1], the RL state's workload feature"""
+        return min(max(load, 0.0) / self.capacity, 1.0) if self.capacity > 0 else 1.0
+
+    # Redis calls are blocking; the async methods below run these through asyncio.to_thread
+
+    def _least_loaded_redis(self, department: str, officers: List[str], k: int) -> List[Tuple[str, float]]:
+        key = self._key(department)
+        if officers and department not in self._seeded:
+            self.redis.zadd(key, {officer: 0 for officer in officers}, nx=True)
+            self._seeded.add(department)
+        return [(officer, max(score, 0.0)) for officer, score in self.redis.zrange(key, 0, k - 1, withscores=True)]
+
+    def _assign_redis(self, complaint_id: str, department: str, officer: str) -> bool:
+        if self.redis.set(ASSIGNMENT_PREFIX + complaint_id, json.dumps([department, officer]),
+                          nx=True, ex=OFFICER_LOAD_ASSIGNMENT_TTL_SECONDS):
+            self.redis.zincrby(self._key(department), 1, officer)
+            return True
+        return False
+
+    def _release_redis(self, complaint_id: str) -> bool:
+        key = ASSIGNMENT_PREFIX + complaint_id
+        raw = self.redis.get(key)
+        # DEL succeeds for exactly one caller, so a redelivered resolution cannot double-decrement
+        if raw and self.redis.delete(key):
+            department, officer = json.loads(raw)
+            self.redis.zincrby(self._key(department), -1, officer)
+            return True
+        return False
+
+    async def least_loaded(self, department: str, officers: Optional[List[str]] = None,
+                           k: int = 1) -> List[Tuple[str, float]]:
+        """
+        The k least-loaded officers of a department as (officer_id, open
+        assignments), lowest first. `officers` is the department roster; new
+        names join with zero load.
+        """
+        officers = officers or []
+        if self._redis_available():
+            try:
+                return await asyncio.to_thread(self._least_loaded_redis, department, officers, k)
+            except Exception as e:
+                self._redis_failed(e)
+
+        heap = self._heap(department)
+        for officer in officers:
+            heap.ensure(officer)
+        return heap.smallest(k)
+
+    async def loads(self, department: str, officers: List[str]) -> Dict[str, float]:
+        """Current open assignments of specific officers (unknown officers count as 0)"""
+        if not officers:
+            return {}
+        if self._redis_available():
+            try:
+                scores = await asyncio.to_thread(self.redis.zmscore, self._key(department), officers)
+                return {officer: max(score or 0.0, 0.0) for officer, score in zip(officers, scores)}
+            except Exception as e:
+                self._redis_failed(e)
+        heap = self._heap(department)
+        return {officer: heap.loads.get(officer, 0.0) for officer in officers}
+
+    async def assign(self, complaint_id: Optional[str], department: str, officer: Optional[str]) -> bool:
+        """Count an open assignment once per complaint; returns False for repeats"""
+        if not complaint_id or not officer:
+            return False
+        if self._redis_available():
+            try:
+                if await asyncio.to_thread(self._assign_redis, complaint_id, department, officer):
+                    self.stats["assigned"] += 1
+                    return True
+                self.stats["duplicates_ignored"] += 1
+                return False
+            except Exception as e:
+                self._redis_failed(e)
+
+        if complaint_id in self.assignments:
+            self.stats["duplicates_ignored"] += 1
+            return False
+        self.assignments[complaint_id] = (department, officer)
+        while len(self.assignments) > OFFICER_LOAD_MAX_ASSIGNMENTS:
+            self.assignments.popitem(last=False)
+        self._heap(department).add(officer, 1)
+        self.stats["assigned"] += 1
+        return True
+
+    async def release(self, complaint_id: Optional[str]) -> bool:
+        """Close the complaint's assignment; unknown or already released complaints are ignored"""
+        if not complaint_id:
+            return False
+        if self._redis_available():
+            try:
+                if await asyncio.to_thread(self._release_redis, complaint_id):
+                    self.stats["released"] += 1
+                    return True
+                return False
+            except Exception as e:
+                self._redis_failed(e)
+
+        assignment = self.assignments.pop(complaint_id, None)
+        if assignment is None:
+            return False
+        department, officer = assignment
+        self._heap(department).add(officer, -1)
+        self.stats["released"] += 1
+        return True
+
+    def _reconcile_redis(self) -> int:
+        counts: Dict[str, Dict[str, int]] = {}
+        for key in self.redis.scan_iter(match=ASSIGNMENT_PREFIX + "*", count=1000):
+            raw = self.redis.get(key)
+            if raw:
+                department, officer = json.loads(raw)
+                per_officer = counts.setdefault(department, {})
+                per_officer[officer] = per_officer.get(officer, 0) + 1
+
+        load_keys = [key for key in self.redis.scan_iter(match=f"{LOAD_PREFIX}:*", count=1000)
+                     if not key.startswith(ASSIGNMENT_PREFIX) and key != RECONCILE_LOCK_KEY]
+        departments = {key[len(LOAD_PREFIX) + 1:] for key in load_keys} | set(counts)
+        for department in departments:
+            key = self._key(department)
+            # Roster members stay in the set at zero; assignments made meanwhile are off until the next pass
+            loads = {officer: 0 for officer in self.redis.zrange(key, 0, -1)}
+            loads.update(counts.get(department, {}))
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.delete(key)
+            if loads:
+                pipe.zadd(key, loads)
+            pipe.execute()
+        return len(departments)
+
+    async def reconcile(self) -> bool:
+        """Recompute the Redis loads from the live (unexpired) assignment keys"""
+        if not self._redis_available():
+            return False
+        try:
+            departments = await asyncio.to_thread(self._reconcile_redis)
+        except Exception as e:
+            self._redis_failed(e)
+            return False
+        self.stats["reconciled"] += 1
+        logger.info(f"[OfficerLoad] Reconciled loads of {departments} departments from open assignments")
+        return True
+
+    async def run_reconciliation(self, interval: float = OFFICER_LOAD_RECONCILE_SECONDS):
+        """Reconcile periodically; the Redis lock lets one consumer per interval do it"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self._redis_available() and await asyncio.to_thread(
+                        self.redis.set, RECONCILE_LOCK_KEY, "1", nx=True, ex=max(int(interval) - 1, 1)):
+                    await self.reconcile()
+            except Exception as e:
+                self._redis_failed(e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "backend": "redis" if self._redis_available() else "local",
+                "capacity": self.capacity, "open_assignments_local": len(self.assignments),
+                "departments_local": {name: len(heap.loads) for name, heap in self.departments.items()}}
+
+
+officer_load = OfficerLoadIndex()
@@ -25,6 +25,12 @@ class PredictiveRiskEngine:
         
         return round(risk_score, 2)
 
+    async def calculate_flood_trend_risk(self, water_level: float, rate_per_hour: float,
+                                         predicted_rainfall: float, horizon_hours: float = 1.0) -> float:
+        """Flood risk (0-1) on the level projected `horizon_hours` ahead from its current trend"""
+        projected_level = water_level + max(0.0, rate_per_hour) * horizon_hours
+        return await self.calculate_flood_risk(projected_level, predicted_rainfall)
+
     async def detect_utility_clusters(self, smart_meter_events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Identify geographical clusters of power outages"""
         # Simple clustering logic
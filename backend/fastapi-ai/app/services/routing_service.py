@@ -1,9 +1,17 @@
+import os
 from typing import Dict, List, Optional
 from app.schemas import RouteResponse
 from app.rl import rl_agent, env
+from app.services.officer_load import officer_load
+from app.services.officer_geo import officer_geo
 import numpy as np
 
-# Mock departments data
+# Officers within this many open complaints of the least loaded stay eligible for the RL pick
+ROUTING_LOAD_SLACK = float(os.getenv("ROUTING_LOAD_SLACK", "1"))
+# Nearest officers checked for spare capacity before falling back to load-only routing
+ROUTING_GEO_CANDIDATES = int(os.getenv("ROUTING_GEO_CANDIDATES", "8"))
+
+# Mock departments data (rosters; live load comes from the officer load index)
 DEPARTMENTS = {
     "Road & Potholes": ["officer_1", "officer_2"],
     "Garbage & Sanitation": ["officer_3", "officer_4"],
@@ -12,41 +20,53 @@ DEPARTMENTS = {
     "Others": ["officer_9", "officer_10"]
 }
 
-officer_workload = {
-    "officer_1": 3, "officer_2": 5, "officer_3": 2,
-    "officer_4": 4, "officer_5": 1, "officer_6": 6,
-    "officer_7": 2, "officer_8": 3, "officer_9": 4, "officer_10": 1
+# Classifier categories -> department names
+DEPARTMENT_ALIASES = {
+    "Roads": "Road & Potholes",
+    "Sanitation": "Garbage & Sanitation",
+    "Water": "Water Supply",
 }
 
+def resolve_department(category: str) -> str:
+    department = DEPARTMENT_ALIASES.get(category, category)
+    return department if department in DEPARTMENTS else "Others"
+
+def priority_for(severity: str) -> str:
+    severity = (severity or "").capitalize()
+    if severity == "Critical":
+        return "Urgent"
+    if severity in ("High", "Low"):
+        return severity
+    return "Normal"
+
 class RoutingService:
     async def route_complaint(self, category: str, severity: str, lat: float = 0, lon: float = 0) -> RouteResponse:
-        # 1. Prepare RL state
-        # In production, workload would be fetched from DB
-        workload = 0.5 
-        state = env.get_state_vector(category, severity, workload, lat, lon)
+        department = resolve_department(category)
+
+        # 1. Prepare RL state from the live load of the department's least-loaded officers
+        candidates = await officer_load.least_loaded(department, DEPARTMENTS[department], k=3)
+        workload = officer_load.utilization(candidates[0][1]) if candidates else 0.5
+        state = env.get_state_vector(category, severity, workload, lat or 0, lon or 0)
         
         # 2. Get AI Recommended Action
         action = rl_agent.get_action(state)
         
         # 3. Map action to routing decision
-        officers = DEPARTMENTS.get(category, DEPARTMENTS["Others"])
-        
-        # Action 0, 1, 2 map to officer selection
-        if action < 3:
-            selected_idx = action % len(officers)
-            selected_officer = officers[selected_idx]
+        # Travel time dominates field work: take the nearest available officer with spare capacity
+        nearby = await self._nearest_with_capacity(department, lat, lon)
+        # Otherwise action 0, 1, 2 pick among the least-loaded officers (within ROUTING_LOAD_SLACK,
+        # so a fixed pick cannot pile onto one officer); escalation/merge still needs
+        # an officer, so it takes the least loaded
+        if nearby:
+            selected_officer = nearby
+        elif candidates:
+            eligible = [officer for officer, load in candidates if load <= candidates[0][1] + ROUTING_LOAD_SLACK]
+            selected_officer = eligible[min(action, len(eligible) - 1)] if action < 3 else eligible[0]
         else:
-            # Fallback to least workload if RL suggests escalation/merge but we need an officer
-            selected_officer = min(officers, key=lambda x: officer_workload.get(x, 0))
+            selected_officer = DEPARTMENTS[department][0]
 
         # Action 3 suggests potential escalation
-        priority = "Normal"
-        if action == 3 or severity == "Critical":
-            priority = "Urgent"
-        elif severity == "High":
-            priority = "High"
-        elif severity == "Low":
-            priority = "Low"
+        priority = "Urgent" if action == 3 else priority_for(severity)
 
         return RouteResponse(
             department=category,
@@ -54,4 +74,16 @@ class RoutingService:
             priority=priority
         )
 
+    async def _nearest_with_capacity(self, department: str, lat: float, lon: float) -> Optional[str]:
+        if not lat or not lon or not officer_geo.in_bounds(lat, lon):
+            return None
+        nearby = officer_geo.nearest(department, lat, lon, k=ROUTING_GEO_CANDIDATES)
+        if not nearby:
+            return None
+        loads = await officer_load.loads(department, [officer for officer, _ in nearby])
+        for officer, _ in nearby:
+            if loads[officer] < officer_load.capacity:
+                return officer
+        return None
+
 routing_service = RoutingService()
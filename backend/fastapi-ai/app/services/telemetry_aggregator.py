@@ -0,0 +1,326 @@
+"""
+Streaming Telemetry Aggregator
+Per-sensor ring buffers, rolling statistics, downsampling and incremental
+anomaly scoring for IoT readings.
+
+Raw readings stay in-process. Only three kinds of events leave this stage:
+  - state changes (NORMAL -> WARNING -> CRITICAL and back)  -> sensor_telemetry
+  - alerts (critical levels or statistical anomalies)        -> sensor_telemetry
+  - 1-minute and 15-minute rollups                           -> sensor_rollup
+
+A rollup is emitted once its window has ended. Expired windows are flushed
+for every sensor whenever any sensor's reading moves time past them, and by a
+periodic sweep (iot_service.run_rollup_flusher), so a sensor that goes quiet
+still has its last windows closed.
+
+The aggregator is thread-safe: bulk batches are folded on a worker thread
+while single readings and reads arrive from other threads.
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("ai-engine.telemetry")
+
+RING_BUFFER_SIZE = int(os.getenv("TELEMETRY_RING_BUFFER_SIZE", "256"))
+ROLLUP_WINDOWS = (60, 900)  # 1-minute and 15-minute rollups
+# Time after a window ends before it is flushed, so slightly late readings still land in it
+ROLLUP_GRACE_SECONDS = float(os.getenv("TELEMETRY_ROLLUP_GRACE_SECONDS", "30"))
+EWMA_ALPHA = 0.2
+ANOMALY_Z_WARNING = 3.0
+ANOMALY_Z_ALERT = 5.0
+ALERT_COOLDOWN_SECONDS = 300
+MIN_SAMPLES_FOR_ANOMALY = 10
+MIN_RELATIVE_STD = 0.02  # std floor (fraction of the mean) so near-constant signals don't flag noise
+CLEAR_AFTER_READINGS = 5  # consecutive calmer readings before a status is lowered
+TREND_MIN_SPAN_SECONDS = 300  # buffer must cover this much time before its slope is trusted
+
+STATE_TOPIC = "sensor_telemetry"
+ROLLUP_TOPIC = "sensor_rollup"
+
+# Absolute thresholds per sensor type (value units as reported by the sensor)
+SENSOR_THRESHOLDS = {
+    "water_level": {"warning": 3.0, "critical": 4.5, "rate_per_hour": 0.5},  # metres, metres/hour
+    "air_quality": {"warning": 150.0, "critical": 300.0, "rate_per_hour": 100.0},  # AQI
+    "smart_meter": {"warning": 8.0, "critical": 12.0, "rate_per_hour": 6.0},  # kW
+}
+
+STATUS_LEVELS = {"NORMAL": 0, "WARNING": 1, "CRITICAL": 2}
+
+
+class RollupBucket:
+    __slots__ = ("start", "count", "total", "minimum", "maximum", "first", "last")
+
+    def __init__(self, start: float, value: float):
+        self.start = start
+        self.count = 1
+        self.total = value
+        self.minimum = value
+        self.maximum = value
+        self.first = value
+        self.last = value
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.last = value
+
+    def to_dict(self, window: int) -> Dict[str, Any]:
+        return {
+            "window_seconds": window,
+            "start": self.start,
+            "count": self.count,
+            "mean": round(self.total / self.count, 4),
+            "min": self.minimum,
+            "max": self.maximum,
+            "first": self.first,
+            "last": self.last,
+        }
+
+
+class SensorState:
+    """Fixed-size ring buffer plus incremental statistics for one sensor."""
+
+    def __init__(self, sensor_id: str, sensor_type: str, capacity: int = RING_BUFFER_SIZE):
+        self.sensor_id = sensor_id
+        self.sensor_type = sensor_type
+        self.values = np.zeros(capacity, dtype=np.float32)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+
+        self.ewma: Optional[float] = None
+        self.ewvar = 0.0
+        self.rate_per_second = 0.0  # trend over the ring buffer
+        self.last_value: Optional[float] = None
+        self.last_time: Optional[float] = None
+
+        self.status = "NORMAL"
+        self.calm_readings = 0
+        self.anomaly_score = 0.0
+        self.last_alert_at = 0.0
+        self.location: Dict[str, float] = {}
+        self.unit = ""
+        self.rollups: Dict[int, RollupBucket] = {}
+
+    def push(self, value: float, ts: float):
+        self.values[self.head] = value
+        self.times[self.head] = ts
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def window(self) -> np.ndarray:
+        return self.values if self.count == self.capacity else self.values[:self.count]
+
+    def _trend_slope(self) -> float:
+        """Least-squares slope (units/second) over the readings in the ring buffer."""
+        t = self.times[:self.count] if self.count < self.capacity else self.times
+        if self.count < 2 or t.max() - t.min() < TREND_MIN_SPAN_SECONDS:
+            return 0.0
+        v = self.window()
+        t_centered = t - t.mean()
+        denom = float(np.dot(t_centered, t_centered))
+        return float(np.dot(t_centered, v - v.mean()) / denom) if denom > 0 else 0.0
+
+    def update_stats(self, value: float, ts: float) -> float:
+        """Update EWMA / EW variance / rate of change and return the z-score of `value`."""
+        if self.ewma is None:
+            self.ewma = value
+            z = 0.0
+        else:
+            std = max(math.sqrt(self.ewvar), abs(self.ewma) * MIN_RELATIVE_STD, 1e-6)
+            z = abs(value - self.ewma) / std
+            diff = value - self.ewma
+            self.ewma += EWMA_ALPHA * diff
+            self.ewvar = (1 - EWMA_ALPHA) * (self.ewvar + EWMA_ALPHA * diff * diff)
+
+        self.rate_per_second = self._trend_slope()
+
+        self.last_value = value
+        self.last_time = ts
+        return z
+
+    def snapshot(self) -> Dict[str, Any]:
+        window = self.window()
+        return {
+            "sensor_id": self.sensor_id,
+            "type": self.sensor_type,
+            "value": self.last_value,
+            "unit": self.unit,
+            "ewma": round(self.ewma, 4) if self.ewma is not None else None,
+            "min": float(window.min()) if self.count else None,
+            "max": float(window.max()) if self.count else None,
+            "rate_per_hour": round(self.rate_per_second * 3600, 4),
+            "anomaly_score": round(self.anomaly_score, 4),
+            "status": self.status,
+            "samples": self.count,
+            "location": self.location,
+            "timestamp": self.last_time,
+        }
+
+
+class TelemetryAggregator:
+    def __init__(self):
+        self.sensors: Dict[str, SensorState] = {}
+        self.stats = {"readings_in": 0, "events_out": 0, "rollups_out": 0}
+        self.watermark = 0.0  # latest reading time seen from any sensor
+        self.next_expiry = math.inf  # earliest end of an open rollup window (may be early, never late)
+        self._lock = threading.RLock()
+
+    def _classify(self, state: SensorState, z: float) -> str:
+        thresholds = SENSOR_THRESHOLDS.get(state.sensor_type)
+        level = "NORMAL"
+        if thresholds:
+            value = state.last_value
+            rising_fast = state.rate_per_second * 3600 >= thresholds["rate_per_hour"]
+            if value >= thresholds["critical"]:
+                level = "CRITICAL"
+            elif value >= thresholds["warning"] or rising_fast:
+                level = "WARNING"
+        if state.count >= MIN_SAMPLES_FOR_ANOMALY and z >= ANOMALY_Z_WARNING and level == "NORMAL":
+            level = "WARNING"
+        return level
+
+    @staticmethod
+    def _rollup_event(state: SensorState, window: int, bucket: RollupBucket) -> Tuple[str, Dict[str, Any]]:
+        return (ROLLUP_TOPIC, {
+            "sensor_id": state.sensor_id,
+            "type": state.sensor_type,
+            "unit": state.unit,
+            "location": state.location,
+            **bucket.to_dict(window),
+        })
+
+    def _roll(self, state: SensorState, value: float, ts: float) -> List[Tuple[str, Dict[str, Any]]]:
+        closed = []
+        for window in ROLLUP_WINDOWS:
+            start = math.floor(ts / window) * window
+            bucket = state.rollups.get(window)
+            if bucket is None or start > bucket.start:
+                if bucket is not None:
+                    closed.append(self._rollup_event(state, window, bucket))
+                state.rollups[window] = RollupBucket(start, value)
+                self.next_expiry = min(self.next_expiry, start + window)
+            else:
+                bucket.add(value)
+        return closed
+
+    def flush_expired(self, now: float) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Close every sensor's rollup windows that ended at least ROLLUP_GRACE_SECONDS
+        before `now` and return their (topic, payload) events.
+        A later reading for a flushed sensor opens a new window.
+        """
+        with self._lock:
+            return self._flush_expired(now)
+
+    def _flush_expired(self, now: float) -> List[Tuple[str, Dict[str, Any]]]:
+        cutoff = now - ROLLUP_GRACE_SECONDS
+        if cutoff < self.next_expiry:
+            return []
+        closed = []
+        next_expiry = math.inf
+        for state in self.sensors.values():
+            for window, bucket in list(state.rollups.items()):
+                end = bucket.start + window
+                if end <= cutoff:
+                    closed.append(self._rollup_event(state, window, bucket))
+                    del state.rollups[window]
+                else:
+                    next_expiry = min(next_expiry, end)
+        self.next_expiry = next_expiry
+        self.stats["rollups_out"] += len(closed)
+        return closed
+
+    def ingest(self, sensor_id: str, sensor_type: str, value: float, unit: str = "",
+               location: Dict[str, float] = None, ts: float = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Fold one reading into the sensor's state.
+        Returns the (topic, payload) events that should be sent downstream — usually none.
+        """
+        with self._lock:
+            return self._ingest(sensor_id, sensor_type, value, unit, location, ts)
+
+    def _ingest(self, sensor_id: str, sensor_type: str, value: float, unit: str,
+                location: Optional[Dict[str, float]], ts: Optional[float]) -> List[Tuple[str, Dict[str, Any]]]:
+        ts = time.time() if ts is None else ts
+        value = float(value)
+        self.stats["readings_in"] += 1
+
+        state = self.sensors.get(sensor_id)
+        if state is None:
+            state = self.sensors[sensor_id] = SensorState(sensor_id, sensor_type)
+        state.unit = unit or state.unit
+        state.location = location or state.location
+
+        events = self._roll(state, value, ts)
+        self.stats["rollups_out"] += len(events)
+        # Any sensor's reading advances time for all of them: close windows of quiet sensors too.
+        # Capped near the server clock so one reading with a bogus future timestamp cannot
+        # push it ahead for good and flush every open window on each later reading
+        self.watermark = max(self.watermark, min(ts, time.time() + ROLLUP_GRACE_SECONDS))
+        events += self._flush_expired(self.watermark)
+
+        state.push(value, ts)
+        z = state.update_stats(value, ts)
+        # Map z-score onto 0-1 so downstream consumers don't need the raw statistic
+        state.anomaly_score = 1.0 - math.exp(-z / ANOMALY_Z_WARNING) if state.count >= MIN_SAMPLES_FOR_ANOMALY else 0.0
+
+        new_status = self._classify(state, z)
+        # Escalate immediately, de-escalate only after a run of calmer readings (hysteresis)
+        if STATUS_LEVELS[new_status] < STATUS_LEVELS[state.status]:
+            state.calm_readings += 1
+            if state.calm_readings < CLEAR_AFTER_READINGS:
+                new_status = state.status
+        else:
+            state.calm_readings = 0
+        if new_status != state.status:
+            previous = state.status
+            state.status = new_status
+            events.append((STATE_TOPIC, {**state.snapshot(), "kind": "state_change", "previous_status": previous}))
+
+        is_anomaly = state.count >= MIN_SAMPLES_FOR_ANOMALY and z >= ANOMALY_Z_ALERT
+        if (new_status == "CRITICAL" or is_anomaly) and ts - state.last_alert_at >= ALERT_COOLDOWN_SECONDS:
+            state.last_alert_at = ts
+            events.append((STATE_TOPIC, {
+                **state.snapshot(),
+                "kind": "alert",
+                "reason": "CRITICAL_LEVEL" if new_status == "CRITICAL" else "ANOMALY",
+                "z_score": round(z, 2),
+            }))
+
+        self.stats["events_out"] += sum(1 for topic, _ in events if topic == STATE_TOPIC)
+        return events
+
+    def get_sensor(self, sensor_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self.sensors.get(sensor_id)
+            return state.snapshot() if state else None
+
+    def get_active_sensors(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [state.snapshot() for state in self.sensors.values()]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            sensors = len(self.sensors)
+        readings = stats["readings_in"]
+        emitted = stats["events_out"] + stats["rollups_out"]
+        return {
+            **stats,
+            "sensors": sensors,
+            "reduction_ratio": round(readings / emitted, 1) if emitted else None,
+        }
+
+
+telemetry_aggregator = TelemetryAggregator()
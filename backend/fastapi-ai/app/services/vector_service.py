@@ -1,6 +1,7 @@
 import os
 import weaviate
 import weaviate.classes as wvc
+from weaviate.util import generate_uuid5
 import logging
 from typing import List, Dict, Any, Optional
 
@@ -65,16 +66,34 @@ class VectorStoreService:
         except Exception as e:
             logger.error(f"Error creating Weaviate collection: {e}")
 
+    async def _local_vector(self, text: str) -> Optional[List[float]]:
+        """Without an OpenAI vectorizer, embed with the multilingual model when this node serves it"""
+        if OPENAI_API_KEY:
+            return None
+        from app.services.inference_workers import model_available, run_inference
+        if not model_available("nlp"):
+            return None
+        try:
+            return (await run_inference("nlp", "get_embeddings", [text]))[0].tolist()
+        except Exception as e:
+            logger.warning(f"Local embedding failed: {e}")
+            return None
+
     async def store_complaint(self, text: str, complaint_id: str, metadata: Dict[str, Any]):
         if not self.client:
             return False
         try:
             collection = self.client.collections.get("Complaint")
+            # Deterministic object id so a redelivered complaint never stores a second vector
+            object_id = generate_uuid5(complaint_id)
+            if collection.data.exists(object_id):
+                return True
+            vector = await self._local_vector(text)
             collection.data.insert({
                 "text": text,
                 "complaint_id": complaint_id,
                 **{k: v for k, v in metadata.items() if k in ("department", "severity", "latitude", "longitude")},
-            })
+            }, uuid=object_id, vector=vector)
             return True
         except Exception as e:
             logger.error(f"Error storing vector: {e}")
@@ -85,12 +104,19 @@ class VectorStoreService:
             return []
         try:
             collection = self.client.collections.get("Complaint")
-            results = collection.query.near_text(
-                query=text,
-                certainty=threshold,
-                limit=limit,
-                return_properties=["complaint_id", "text", "department", "severity"],
-            )
+            properties = ["complaint_id", "text", "department", "severity"]
+            vector = await self._local_vector(text)
+            if vector is not None:
+                results = collection.query.near_vector(
+                    near_vector=vector, certainty=threshold, limit=limit, return_properties=properties,
+                )
+            else:
+                results = collection.query.near_text(
+                    query=text,
+                    certainty=threshold,
+                    limit=limit,
+                    return_properties=properties,
+                )
             return [obj.properties for obj in results.objects]
         except Exception as e:
             logger.error(f"Error searching vector: {e}")
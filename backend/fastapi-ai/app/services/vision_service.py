@@ -1,5 +1,6 @@
+import time
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
 import random
 
 logger = logging.getLogger("ai-engine")
@@ -55,4 +56,45 @@ class InfrastructureVisionService:
             
         return detections
 
+    async def analyze_frames(self, source_type: str, image_urls: List[str], location: Dict[str, float]):
+        """
+        Run a burst of frames through the batched vision pipeline and emit a
+        vision_event for each detection
+        """
+        from app.pipelines.vision_pipeline import vision_pipeline
+
+        logger.info(f"Analyzing {len(image_urls)} {source_type} frames")
+        results = await vision_pipeline.analyze_many(image_urls)
+
+        detections = []
+        for image_url, result in zip(image_urls, results):
+            if "error" in result:
+                continue
+            for issue in ("pothole", "streetlight", "water_leak"):
+                if result[f"{issue}_detected"]:
+                    detections.append({
+                        "type": issue.upper(),
+                        "confidence": round(result[f"{issue}_confidence"], 3),
+                        "severity": result["severity"],
+                        "coordinates": location,
+                        "image_url": image_url
+                    })
+
+        if detections:
+            from app.events.kafka_client import kafka_client
+            timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            for detection in detections:
+                await kafka_client.emit_event("vision_event", {
+                    "source": source_type,
+                    "detection": detection,
+                    "image_url": detection["image_url"],
+                    "timestamp": timestamp
+                })
+
+        return {
+            "frames": results,
+            "detections": detections,
+            "pipeline": vision_pipeline.get_stats()
+        }
+
 infrastructure_vision_service = InfrastructureVisionService()
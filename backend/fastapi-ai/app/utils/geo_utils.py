@@ -1,4 +1,5 @@
 import math
+import numpy as np
 from typing import Tuple
 
 def calculate_haversine_distance(coord1: Tuple[float, float], coord2: Tuple[float, float]) -> float:
@@ -23,3 +24,10 @@ def calculate_haversine_distance(coord1: Tuple[float, float], coord2: Tuple[floa
 
 def is_within_radius(coord1: Tuple[float, float], coord2: Tuple[float, float], radius_km: float = 0.5) -> bool:
     return calculate_haversine_distance(coord1, coord2) <= radius_km
+
+def haversine_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise great-circle km between (N, 2) and (M, 2) arrays of radians"""
+    dlat = b[None, :, 0] - a[:, None, 0]
+    dlon = b[None, :, 1] - a[:, None, 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[:, None, 0]) * np.cos(b[None, :, 0]) * np.sin(dlon / 2) ** 2
+    return 2 * 6371 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
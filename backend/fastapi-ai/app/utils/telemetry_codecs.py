@@ -0,0 +1,214 @@
+"""
+Telemetry batch decoding and vectorized validation for bulk IoT ingest.
+
+Every supported wire format is normalised into one columnar batch
+(dict of equal-length NumPy arrays) so validation runs as array masks
+instead of per-reading Python checks.
+
+Supported Content-Types:
+  - application/x-ndjson               one JSON reading per line
+  - application/json                   list of readings, or {column: [values]}
+  - application/msgpack                same shapes as JSON   (requires msgpack)
+  - application/vnd.apache.arrow.stream Arrow IPC stream     (requires pyarrow)
+
+Reading fields: sensor_id, sensor_type (or type), value, unit, lat, lng,
+timestamp (epoch seconds/ms or ISO-8601, optional; must lie within
+TELEMETRY_MAX_READING_AGE_SECONDS in the past and TELEMETRY_MAX_CLOCK_SKEW_SECONDS
+in the future). Columnar payloads must give every column the same length, and
+a batch holds at most TELEMETRY_MAX_BATCH_ROWS readings.
+"""
+import os
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+# Decoding runs on a worker thread, but JSON/msgpack parsing holds the GIL for the
+# whole body (~2 ms per 1k rows), so the cap also bounds the event loop's stall
+TELEMETRY_MAX_BATCH_ROWS = int(os.getenv("TELEMETRY_MAX_BATCH_ROWS", "20000"))
+# Accepted reading timestamps relative to the server clock
+TELEMETRY_MAX_CLOCK_SKEW_SECONDS = float(os.getenv("TELEMETRY_MAX_CLOCK_SKEW_SECONDS", "300"))
+TELEMETRY_MAX_READING_AGE_SECONDS = float(os.getenv("TELEMETRY_MAX_READING_AGE_SECONDS", "86400"))
+
+STRING_COLUMNS = ("sensor_id", "sensor_type", "unit")
+FLOAT_COLUMNS = ("value", "lat", "lng", "timestamp")
+COLUMN_ALIASES = {"type": "sensor_type", "latitude": "lat", "longitude": "lng", "lon": "lng"}
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+ARROW_TYPES = ("application/vnd.apache.arrow.stream", "application/vnd.apache.arrow.file")
+
+
+class UnsupportedFormatError(ValueError):
+    pass
+
+
+class BatchTooLargeError(ValueError):
+    pass
+
+
+def _check_rows(n: int):
+    if n > TELEMETRY_MAX_BATCH_ROWS:
+        raise BatchTooLargeError(f"Batch has {n} readings, the limit is {TELEMETRY_MAX_BATCH_ROWS}")
+
+
+def _rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, list]:
+    columns: Dict[str, list] = {name: [] for name in STRING_COLUMNS + FLOAT_COLUMNS}
+    for row in rows:
+        row = row if isinstance(row, dict) else {}
+        location = row.get("location") or {}
+        for name in STRING_COLUMNS + FLOAT_COLUMNS:
+            value = row.get(name)
+            if value is None:
+                for alias, target in COLUMN_ALIASES.items():
+                    if target == name and alias in row:
+                        value = row[alias]
+                        break
+            if value is None and name in ("lat", "lng"):
+                value = location.get(name)
+            columns[name].append(value)
+    return columns
+
+
+def _normalize_columns(raw: Dict[str, Any]) -> Dict[str, list]:
+    return {COLUMN_ALIASES.get(k, k): v for k, v in raw.items()}
+
+
+def _parse_timestamps(raw: list) -> np.ndarray:
+    try:
+        ts = np.asarray(raw, dtype=np.float64)
+    except (TypeError, ValueError):
+        ts = np.array([_parse_one_timestamp(v) for v in raw], dtype=np.float64)
+    # Millisecond epochs -> seconds
+    return np.where(ts > 1e11, ts / 1000.0, ts)
+
+
+def _parse_one_timestamp(value: Any) -> float:
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        try:
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return np.nan
+
+
+def _to_float_array(raw: list) -> np.ndarray:
+    try:
+        return np.asarray(raw, dtype=np.float64)
+    except (TypeError, ValueError):
+        out = np.empty(len(raw), dtype=np.float64)
+        for i, v in enumerate(raw):
+            try:
+                out[i] = float(v)
+            except (TypeError, ValueError):
+                out[i] = np.nan
+        return out
+
+
+def to_batch(columns: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Coerce raw columns into typed NumPy arrays (missing numerics become NaN)."""
+    columns = _normalize_columns(columns)
+    lengths = {}
+    for name in STRING_COLUMNS + FLOAT_COLUMNS:
+        raw = columns.get(name)
+        if raw is None:
+            continue
+        if isinstance(raw, (str, bytes, dict)) or not hasattr(raw, "__len__"):
+            raise ValueError(f"Column '{name}' must be a list of values")
+        lengths[name] = len(raw)
+    n = lengths.get("sensor_id", max(lengths.values(), default=0))
+    mismatched = sorted(name for name, length in lengths.items() if length != n)
+    if mismatched:
+        raise ValueError(f"Columns {mismatched} do not have {n} values like the others")
+    _check_rows(n)
+    batch: Dict[str, np.ndarray] = {}
+    for name in STRING_COLUMNS:
+        raw = columns.get(name)
+        raw = list(raw) if raw is not None else [None] * n
+        batch[name] = np.array(["" if v is None else str(v) for v in raw], dtype=object)
+    for name in FLOAT_COLUMNS:
+        raw = columns.get(name)
+        if raw is None:
+            batch[name] = np.full(n, np.nan)
+            continue
+        if not (isinstance(raw, np.ndarray) and raw.dtype.kind in "fiu"):
+            # Typed columns (Arrow, NumPy) skip this per-element None scrub
+            raw = [np.nan if v is None else v for v in raw]
+        batch[name] = _parse_timestamps(raw) if name == "timestamp" else _to_float_array(raw)
+    return batch
+
+
+def decode(body: bytes, content_type: str) -> Dict[str, np.ndarray]:
+    content_type = (content_type or "application/json").split(";")[0].strip().lower()
+
+    if content_type in NDJSON_TYPES:
+        lines = [line for line in body.splitlines() if line.strip()]
+        _check_rows(len(lines))
+        rows = [json.loads(line) for line in lines]
+        return to_batch(_rows_to_columns(rows))
+
+    if content_type in MSGPACK_TYPES:
+        if not MSGPACK_AVAILABLE:
+            raise UnsupportedFormatError("msgpack support is not installed")
+        payload = msgpack.unpackb(body, raw=False)
+    elif content_type in ARROW_TYPES:
+        if not ARROW_AVAILABLE:
+            raise UnsupportedFormatError("Arrow support is not installed (pip install pyarrow)")
+        table = pa.ipc.open_stream(body).read_all() if content_type.endswith("stream") else pa.ipc.open_file(body).read_all()
+        return to_batch({name: table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names})
+    elif content_type == "application/json":
+        payload = json.loads(body)
+    else:
+        raise UnsupportedFormatError(f"Unsupported Content-Type: {content_type}")
+
+    if isinstance(payload, dict) and "readings" in payload:
+        payload = payload["readings"]
+    if isinstance(payload, list):
+        _check_rows(len(payload))
+        return to_batch(_rows_to_columns(payload))
+    if isinstance(payload, dict):
+        return to_batch(payload)
+    raise ValueError("Batch must be a list of readings or a mapping of columns")
+
+
+def validate(batch: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Vectorized validation. Returns an object array with a rejection reason
+    per row, or None for accepted rows. Missing timestamps are filled with now.
+    """
+    n = len(batch["sensor_id"])
+    reasons = np.full(n, None, dtype=object)
+    now = time.time()
+    ts = batch["timestamp"]
+    batch["timestamp"] = ts = np.where(np.isfinite(ts), ts, now)
+
+    checks = [
+        (batch["sensor_id"] == "", "missing sensor_id"),
+        (batch["sensor_type"] == "", "missing sensor_type"),
+        (~np.isfinite(batch["value"]), "invalid value"),
+        (~((batch["lat"] >= -90) & (batch["lat"] <= 90)), "invalid lat"),
+        (~((batch["lng"] >= -180) & (batch["lng"] <= 180)), "invalid lng"),
+        (ts > now + TELEMETRY_MAX_CLOCK_SKEW_SECONDS, "timestamp in the future"),
+        (ts < now - TELEMETRY_MAX_READING_AGE_SECONDS, "timestamp too old"),
+    ]
+    # First failing check wins, so apply in reverse priority order
+    for mask, reason in reversed(checks):
+        reasons[mask] = reason
+    return reasons
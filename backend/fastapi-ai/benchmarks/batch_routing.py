@@ -0,0 +1,134 @@
+"""
+Benchmark: batch routing, global assignment vs one-at-a-time greedy
+
+Generates a surge of complaints and an officer roster in one city and
+routes the batch two ways with the same cost model:
+  greedy   complaints in arrival order, each taking its cheapest free slot
+           (what per-complaint routing amounts to)
+  global   BatchRoutingService.solve(), one min-cost assignment
+
+Reports solve time, total weighted cost, assigned count and SLA breaches.
+
+Usage (from backend/fastapi-ai):
+    python -m benchmarks.batch_routing --complaints 1000 --officers 200
+"""
+import time
+import argparse
+
+import numpy as np
+
+from app.schemas import BatchRouteComplaint, BatchRouteOfficer
+from app.services.batch_routing_service import (
+    batch_routing_service, PRIORITY_WEIGHTS, DEFAULT_SLA_HOURS,
+    BATCH_TRAVEL_SPEED_KMH, BATCH_HANDLING_HOURS, BATCH_SLA_PENALTY, BATCH_UNASSIGNED_HOURS, SCIPY_AVAILABLE,
+)
+from app.utils.geo_utils import haversine_matrix
+
+SEVERITIES = ["Low", "Medium", "High", "Critical"]
+
+
+def make_batch(n_complaints, n_officers, departments, rng):
+    # Surge clustered around a few hotspots, officers spread across the city
+    hotspots = rng.uniform([28.45, 77.0], [28.75, 77.35], size=(5, 2))
+    centre = hotspots[rng.integers(len(hotspots), size=n_complaints)]
+    points = centre + rng.normal(scale=0.02, size=(n_complaints, 2))
+    complaints = [
+        BatchRouteComplaint(complaint_id=f"c{i}", category=departments[i % len(departments)],
+                            severity=SEVERITIES[rng.choice(4, p=[0.3, 0.4, 0.2, 0.1])],
+                            latitude=float(lat), longitude=float(lon))
+        for i, (lat, lon) in enumerate(points)
+    ]
+    officer_points = rng.uniform([28.45, 77.0], [28.75, 77.35], size=(n_officers, 2))
+    officers = [
+        BatchRouteOfficer(officer_id=f"o{j}", department=departments[j % len(departments)],
+                          capacity=int(rng.integers(4, 8)), current_load=int(rng.integers(0, 3)),
+                          latitude=float(lat), longitude=float(lon))
+        for j, (lat, lon) in enumerate(officer_points)
+    ]
+    return complaints, officers
+
+
+def _priority(complaint):
+    return complaint.priority or {"Critical": "Urgent", "High": "High", "Low": "Low"}.get(complaint.severity, "Normal")
+
+
+def _cost(priority, eta):
+    """Weighted cost of finishing at `eta` hours (same model as the service)"""
+    sla = DEFAULT_SLA_HOURS[priority]
+    return PRIORITY_WEIGHTS[priority] * (eta + BATCH_SLA_PENALTY * max(eta - sla, 0.0)), eta <= sla
+
+
+def greedy(complaints, officers):
+    km = haversine_matrix(np.radians([[c.latitude, c.longitude] for c in complaints]),
+                          np.radians([[o.latitude, o.longitude] for o in officers]))
+    load = [o.current_load for o in officers]
+    by_department = {}
+    for j, officer in enumerate(officers):
+        by_department.setdefault(officer.department, []).append(j)
+    total, assigned, breaches = 0.0, 0, 0
+    for i, complaint in enumerate(complaints):
+        priority = _priority(complaint)
+        best = None
+        for j in by_department.get(complaint.category, []):
+            if load[j] >= officers[j].capacity:
+                continue
+            eta = km[i, j] / BATCH_TRAVEL_SPEED_KMH + (load[j] + 1) * BATCH_HANDLING_HOURS
+            cost, met = _cost(priority, eta)
+            if best is None or cost < best[0]:
+                best = (cost, met, j)
+        if best is None:
+            total += PRIORITY_WEIGHTS[priority] * BATCH_UNASSIGNED_HOURS
+            breaches += 1
+            continue
+        load[best[2]] += 1
+        total += best[0]
+        assigned += 1
+        breaches += not best[1]
+    return total, assigned, breaches
+
+
+def global_cost(complaints, assignments):
+    total = 0.0
+    for complaint, assignment in zip(complaints, assignments):
+        priority = _priority(complaint)
+        if assignment.officer_id is None:
+            total += PRIORITY_WEIGHTS[priority] * BATCH_UNASSIGNED_HOURS
+        else:
+            total += _cost(priority, assignment.eta_hours)[0]
+    return total
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    departments = [f"dept_{d}" for d in range(args.departments)]
+    complaints, officers = make_batch(args.complaints, args.officers, departments, rng)
+    capacity = sum(o.capacity - o.current_load for o in officers)
+    print(f"{args.complaints} complaints x {args.officers} officers in {args.departments} department(s), "
+          f"{capacity} free slots, solver: {'hungarian' if SCIPY_AVAILABLE else 'greedy'}")
+
+    started = time.perf_counter()
+    g_total, g_assigned, g_breaches = greedy(complaints, officers)
+    g_ms = (time.perf_counter() - started) * 1000
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        assignments = batch_routing_service.solve(complaints, officers)
+        timings.append((time.perf_counter() - started) * 1000)
+    o_total = global_cost(complaints, assignments)
+    o_assigned = sum(1 for a in assignments if a.officer_id)
+    o_breaches = sum(1 for a in assignments if not a.sla_met)
+
+    print(f"{'method':<8} {'time ms':>10} {'cost':>12} {'assigned':>9} {'sla breaches':>13}")
+    print(f"{'greedy':<8} {g_ms:>10.1f} {g_total:>12.1f} {g_assigned:>9} {g_breaches:>13}")
+    print(f"{'global':<8} {np.median(timings):>10.1f} {o_total:>12.1f} {o_assigned:>9} {o_breaches:>13}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark global batch routing against greedy assignment")
+    parser.add_argument("--complaints", type=int, default=1000)
+    parser.add_argument("--officers", type=int, default=200)
+    parser.add_argument("--departments", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,106 @@
+"""
+Benchmark: federated update codecs, local multi-process simulation
+
+Runs the same federated training (same initial model, districts and data)
+through FederatedCoordinator once per codec:
+  dense-float32   full-precision dense deltas, the same bytes and the same
+                  FedAvg result as shipping full float32 weights (current path)
+  dense-int8      8-bit quantized dense deltas
+  top10%-int8     top-k sparsified + 8-bit, with error feedback (the default)
+  top1%-int8      likewise at 1 %
+  top1%-int8-noef top 1 % without error feedback, to show what it buys
+
+Reports bytes per district update, compression ratio, global-model accuracy
+on a held-out set (no district trains on it) after the first, middle and last
+round, and mean round time (the first round, which starts the worker pool, is
+not timed).
+
+Every codec runs twice: without differential privacy noise, so accuracy
+differences come from the codec alone, and with the Laplace noise the service
+adds by default (--dp-epsilon, production default 0.1).
+
+Usage (from backend/fastapi-ai):
+    python -m benchmarks.federated_codec --districts 4 --rounds 10 --workers 4
+"""
+import time
+import asyncio
+import argparse
+
+import numpy as np
+import torch
+
+from app.federated.aggregator import secure_aggregator, SecureAggregator
+from app.federated.codec import UpdateCodec
+from app.federated.coordinator import FederatedCoordinator
+from app.federated.node import simulate_complaints
+
+CODECS = [
+    ("dense-float32 (current)", dict(topk_ratio=1.0, value_dtype="float32")),
+    ("dense-int8", dict(topk_ratio=1.0, value_dtype="int8")),
+    ("top10%-int8", dict(topk_ratio=0.1, value_dtype="int8")),
+    ("top1%-int8", dict(topk_ratio=0.01, value_dtype="int8")),
+    ("top1%-int8-noef", dict(topk_ratio=0.01, value_dtype="int8", error_feedback=False)),
+]
+
+
+def evaluate(model, data, labels):
+    model.eval()
+    with torch.no_grad():
+        return (model(data).argmax(dim=1) == labels).float().mean().item()
+
+
+async def run_codec(codec, args, test_data, test_labels):
+    torch.manual_seed(args.seed)  # identical initial global model for every codec
+    coordinator = FederatedCoordinator(codec=codec, workers=args.workers)
+    districts = [f"district-{i}" for i in range(args.districts)]
+    try:
+        # Warm-up round outside the timing: pool start-up and worker imports
+        await coordinator.run_federated_round(districts, args.samples)
+        accuracy = [evaluate(coordinator.global_classifier, test_data, test_labels)]
+        round_seconds, update_bytes = [], []
+        for _ in range(args.rounds - 1):
+            started = time.perf_counter()
+            summary = await coordinator.run_federated_round(districts, args.samples)
+            round_seconds.append(time.perf_counter() - started)
+            update_bytes.append(summary["update_bytes"] / args.districts)
+            accuracy.append(evaluate(coordinator.global_classifier, test_data, test_labels))
+        return {
+            "bytes": float(np.mean(update_bytes)),
+            "ratio": summary["compression_ratio"],
+            "accuracy": accuracy,
+            "round_s": float(np.mean(round_seconds)),
+        }
+    finally:
+        coordinator.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--districts", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=200, help="training samples per district")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes (0 = in-process threads)")
+    parser.add_argument("--dp-epsilon", type=float, default=SecureAggregator().dp_epsilon,
+                        help="Laplace noise scale of the DP runs (default: the service default)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.rounds < 2:
+        parser.error("--rounds must be at least 2 (the first round is a warm-up)")
+
+    test_data, test_labels = simulate_complaints(2000, seed=10_000 + args.seed)
+
+    print(f"{args.districts} districts x {args.samples} samples, {args.rounds} rounds, {args.workers} workers")
+    print(f"{'codec':<24} {'dp eps':>7} {'bytes/update':>13} {'ratio':>7} {'acc r1':>7} {'acc mid':>8} "
+          f"{'acc final':>10} {'round s':>8}")
+    for dp_epsilon in (0.0, args.dp_epsilon):
+        secure_aggregator.dp_epsilon = dp_epsilon
+        for name, options in CODECS:
+            result = await run_codec(UpdateCodec(**options), args, test_data, test_labels)
+            accuracy = result["accuracy"]
+            print(f"{name:<24} {dp_epsilon:>7.3g} {result['bytes']:>13,.0f} {result['ratio']:>6.1f}x "
+                  f"{accuracy[0]:>7.3f} {accuracy[len(accuracy) // 2]:>8.3f} {accuracy[-1]:>10.3f} "
+                  f"{result['round_s']:>8.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""
+Benchmark: single-reading /iot/ingest vs bulk /iot/ingest/bulk
+
+Drives the FastAPI app in-process (ASGI transport, no network) and reports
+HTTP requests/second and readings/second for both paths. By default the
+Kafka producer is replaced with an in-memory sink so the numbers isolate
+the ingest path itself; pass --kafka to produce to a real broker.
+
+Usage (from backend/fastapi-ai):
+    python -m benchmarks.iot_ingest --readings 20000 --batch-size 1000 --format ndjson
+"""
+import json
+import time
+import asyncio
+import argparse
+import random
+
+import httpx
+
+from app.main import app
+from app.config import settings
+from app.events.kafka_client import kafka_client
+
+SENSOR_TYPES = ["water_level", "air_quality", "smart_meter"]
+HEADERS = {"Authorization": f"Bearer {settings.INTERNAL_SERVICE_TOKEN}"}
+
+
+class _NullProducer:
+    async def send_and_wait(self, topic, value, key=None):
+        return None
+
+    async def send(self, topic, value, key=None):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+
+def make_readings(n: int, sensors: int = 500):
+    now = time.time()
+    return [
+        {
+            "sensor_id": f"S-{i % sensors:04d}",
+            "sensor_type": SENSOR_TYPES[i % len(SENSOR_TYPES)],
+            "value": round(random.uniform(0, 5), 3),
+            "unit": "m",
+            "lat": 28.6 + random.uniform(-0.1, 0.1),
+            "lng": 77.2 + random.uniform(-0.1, 0.1),
+            "timestamp": now + i * 0.01,
+        }
+        for i in range(n)
+    ]
+
+
+def encode(readings, fmt: str):
+    if fmt == "ndjson":
+        return "\n".join(json.dumps(r) for r in readings).encode(), "application/x-ndjson"
+    if fmt == "msgpack":
+        import msgpack
+        columns = {k: [r[k] for r in readings] for k in readings[0]}
+        return msgpack.packb(columns), "application/msgpack"
+    if fmt == "arrow":
+        import pyarrow as pa
+        table = pa.table({k: [r[k] for r in readings] for k in readings[0]})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), "application/vnd.apache.arrow.stream"
+    raise ValueError(fmt)
+
+
+async def bench_single(client, readings):
+    start = time.perf_counter()
+    for r in readings:
+        await client.post("/iot/ingest", params={
+            "sensor_id": r["sensor_id"], "sensor_type": r["sensor_type"], "value": r["value"],
+            "unit": r["unit"], "lat": r["lat"], "lng": r["lng"],
+        }, headers=HEADERS)
+    return time.perf_counter() - start
+
+
+async def bench_bulk(client, readings, batch_size: int, fmt: str):
+    bodies = [encode(readings[i:i + batch_size], fmt) for i in range(0, len(readings), batch_size)]
+    start = time.perf_counter()
+    for body, content_type in bodies:
+        response = await client.post("/iot/ingest/bulk", content=body,
+                                     headers={**HEADERS, "Content-Type": content_type})
+        response.raise_for_status()
+    return time.perf_counter() - start, len(bodies)
+
+
+async def main(args):
+    if not args.kafka:
+        kafka_client.producer = _NullProducer()
+
+    readings = make_readings(args.readings)
+    single_sample = readings[:args.single_readings]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        single_seconds = await bench_single(client, single_sample)
+        bulk_seconds, requests = await bench_bulk(client, readings, args.batch_size, args.format)
+
+    single_rps = len(single_sample) / single_seconds
+    bulk_readings_per_s = len(readings) / bulk_seconds
+    print(f"single  : {len(single_sample):>7} readings  {single_rps:>10.1f} req/s  {single_rps:>10.1f} readings/s")
+    print(f"bulk    : {len(readings):>7} readings  {requests / bulk_seconds:>10.1f} req/s  {bulk_readings_per_s:>10.1f} readings/s"
+          f"  ({args.format}, batch={args.batch_size})")
+    print(f"speedup : {bulk_readings_per_s / single_rps:.1f}x readings/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare single-reading and bulk IoT ingest throughput")
+    parser.add_argument("--readings", type=int, default=20000)
+    parser.add_argument("--single-readings", type=int, default=2000, help="Readings sent through the single path")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--format", choices=["ndjson", "msgpack", "arrow"], default="ndjson")
+    parser.add_argument("--kafka", action="store_true", help="Produce to the configured Kafka broker")
+    asyncio.run(main(parser.parse_args()))
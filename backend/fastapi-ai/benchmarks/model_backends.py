@@ -0,0 +1,134 @@
+"""
+Benchmark: PyTorch vs ONNX Runtime (fp32 / int8) inference backends
+
+Each (model, backend) pair runs in a fresh process so resident memory is not
+shared between runs. Reports single-item latency (p50 / p95), batched
+throughput, throughput per thread and the resident memory added by loading
+the model. Threads are pinned to the same count for every backend so the
+numbers compare per-core efficiency.
+
+Usage (from backend/fastapi-ai):
+    python -m benchmarks.model_backends --model complaint_classifier --threads 1
+    python -m benchmarks.model_backends --model nlp_encoder --backends torch onnx-int8 --batch-size 16
+"""
+import os
+import json
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing as mp
+
+import numpy as np
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _export(model: str, backend: str, model_dir: str):
+    import torch
+    from app.models.onnx_backend import build_source_module, ensure_exported
+    torch.manual_seed(0)
+    ensure_exported(model, build_source_module(model).eval(), backend, model_dir)
+
+
+def _run(model: str, backend: str, threads: int, batch_size: int, iterations: int, model_dir: str, queue):
+    import torch
+    from app.models.onnx_backend import EXPORT_SPECS, OrtModule, build_source_module, onnx_paths
+
+    torch.set_num_threads(threads)
+    torch.manual_seed(0)
+    spec = EXPORT_SPECS[model]
+    call = spec.get("call")
+
+    baseline_rss = _rss_mb()
+    if backend == "torch":
+        runner = build_source_module(model).eval()
+    else:
+        # Graph was exported in a separate process; serve from ORT only, as ModelLoader would
+        path, _ = onnx_paths(model, backend, model_dir)
+        runner = OrtModule(model, path, backend, object, intra_op_threads=threads, inter_op_threads=1)
+        call = None
+
+    def infer(inputs):
+        with torch.no_grad():
+            return call(runner, *inputs) if call else runner(*inputs)
+
+    single = spec["sample"](1)
+    batch = spec["sample"](batch_size)
+    for _ in range(5):
+        infer(single)
+        infer(batch)
+
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        infer(single)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(max(1, iterations // 4)):
+        infer(batch)
+    batched_seconds = time.perf_counter() - started
+    items_per_s = max(1, iterations // 4) * batch_size / batched_seconds
+
+    queue.put({
+        "model": model,
+        "backend": backend,
+        "threads": threads,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+        "items_per_s": round(items_per_s, 1),
+        "items_per_s_per_thread": round(items_per_s / threads, 1),
+        "model_rss_mb": round(_rss_mb() - baseline_rss, 1),
+    })
+
+
+def main(args):
+    ctx = mp.get_context("spawn")
+    results = []
+    for backend in args.backends:
+        if backend != "torch":
+            proc = ctx.Process(target=_export, args=(args.model, backend, args.model_dir))
+            proc.start()
+            proc.join()
+
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run, args=(args.model, backend, args.threads, args.batch_size,
+                                              args.iterations, args.model_dir, queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            print(f"{backend:>10}: failed (exit {proc.exitcode})")
+            continue
+        results.append(queue.get())
+
+    baseline = next((r for r in results if r["backend"] == "torch"), None)
+    print(f"{'backend':>10} {'p50 ms':>9} {'p95 ms':>9} {'items/s':>10} {'/thread':>9} {'model MB':>9} {'speedup':>8}")
+    for r in results:
+        speedup = r["items_per_s"] / baseline["items_per_s"] if baseline else float("nan")
+        print(f"{r['backend']:>10} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['items_per_s']:>10.1f} "
+              f"{r['items_per_s_per_thread']:>9.1f} {r['model_rss_mb']:>9.1f} {speedup:>7.2f}x")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare PyTorch and ONNX Runtime inference backends")
+    parser.add_argument("--model", choices=["complaint_classifier", "infrastructure_analyzer", "nlp_encoder"],
+                        default="complaint_classifier")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--threads", type=int, default=1, help="Intra-op threads for every backend")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--model-dir", default=os.getenv("MODEL_DIR", tempfile.gettempdir()))
+    parser.add_argument("--json", action="store_true", help="Also print raw results as JSON")
+    main(parser.parse_args())
@@ -0,0 +1,114 @@
+"""
+Benchmark: classical OpenCV detectors on 1080p frames
+
+Compares three ways of running PotholeDetector, StreetlightAnalyzer and
+WaterLeakDetector over the same frame:
+  legacy     the previous implementation (per-detector colour conversion,
+             per-contour contourArea / arcLength / boundingRect loop)
+  separate   current detectors, each called on its own
+  shared     analyze_frame(), one FrameFeatures shared by all detectors
+
+Usage (from backend/fastapi-ai):
+    python -m benchmarks.vision_detectors --frames 20
+"""
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from app.models.vision_models import (
+    analyze_frame, pothole_detector, streetlight_analyzer, water_leak_detector,
+)
+
+
+def _legacy_potholes(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, 100, 255, cv2.THRESH_BINARY_INV)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    potholes = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area > 100:
+            x, y, w, h = cv2.boundingRect(contour)
+            perimeter = cv2.arcLength(contour, True)
+            circularity = 4 * np.pi * area / (perimeter * perimeter) if perimeter > 0 else 0
+            potholes.append({'bbox': [x, y, w, h], 'area': area, 'circularity': circularity,
+                             'confidence': min(1.0, (area / 1000) * circularity)})
+    potholes.sort(key=lambda p: p['confidence'], reverse=True)
+    return potholes
+
+
+def _legacy_streetlight(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    edges = cv2.Canny(gray, 50, 150)
+    rust_mask = cv2.inRange(hsv, np.array([10, 100, 100]), np.array([20, 255, 255]))
+    return np.mean(gray), np.sum(edges > 0) / edges.size, np.sum(rust_mask > 0) / rust_mask.size
+
+
+def _legacy_water_leak(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    potential_water = (gray < 150) & (hsv[:, :, 1] > 200)
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(potential_water.astype(np.uint8))
+    regions = []
+    for i in range(1, num_labels):
+        if stats[i, cv2.CC_STAT_AREA] > 50:
+            regions.append({'area': stats[i, cv2.CC_STAT_AREA], 'centroid': centroids[i].tolist()})
+    return regions
+
+
+def legacy(image):
+    return _legacy_potholes(image), _legacy_streetlight(image), _legacy_water_leak(image)
+
+
+def separate(image):
+    return (pothole_detector.detect_potholes(image),
+            streetlight_analyzer.analyze_streetlight(image),
+            water_leak_detector.detect_water_leak(image))
+
+
+def synthetic_frame(rng: np.random.Generator, width: int = 1920, height: int = 1080) -> np.ndarray:
+    """Road-like 1080p frame: textured grey background with dark blobs and saturated patches"""
+    frame = rng.integers(110, 200, size=(height, width, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (5, 5), 0)
+    for _ in range(rng.integers(40, 120)):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        axes = (int(rng.integers(5, 60)), int(rng.integers(5, 40)))
+        color = tuple(int(c) for c in rng.integers(0, 90, size=3))
+        cv2.ellipse(frame, center, axes, float(rng.integers(0, 180)), 0, 360, color, -1)
+    for _ in range(rng.integers(5, 20)):
+        x, y = int(rng.integers(0, width - 80)), int(rng.integers(0, height - 80))
+        frame[y:y + 60, x:x + 80] = (140, 20, 20)
+    return frame
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    frames = [synthetic_frame(rng) for _ in range(args.frames)]
+
+    # Parity: same pothole count and near-identical top confidence
+    legacy_potholes = _legacy_potholes(frames[0])
+    potholes = analyze_frame(frames[0])['potholes']
+    print(f"parity: legacy {len(legacy_potholes)} potholes, shared {len(potholes)} potholes")
+
+    results = {}
+    for name, fn in (("legacy", legacy), ("separate", separate), ("shared", analyze_frame)):
+        for frame in frames[:2]:
+            fn(frame)
+        started = time.perf_counter()
+        for frame in frames:
+            fn(frame)
+        results[name] = (time.perf_counter() - started) / len(frames)
+
+    print(f"{'path':>10} {'ms/frame':>10} {'fps':>8} {'speedup':>8}")
+    for name, seconds in results.items():
+        print(f"{name:>10} {seconds * 1000:>10.2f} {1 / seconds:>8.1f} {results['legacy'] / seconds:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark classical vision detectors on 1080p frames")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
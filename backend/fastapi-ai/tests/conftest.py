@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the engine as `app`, as uvicorn does when run from backend/fastapi-ai
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,62 @@
+import pytest
+
+from app.schemas import BatchRouteComplaint, BatchRouteOfficer
+from app.services import batch_routing_service as batch_routing
+from app.services.batch_routing_service import BatchRoutingService
+
+
+@pytest.fixture(params=["hungarian", "greedy"])
+def service(request, monkeypatch):
+    if request.param == "hungarian" and not batch_routing.SCIPY_AVAILABLE:
+        pytest.skip("SciPy not installed")
+    monkeypatch.setattr(batch_routing, "SCIPY_AVAILABLE", request.param == "hungarian")
+    return BatchRoutingService()
+
+
+def complaint(complaint_id, severity, lat=28.6, lon=77.2):
+    return BatchRouteComplaint(complaint_id=complaint_id, category="Roads", severity=severity,
+                               latitude=lat, longitude=lon)
+
+
+def officer(officer_id, lat, lon, capacity=1, current_load=0):
+    return BatchRouteOfficer(officer_id=officer_id, department="Roads", capacity=capacity,
+                             current_load=current_load, latitude=lat, longitude=lon)
+
+
+def by_id(assignments):
+    return {a.complaint_id: a for a in assignments}
+
+
+def test_out_of_reach_slot_does_not_displace_higher_priority(service):
+    # b is ~111 km away, beyond the dispatch radius: only a's slot is usable
+    officers = [officer("a", 28.6, 77.2), officer("b", 29.6, 77.2)]
+    result = by_id(service.solve([complaint("high", "High"), complaint("low", "Low")], officers))
+
+    assert result["high"].officer_id == "a"
+    assert result["low"].officer_id is None
+
+
+def test_shortfall_leaves_lowest_priority_unassigned(service):
+    officers = [officer("a", 28.6, 77.2, capacity=2)]
+    complaints = [complaint("low", "Low"), complaint("critical", "Critical"), complaint("high", "High")]
+    result = by_id(service.solve(complaints, officers))
+
+    assert result["critical"].officer_id == "a"
+    assert result["high"].officer_id == "a"
+    assert result["low"].officer_id is None
+
+
+def test_unreachable_complaint_is_unassigned(service):
+    officers = [officer("a", 28.6, 77.2, capacity=3)]
+    result = by_id(service.solve([complaint("near", "Low"), complaint("far", "Critical", lat=30.0)], officers))
+
+    assert result["near"].officer_id == "a"
+    assert result["far"].officer_id is None
+    assert not result["far"].sla_met
+
+
+def test_oversized_department_is_rejected(service, monkeypatch):
+    monkeypatch.setattr(batch_routing, "BATCH_MAX_MATRIX_CELLS", 100)
+    complaints = [complaint(f"C{i}", "High") for i in range(10)]
+    with pytest.raises(batch_routing.BatchTooLargeError):
+        service.solve(complaints, [officer("O1", 28.6, 77.2, capacity=5)])
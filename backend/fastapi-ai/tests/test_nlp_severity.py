@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("transformers")
+
+from app.models.nlp_models import MultilingualNLP, SEVERITY_KEYWORDS
+
+LEVELS = list(SEVERITY_KEYWORDS.keys())
+DIM = 8
+
+
+@pytest.fixture
+def nlp():
+    # Only the severity head is exercised; one orthogonal prototype per level
+    instance = object.__new__(MultilingualNLP)
+    instance.prototypes = {
+        'severity': np.eye(len(LEVELS), DIM, dtype=np.float32),
+        'severity_levels': LEVELS,
+    }
+    return instance
+
+
+def near(level: int, noise: float = 0.1) -> np.ndarray:
+    embedding = np.full(DIM, noise, dtype=np.float32)
+    embedding[LEVELS.index(level)] = 1.0
+    return embedding
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Fire in the transformer, life threatening", 5),
+    ("Urgent: water main burst on MG Road", 4),
+    ("Minor crack in the footpath", 2),
+    ("Request for a new bench in the park", 1),
+])
+def test_keywords_decide_first(nlp, text, expected):
+    assert nlp._determine_severity(text, None, embedding=near(1)) == expected
+
+
+def test_clear_prototype_match(nlp):
+    assert nlp._determine_severity("The road near the school", None, embedding=near(4)) == 4
+
+
+@pytest.mark.parametrize("sentiment, expected", [(None, 2), (0.2, 4), (0.4, 3), (0.9, 1)])
+def test_ambiguous_embedding_falls_back_to_sentiment(nlp, sentiment, expected):
+    # Equally close to levels 5 and 3: no margin
+    tied = np.zeros(DIM, dtype=np.float32)
+    tied[[LEVELS.index(5), LEVELS.index(3)]] = 1.0
+    assert nlp._determine_severity("The road near the school", sentiment, embedding=tied) == expected
+
+
+def test_distant_embedding_falls_back_to_sentiment(nlp):
+    unrelated = np.zeros(DIM, dtype=np.float32)
+    unrelated[-1] = 1.0
+    unrelated[LEVELS.index(5)] = 0.2
+    assert nlp._determine_severity("The road near the school", 0.2, embedding=unrelated) == 4
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+import torch
+
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("transformers")  # app.models imports it
+
+from app.models.complaint_models import ComplaintClassifier
+from app.models.onnx_backend import OrtModule, check_parity, ensure_exported, onnx_paths
+
+NAME = "complaint_classifier"
+
+
+def classifier(seed: int) -> ComplaintClassifier:
+    torch.manual_seed(seed)
+    return ComplaintClassifier().eval()
+
+
+def fingerprint_on_disk(backend: str, model_dir: str) -> str:
+    with open(onnx_paths(NAME, backend, model_dir)[1]) as f:
+        return json.load(f)["fingerprint"]
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_exported_graph_matches_torch(backend, tmp_path):
+    source = classifier(0)
+    path = ensure_exported(NAME, source, backend, str(tmp_path))
+    torch.manual_seed(1)
+    report = check_parity(NAME, source, OrtModule(NAME, path, backend, type(source)), batches=2)
+
+    assert report["passed"], report
+
+
+def test_fp32_and_int8_graphs_track_their_own_weights(tmp_path):
+    model_dir = str(tmp_path)
+    old, new = classifier(0), classifier(1)
+    ensure_exported(NAME, old, "onnx-int8", model_dir)
+    ensure_exported(NAME, new, "onnx", model_dir)
+
+    # The fp32 re-export must not make the int8 graph of the old weights look current
+    assert fingerprint_on_disk("onnx-int8", model_dir) != fingerprint_on_disk("onnx", model_dir)
+    path = ensure_exported(NAME, new, "onnx-int8", model_dir)
+    assert fingerprint_on_disk("onnx-int8", model_dir) == fingerprint_on_disk("onnx", model_dir)
+    torch.manual_seed(2)
+    assert check_parity(NAME, new, OrtModule(NAME, path, "onnx-int8", type(new)), batches=2)["passed"]
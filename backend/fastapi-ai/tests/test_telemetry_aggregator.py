@@ -0,0 +1,56 @@
+import json
+import time
+
+from app.services.telemetry_aggregator import ROLLUP_GRACE_SECONDS, ROLLUP_TOPIC, TelemetryAggregator
+from app.utils.telemetry_codecs import decode, validate
+
+
+def _rollups(events):
+    return [payload for topic, payload in events if topic == ROLLUP_TOPIC]
+
+
+def test_quiet_sensor_window_flushed_by_other_sensor():
+    aggregator = TelemetryAggregator()
+    aggregator.ingest("WL-1", "water_level", 1.0, ts=0.0)
+    aggregator.ingest("WL-1", "water_level", 2.0, ts=30.0)
+    # WL-1 goes quiet; another sensor's readings move time past its 1-minute window
+    assert not _rollups(aggregator.ingest("AQ-1", "air_quality", 50.0, ts=60.0))
+    rollups = _rollups(aggregator.ingest("AQ-1", "air_quality", 50.0, ts=60.0 + ROLLUP_GRACE_SECONDS))
+    assert [(r["sensor_id"], r["window_seconds"], r["count"], r["mean"]) for r in rollups] == [
+        ("WL-1", 60, 2, 1.5),
+    ]
+    assert aggregator.get_stats()["rollups_out"] == 1
+
+
+def test_flush_expired_closes_each_window_once():
+    aggregator = TelemetryAggregator()
+    aggregator.ingest("SM-1", "smart_meter", 3.0, ts=10.0)
+    assert not aggregator.flush_expired(60.0)
+    assert [r["window_seconds"] for r in _rollups(aggregator.flush_expired(60.0 + ROLLUP_GRACE_SECONDS))] == [60]
+    assert [r["window_seconds"] for r in _rollups(aggregator.flush_expired(900.0 + ROLLUP_GRACE_SECONDS))] == [900]
+    assert not aggregator.flush_expired(10_000.0)
+    # The next reading opens fresh windows rather than reporting the flushed ones again
+    assert not _rollups(aggregator.ingest("SM-1", "smart_meter", 4.0, ts=10_000.0))
+
+
+def test_future_timestamp_does_not_advance_watermark_for_good():
+    now = time.time()
+    aggregator = TelemetryAggregator()
+    aggregator.ingest("WL-1", "water_level", 1.0, ts=now)
+    aggregator.ingest("WL-2", "water_level", 1.0, ts=1.7e12)
+    assert aggregator.watermark <= time.time() + ROLLUP_GRACE_SECONDS
+    # Later readings keep aggregating instead of each one flushing every sensor
+    events = []
+    for i in range(20):
+        events += aggregator.ingest("WL-1", "water_level", 1.0, ts=now + i * 0.1)
+    assert not _rollups(events)
+
+
+def test_validate_rejects_out_of_range_timestamps():
+    now = time.time()
+    batch = decode(json.dumps([
+        {"sensor_id": "A", "sensor_type": "water_level", "value": 1.0, "lat": 0, "lng": 0, "timestamp": now},
+        {"sensor_id": "B", "sensor_type": "water_level", "value": 1.0, "lat": 0, "lng": 0, "timestamp": now + 86400 * 365},
+        {"sensor_id": "C", "sensor_type": "water_level", "value": 1.0, "lat": 0, "lng": 0, "timestamp": 1_000_000},
+    ]).encode(), "application/json")
+    assert list(validate(batch)) == [None, "timestamp in the future", "timestamp too old"]
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("transformers")  # app.models imports it
+
+from app.models.vision_models import FrameFeatures, PotholeDetector
+
+
+def legacy_detect_potholes(image):
+    """PotholeDetector.detect_potholes before the shared-frame rewrite"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, 100, 255, cv2.THRESH_BINARY_INV)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    potholes = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area > 100:
+            x, y, w, h = cv2.boundingRect(contour)
+            perimeter = cv2.arcLength(contour, True)
+            circularity = 4 * np.pi * area / (perimeter * perimeter) if perimeter > 0 else 0
+            potholes.append({
+                'bbox': [x, y, w, h],
+                'area': area,
+                'circularity': circularity,
+                'confidence': min(1.0, (area / 1000) * circularity),
+                'center': [x + w//2, y + h//2]
+            })
+    potholes.sort(key=lambda x: x['confidence'], reverse=True)
+    return potholes
+
+
+def shapes_frame():
+    image = np.full((480, 640, 3), 180, dtype=np.uint8)
+    cv2.circle(image, (100, 100), 40, (30, 30, 30), -1)
+    # A dark ring: the hole must not be subtracted from its area
+    cv2.circle(image, (300, 120), 80, (20, 20, 20), -1)
+    cv2.circle(image, (300, 120), 45, (200, 200, 200), -1)
+    cv2.ellipse(image, (500, 300), (90, 35), 30, 0, 360, (40, 40, 40), -1)
+    cv2.rectangle(image, (60, 300), (200, 420), (10, 10, 10), -1)
+    cv2.line(image, (250, 400), (450, 460), (0, 0, 0), 3)
+    cv2.circle(image, (600, 40), 4, (0, 0, 0), -1)  # below the area filter
+    return image
+
+
+def noise_frame():
+    rng = np.random.default_rng(7)
+    gray = cv2.GaussianBlur(rng.integers(0, 256, (360, 480), dtype=np.uint8), (0, 0), 6)
+    gray = cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+@pytest.mark.parametrize("make_frame", [shapes_frame, noise_frame])
+def test_pothole_detector_matches_legacy(make_frame):
+    image = make_frame()
+    expected = legacy_detect_potholes(image)
+    actual = PotholeDetector().detect_potholes(image, FrameFeatures(image))
+
+    assert len(expected) > 1
+    assert [p['bbox'] for p in actual] == [p['bbox'] for p in expected]
+    for got, want in zip(actual, expected):
+        assert got['area'] == pytest.approx(want['area'])
+        assert got['circularity'] == pytest.approx(want['circularity'])
+        assert got['confidence'] == pytest.approx(want['confidence'])
+        assert got['center'] == want['center']